@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from .models import Profile  # Remove Notification from this import
+from .models import Profile, PlatformStats  # Remove Notification from this import
 
 class ProfileInline(admin.StackedInline):
     model = Profile
@@ -26,3 +26,12 @@ class CustomUserAdmin(UserAdmin):
 admin.site.unregister(User)
 admin.site.register(User, CustomUserAdmin)
 
+@admin.register(PlatformStats)
+class PlatformStatsAdmin(admin.ModelAdmin):
+    list_display = ['refreshed_at', 'refresh_ms', 'total_users', 'total_pets', 'total_services', 'total_adoption_requests', 'total_bookings']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,158 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Prefetch, Q, Sum, Value, When
+from django.utils import timezone
+
+from adoption.facets import get_catalog_version
+from adoption.models import Pet, AdoptionRequest
+from services.models import Service, Booking
+
+# Upcoming bookings move with the clock, so cached dashboards also expire on their own
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+SHELTER_DASHBOARD_PET_LIMIT = 20
+SHELTER_DASHBOARD_BOOKING_LIMIT = 10
+ADOPTER_DASHBOARD_LIMIT = 10
+RECOMMENDATION_COUNT = 6
+ACTIVE_REQUEST_STATUSES = ['pending', 'approved', 'in_delivery']
+
+
+def shelter_dashboard_cache_key(shelter_id):
+    return f'accounts:shelter_dashboard:{shelter_id}'
+
+
+def invalidate_shelter_dashboard(shelter_id):
+    cache.delete(shelter_dashboard_cache_key(shelter_id))
+
+
+def _status_counts(field, statuses):
+    return {status: Count('pk', filter=Q(**{field: status})) for status in statuses}
+
+
+def build_shelter_dashboard(shelter):
+    """
+    Everything on the shelter dashboard in seven queries, however many pets the shelter lists.
+
+    Pets come back with their pending request count annotated and the pending
+    requests themselves prefetched; all totals are conditional aggregates.
+    """
+    pending_requests = AdoptionRequest.objects.filter(status='pending').select_related('adopter').order_by('created_at')
+    pets = list(
+        Pet.objects.filter(shelter=shelter)
+        .annotate(pending_count=Count('adoption_requests', filter=Q(adoption_requests__status='pending')))
+        .prefetch_related(Prefetch('adoption_requests', queryset=pending_requests, to_attr='pending_requests'))
+        .order_by('-pending_count', '-created_at')[:SHELTER_DASHBOARD_PET_LIMIT]
+    )
+    pet_totals = Pet.objects.filter(shelter=shelter).aggregate(
+        total=Count('pk'), available=Count('pk', filter=Q(is_available=True))
+    )
+    service_totals = Service.objects.filter(shelter=shelter).aggregate(
+        total=Count('pk'), available=Count('pk', filter=Q(is_available=True))
+    )
+    request_totals = AdoptionRequest.objects.filter(pet__shelter=shelter).aggregate(
+        total=Count('pk'),
+        revenue=Sum('payment_amount', filter=Q(payment_status='completed')),
+        **_status_counts('status', [status for status, label in AdoptionRequest.STATUS_CHOICES])
+    )
+    booking_totals = Booking.objects.filter(service__shelter=shelter).aggregate(
+        total=Count('pk'),
+        revenue=Sum('service__price', filter=Q(status='completed')),
+        **_status_counts('status', [status for status, label in Booking.STATUS_CHOICES])
+    )
+    upcoming_bookings = list(
+        Booking.objects.filter(
+            service__shelter=shelter, status__in=['pending', 'confirmed'], booking_date__gte=timezone.now()
+        ).select_related('service', 'adopter').order_by('booking_date')[:SHELTER_DASHBOARD_BOOKING_LIMIT]
+    )
+    return {
+        'shelter_pets': pets,
+        'pet_totals': pet_totals,
+        'service_totals': service_totals,
+        'request_totals': request_totals,
+        'booking_totals': booking_totals,
+        'upcoming_bookings': upcoming_bookings,
+        'total_revenue': (request_totals['revenue'] or 0) + (booking_totals['revenue'] or 0),
+        'built_at': timezone.now(),
+    }
+
+
+def get_shelter_dashboard(shelter):
+    """The shelter's dashboard data, cached until one of its pets, requests, services or bookings changes"""
+    key = shelter_dashboard_cache_key(shelter.pk)
+    dashboard = cache.get(key)
+    if dashboard is None:
+        dashboard = build_shelter_dashboard(shelter)
+        cache.set(key, dashboard, DASHBOARD_CACHE_TIMEOUT)
+    return dashboard
+
+
+def recommendations_cache_key(adopter_id):
+    return f'accounts:recommendations:{get_catalog_version()}:{adopter_id}'
+
+
+def invalidate_recommendations(adopter_id):
+    cache.delete(recommendations_cache_key(adopter_id))
+
+
+def build_recommendations(adopter):
+    """
+    Available pets of the types the adopter has asked about most, newest first,
+    topped up with other new arrivals. Two queries however long the history is.
+    """
+    preferred_types = list(
+        AdoptionRequest.objects.filter(adopter=adopter)
+        .values_list('pet__pet_type', flat=True)
+        .annotate(requests=Count('pk'))
+        .order_by('-requests')[:3]
+    )
+    return list(
+        Pet.objects.filter(is_available=True)
+        .exclude(adoption_requests__adopter=adopter)
+        .select_related('shelter')
+        .annotate(preferred=Case(When(pet_type__in=preferred_types, then=Value(0)), default=Value(1), output_field=IntegerField()))
+        .order_by('preferred', '-created_at')[:RECOMMENDATION_COUNT]
+    )
+
+
+def get_recommendations(adopter):
+    """Recommended pets, cached until the catalog changes or the adopter makes a request"""
+    key = recommendations_cache_key(adopter.pk)
+    pets = cache.get(key)
+    if pets is None:
+        pets = build_recommendations(adopter)
+        cache.set(key, pets, DASHBOARD_CACHE_TIMEOUT)
+    return pets
+
+
+def get_adopter_dashboard(adopter):
+    """
+    The adopter dashboard in four queries plus the cached recommendations,
+    however many requests and bookings the adopter has.
+    """
+    now = timezone.now()
+    active_requests = list(
+        AdoptionRequest.objects.filter(adopter=adopter, status__in=ACTIVE_REQUEST_STATUSES)
+        .select_related('pet__shelter')
+        .order_by('-created_at')[:ADOPTER_DASHBOARD_LIMIT]
+    )
+    request_totals = AdoptionRequest.objects.filter(adopter=adopter).aggregate(
+        total=Count('pk'),
+        active=Count('pk', filter=Q(status__in=ACTIVE_REQUEST_STATUSES)),
+        awaiting_payment=Count('pk', filter=Q(status='approved', payment_status='pending', payment_amount__gt=0)),
+        completed=Count('pk', filter=Q(status='completed')),
+    )
+    upcoming_bookings = list(
+        Booking.objects.filter(adopter=adopter, status__in=['pending', 'confirmed'], booking_date__gte=now)
+        .select_related('service__shelter')
+        .order_by('booking_date')[:ADOPTER_DASHBOARD_LIMIT]
+    )
+    booking_totals = Booking.objects.filter(adopter=adopter).aggregate(
+        total=Count('pk'),
+        upcoming=Count('pk', filter=Q(status__in=['pending', 'confirmed'], booking_date__gte=now)),
+    )
+    return {
+        'my_adoption_requests': active_requests,
+        'request_totals': request_totals,
+        'my_bookings': upcoming_bookings,
+        'booking_totals': booking_totals,
+        'recommended_pets': get_recommendations(adopter),
+    }
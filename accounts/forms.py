@@ -1,7 +1,10 @@
 from django import forms
 from django.contrib.auth.models import User
-from django.contrib.auth.forms import UserCreationForm, PasswordChangeForm
+from django.contrib.auth.forms import UserCreationForm, PasswordChangeForm, PasswordResetForm
+from django.template import loader
+from tasks.queue import enqueue
 from .models import Profile
+from .tasks import send_email
 
 class UserRegisterForm(UserCreationForm):
     email = forms.EmailField(
@@ -104,4 +107,17 @@ class CustomPasswordChangeForm(PasswordChangeForm):
             self.fields[field_name].widget.attrs.update({'class': 'form-control'})
         
         # Update help text for new password
-        self.fields['new_password1'].help_text = 'Your password must contain at least 8 characters and not be too common.'
\ No newline at end of file
+        self.fields['new_password1'].help_text = 'Your password must contain at least 8 characters and not be too common.'
+
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    """Password reset form that hands the email to the task worker instead of sending it in the request"""
+    
+    def send_mail(self, subject_template_name, email_template_name, context, from_email, to_email, html_email_template_name=None):
+        # Render here; the context holds the user and token, which can't be queued as JSON
+        subject = ''.join(loader.render_to_string(subject_template_name, context).splitlines())
+        body = loader.render_to_string(email_template_name, context)
+        html_message = None
+        if html_email_template_name is not None:
+            html_message = loader.render_to_string(html_email_template_name, context)
+        enqueue(send_email, subject=subject, body=body, from_email=from_email, to=[to_email], html_message=html_message)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts.stats import refresh_platform_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the admin dashboard statistics row; run it periodically from cron'
+
+    def handle(self, *args, **options):
+        stats = refresh_platform_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed platform stats in {stats.refresh_ms:.1f} ms '
+            f'({stats.total_users} users, {stats.total_pets} pets, {stats.total_adoption_requests} adoption requests)'
+        ))
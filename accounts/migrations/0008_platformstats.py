@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_profile_role_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_users', models.PositiveIntegerField(default=0)),
+                ('adopters_count', models.PositiveIntegerField(default=0)),
+                ('shelters_count', models.PositiveIntegerField(default=0)),
+                ('total_pets', models.PositiveIntegerField(default=0)),
+                ('pets_available', models.PositiveIntegerField(default=0)),
+                ('total_services', models.PositiveIntegerField(default=0)),
+                ('services_available', models.PositiveIntegerField(default=0)),
+                ('total_adoption_requests', models.PositiveIntegerField(default=0)),
+                ('adoption_status_counts', models.JSONField(default=dict)),
+                ('total_bookings', models.PositiveIntegerField(default=0)),
+                ('booking_status_counts', models.JSONField(default=dict)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+                ('refresh_ms', models.FloatField(blank=True, help_text='How long the last refresh took', null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'platform stats',
+            },
+        ),
+    ]
@@ -1,6 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 class Profile(models.Model):
@@ -16,9 +16,38 @@ class Profile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Adopter/shelter counts on the admin dashboard
+            models.Index(fields=['role'], name='profile_role_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.get_role_display()}"
 
+
+class PlatformStats(models.Model):
+    """Single-row rollup of the platform counters shown on the admin dashboard"""
+    total_users = models.PositiveIntegerField(default=0)
+    adopters_count = models.PositiveIntegerField(default=0)
+    shelters_count = models.PositiveIntegerField(default=0)
+    total_pets = models.PositiveIntegerField(default=0)
+    pets_available = models.PositiveIntegerField(default=0)
+    total_services = models.PositiveIntegerField(default=0)
+    services_available = models.PositiveIntegerField(default=0)
+    total_adoption_requests = models.PositiveIntegerField(default=0)
+    adoption_status_counts = models.JSONField(default=dict)
+    total_bookings = models.PositiveIntegerField(default=0)
+    booking_status_counts = models.JSONField(default=dict)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+    refresh_ms = models.FloatField(null=True, blank=True, help_text='How long the last refresh took')
+
+    class Meta:
+        verbose_name_plural = 'platform stats'
+
+    def __str__(self):
+        return f"Platform stats as of {self.refreshed_at}"
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
@@ -28,3 +57,43 @@ def create_user_profile(sender, instance, created, **kwargs):
 def save_user_profile(sender, instance, **kwargs):
     instance.profile.save()
 
+@receiver(post_save, sender='adoption.Pet')
+@receiver(post_delete, sender='adoption.Pet')
+@receiver(post_save, sender='services.Service')
+@receiver(post_delete, sender='services.Service')
+def invalidate_owner_shelter_dashboard(sender, instance, **kwargs):
+    from .dashboards import invalidate_shelter_dashboard
+    # After commit, or a dashboard built meanwhile from the old rows would be cached again
+    shelter_id = instance.shelter_id
+    transaction.on_commit(lambda: invalidate_shelter_dashboard(shelter_id))
+
+@receiver(post_save, sender='adoption.AdoptionRequest')
+@receiver(post_delete, sender='adoption.AdoptionRequest')
+def invalidate_pet_shelter_dashboard(sender, instance, **kwargs):
+    from .dashboards import invalidate_shelter_dashboard
+    # The pet is usually loaded already; if it was deleted its own signal covers the shelter
+    if sender.pet.is_cached(instance):
+        shelter_id = instance.pet.shelter_id
+    else:
+        shelter_id = sender.pet.get_queryset().filter(pk=instance.pet_id).values_list('shelter_id', flat=True).first()
+    if shelter_id is not None:
+        transaction.on_commit(lambda: invalidate_shelter_dashboard(shelter_id))
+
+@receiver(post_save, sender='adoption.AdoptionRequest')
+def invalidate_adopter_recommendations(sender, instance, created, **kwargs):
+    from .dashboards import invalidate_recommendations
+    # Recommendations leave out pets the adopter already asked for
+    if created:
+        adopter_id = instance.adopter_id
+        transaction.on_commit(lambda: invalidate_recommendations(adopter_id))
+
+@receiver(post_save, sender='services.Booking')
+@receiver(post_delete, sender='services.Booking')
+def invalidate_service_shelter_dashboard(sender, instance, **kwargs):
+    from .dashboards import invalidate_shelter_dashboard
+    if sender.service.is_cached(instance):
+        shelter_id = instance.service.shelter_id
+    else:
+        shelter_id = sender.service.get_queryset().filter(pk=instance.service_id).values_list('shelter_id', flat=True).first()
+    if shelter_id is not None:
+        transaction.on_commit(lambda: invalidate_shelter_dashboard(shelter_id))
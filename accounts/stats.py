@@ -0,0 +1,65 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from adoption.models import Pet, AdoptionRequest
+from services.models import Service, Booking
+from .models import Profile, PlatformStats
+
+# Stats older than this are recomputed by the run_tasks worker the next time they are
+# shown; running refresh_platform_stats from cron keeps them fresh without page views
+PLATFORM_STATS_MAX_AGE = getattr(settings, 'PLATFORM_STATS_MAX_AGE', 300)
+# Held in the shared cache while a refresh is queued, so concurrent views queue one
+REFRESH_QUEUED_KEY = 'accounts:platform_stats_refresh_queued'
+
+
+def refresh_platform_stats():
+    """Recompute every counter with one aggregate query per table and store them in the single row"""
+    start = time.perf_counter()
+    roles = dict(Profile.objects.values_list('role').annotate(count=Count('pk')).order_by())
+    pets = Pet.objects.aggregate(total=Count('pk'), available=Count('pk', filter=Q(is_available=True)))
+    services = Service.objects.aggregate(total=Count('pk'), available=Count('pk', filter=Q(is_available=True)))
+    adoption_status_counts = dict(AdoptionRequest.objects.values_list('status').annotate(count=Count('pk')).order_by())
+    booking_status_counts = dict(Booking.objects.values_list('status').annotate(count=Count('pk')).order_by())
+
+    stats = PlatformStats(
+        pk=1,
+        total_users=User.objects.count(),
+        adopters_count=roles.get('adopter', 0),
+        shelters_count=roles.get('shelter', 0),
+        total_pets=pets['total'],
+        pets_available=pets['available'],
+        total_services=services['total'],
+        services_available=services['available'],
+        total_adoption_requests=sum(adoption_status_counts.values()),
+        adoption_status_counts=adoption_status_counts,
+        total_bookings=sum(booking_status_counts.values()),
+        booking_status_counts=booking_status_counts,
+        refreshed_at=timezone.now(),
+        refresh_ms=(time.perf_counter() - start) * 1000,
+    )
+    stats.save()
+    cache.delete(REFRESH_QUEUED_KEY)
+    return stats
+
+
+def get_platform_stats(fresh=False):
+    """
+    The stored stats row. It is only computed inline when asked to or missing;
+    once older than the max age a background refresh is queued and the current row served.
+    """
+    stats = PlatformStats.objects.filter(pk=1).first()
+    if fresh or stats is None:
+        return refresh_platform_stats()
+    if (
+        stats.refreshed_at < timezone.now() - timedelta(seconds=PLATFORM_STATS_MAX_AGE)
+        and cache.add(REFRESH_QUEUED_KEY, True, PLATFORM_STATS_MAX_AGE)
+    ):
+        from .tasks import queue_platform_stats_refresh
+        queue_platform_stats_refresh()
+    return stats
@@ -0,0 +1,24 @@
+from django.core.mail import EmailMultiAlternatives
+
+from tasks.queue import task, enqueue
+
+from .stats import refresh_platform_stats
+
+
+@task(max_attempts=5)
+def send_email(subject, body, from_email, to, html_message=None):
+    """Send an already rendered email; SMTP hiccups are retried with backoff by the worker"""
+    message = EmailMultiAlternatives(subject, body, from_email, to)
+    if html_message:
+        message.attach_alternative(html_message, 'text/html')
+    message.send()
+
+
+@task()
+def refresh_stats():
+    """Recompute the admin dashboard statistics row"""
+    refresh_platform_stats()
+
+
+def queue_platform_stats_refresh():
+    enqueue(refresh_stats)
@@ -1,3 +1,245 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from adoption.models import Pet, AdoptionRequest
+from petconnect.testing import QueryBudgetTestCase
+from services.models import Service, Booking
+from tasks.models import Task
+
+from . import urls
+from .models import Profile, PlatformStats
+from .stats import PLATFORM_STATS_MAX_AGE, get_platform_stats
+
+
+class AccountsQueryBudgetTests(QueryBudgetTestCase):
+    """Query and time budgets for every view in accounts.urls, against a seeded catalog"""
+    urlconf = urls
+
+    def test_every_url_has_a_budget(self):
+        self.assertEveryUrlHasBudget()
+
+    def test_register(self):
+        self.assertWithinBudget(reverse('register'), 0, status=200)
+
+    def test_login(self):
+        self.assertWithinBudget(reverse('login'), 0, status=200)
+
+    def test_logout(self):
+        self.assertWithinBudget(reverse('logout'), 4, user=self.adopter, status=302)
+
+    def test_profile(self):
+        self.assertWithinBudget(reverse('profile'), 4, user=self.adopter, status=200)
+
+    def test_dashboard(self):
+        self.assertWithinBudget(reverse('dashboard'), 3, user=self.shelter, status=302)
+
+    def test_admin_dashboard(self):
+        self.assertWithinBudget(reverse('admin_dashboard'), 14, user=self.admin, status=200)
+
+    def test_shelter_dashboard(self):
+        self.assertWithinBudget(reverse('shelter_dashboard'), 11, user=self.shelter, status=200)
+
+    def test_adopter_dashboard(self):
+        self.assertWithinBudget(reverse('adopter_dashboard'), 10, user=self.adopter, status=200)
+
+
+class AdopterDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.shelter = User.objects.create(username='shelter')
+        self.adopter = User.objects.create(username='adopter')
+        Profile.objects.filter(user=self.shelter).update(role='shelter')
+        Profile.objects.filter(user=self.adopter).update(role='adopter')
+        self.service = Service.objects.create(
+            name='Grooming', description='Wash and trim', price=500, duration='1 hour', shelter=self.shelter,
+        )
+        self.client.force_login(self.adopter)
+
+    def add_activity(self, count):
+        for i in range(count):
+            pet = Pet.objects.create(
+                name=f'Pet {i}', pet_type='cat' if i % 2 else 'dog', breed='Mixed', age=12,
+                gender='female', size='medium', description='Friendly', price=100, shelter=self.shelter,
+            )
+            AdoptionRequest.objects.create(adopter=self.adopter, pet=pet, status='approved' if i % 3 else 'pending')
+            Booking.objects.create(
+                adopter=self.adopter, service=self.service, booking_date=timezone.now() + timedelta(days=i + 1),
+                address='1 Test Lane',
+            )
+            Pet.objects.create(
+                name=f'Spare {i}', pet_type='dog', breed='Mixed', age=6, gender='male', size='small',
+                description='Playful', price=0, shelter=self.shelter,
+            )
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('adopter_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_activity(self):
+        self.add_activity(1)
+        cold, warm = self.count_queries(), self.count_queries()
+        self.add_activity(15)
+        cache.clear()
+        self.assertEqual(self.count_queries(), cold)
+        self.assertEqual(self.count_queries(), warm)
+
+    def test_recommendations_are_cached(self):
+        self.add_activity(3)
+        self.count_queries()
+        # Session, user, profile, two request queries and two booking queries
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('adopter_dashboard'))
+        self.assertEqual(len(response.context['my_adoption_requests']), 3)
+        self.assertEqual(response.context['request_totals']['awaiting_payment'], 2)
+        self.assertEqual(len(response.context['my_bookings']), 3)
+
+    def test_recommendations_skip_requested_pets(self):
+        self.add_activity(3)
+        requested = set(AdoptionRequest.objects.values_list('pet_id', flat=True))
+        recommended = self.client.get(reverse('adopter_dashboard')).context['recommended_pets']
+        self.assertTrue(recommended)
+        self.assertFalse(requested & {pet.pk for pet in recommended})
+
+        pet = recommended[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            AdoptionRequest.objects.create(adopter=self.adopter, pet=pet)
+        recommended = self.client.get(reverse('adopter_dashboard')).context['recommended_pets']
+        self.assertNotIn(pet.pk, [pet.pk for pet in recommended])
+
+
+class ShelterDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.shelter = User.objects.create(username='shelter')
+        self.adopter = User.objects.create(username='adopter')
+        self.shelter.profile.role = 'shelter'
+        self.shelter.profile.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pet = self.create_pet('Rex', 1500)
+            quiet = self.create_pet('Tom', 0)
+            AdoptionRequest.objects.create(adopter=self.adopter, pet=self.pet)
+            AdoptionRequest.objects.create(adopter=User.objects.create(username='other'), pet=self.pet)
+            AdoptionRequest.objects.create(
+                adopter=self.adopter, pet=quiet, status='completed', payment_status='completed',
+            )
+            paid = self.create_pet('Max', 2000)
+            AdoptionRequest.objects.create(adopter=self.adopter, pet=paid, payment_status='completed')
+            self.service = Service.objects.create(
+                name='Grooming', description='Wash and trim', price=500, duration='1 hour', shelter=self.shelter,
+            )
+            self.booking = Booking.objects.create(
+                adopter=self.adopter, service=self.service, booking_date=timezone.now() + timedelta(days=1),
+                address='1 Test Lane',
+            )
+            Booking.objects.create(
+                adopter=self.adopter, service=self.service, booking_date=timezone.now() - timedelta(days=1),
+                address='1 Test Lane', status='completed',
+            )
+        self.client.force_login(self.shelter)
+
+    def create_pet(self, name, price):
+        return Pet.objects.create(
+            name=name, breed='Mixed', age=12, gender='male', size='large', description='Friendly',
+            price=price, shelter=self.shelter,
+        )
+
+    def dashboard(self):
+        response = self.client.get(reverse('shelter_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def test_dashboard_content(self):
+        dashboard = self.dashboard()
+        self.assertEqual(dashboard['pet_totals'], {'total': 3, 'available': 3})
+        self.assertEqual(dashboard['request_totals']['total'], 4)
+        self.assertEqual(dashboard['request_totals']['pending'], 3)
+        self.assertEqual(dashboard['booking_totals']['pending'], 1)
+        # Completed payments for Tom (free) and Max, plus the completed booking
+        self.assertEqual(dashboard['total_revenue'], 2500)
+        # The pet with the most pending requests comes first, with them prefetched
+        first = dashboard['shelter_pets'][0]
+        self.assertEqual((first, first.pending_count, len(first.pending_requests)), (self.pet, 2, 2))
+        self.assertEqual(dashboard['upcoming_bookings'], [self.booking])
+
+    def test_dashboard_is_cached(self):
+        built_at = self.dashboard()['built_at']
+        with self.assertNumQueries(3):
+            self.assertEqual(self.dashboard()['built_at'], built_at)
+
+    def assertInvalidatedOnCommit(self, change):
+        built_at = self.dashboard()['built_at']
+        with self.captureOnCommitCallbacks() as callbacks:
+            change()
+            # Still the cached dashboard until the change commits
+            self.assertEqual(self.dashboard()['built_at'], built_at)
+        for callback in callbacks:
+            callback()
+        return self.dashboard()
+
+    def test_pet_change_invalidates(self):
+        dashboard = self.assertInvalidatedOnCommit(lambda: Pet.objects.filter(pk=self.pet.pk).first().delete())
+        self.assertEqual(dashboard['pet_totals']['total'], 2)
+
+    def test_request_change_invalidates(self):
+        def reject():
+            adoption_request = AdoptionRequest.objects.filter(pet=self.pet, status='pending').first()
+            adoption_request.status = 'rejected'
+            adoption_request.save()
+        dashboard = self.assertInvalidatedOnCommit(reject)
+        self.assertEqual(dashboard['request_totals']['pending'], 2)
+
+    def test_booking_change_invalidates(self):
+        def complete():
+            self.booking.status = 'completed'
+            self.booking.save()
+        dashboard = self.assertInvalidatedOnCommit(complete)
+        self.assertEqual(dashboard['booking_totals']['pending'], 0)
+        self.assertEqual(dashboard['total_revenue'], 3000)
+
+
+@override_settings(TASK_QUEUE_EAGER=False)
+class PlatformStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.shelter = User.objects.create(username='shelter')
+
+    def add_pet(self):
+        Pet.objects.create(
+            name='Rex', breed='Mixed', age=12, gender='male', size='large', description='Friendly', shelter=self.shelter,
+        )
+
+    def test_missing_stats_are_computed(self):
+        self.add_pet()
+        self.assertEqual(get_platform_stats().total_pets, 1)
+        self.assertFalse(Task.objects.filter(name='accounts.tasks.refresh_stats').exists())
+
+    def test_writes_do_not_recompute_the_stats(self):
+        get_platform_stats()
+        self.add_pet()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_platform_stats().total_pets, 0)
+        self.assertEqual(get_platform_stats(fresh=True).total_pets, 1)
+
+    def test_old_stats_are_refreshed_in_the_background(self):
+        get_platform_stats()
+        self.add_pet()
+        PlatformStats.objects.update(refreshed_at=timezone.now() - timedelta(seconds=PLATFORM_STATS_MAX_AGE + 1))
+        # Served as they are, with a single refresh queued however many views ask
+        self.assertEqual(get_platform_stats().total_pets, 0)
+        self.assertEqual(get_platform_stats().total_pets, 0)
+        self.assertEqual(Task.objects.filter(name='accounts.tasks.refresh_stats').count(), 1)
+
+        call_command('run_tasks', once=True, stdout=StringIO())
+        self.assertEqual(get_platform_stats().total_pets, 1)
+        self.assertEqual(Task.objects.filter(name='accounts.tasks.refresh_stats').count(), 1)
@@ -6,8 +6,10 @@ from django.contrib.auth.models import User
 from django.contrib import messages
 from .forms import UserRegisterForm, UserUpdateForm, ProfileUpdateForm, CustomPasswordChangeForm
 from .models import Profile
-from adoption.models import Pet, AdoptionRequest
-from services.models import Service, Booking
+from .stats import get_platform_stats
+from .dashboards import get_shelter_dashboard, get_adopter_dashboard
+from adoption.models import Pet
+from services.models import Service
 
 
 
@@ -89,10 +91,7 @@ def profile(request):
     # Check if user is admin (no profile needed)
     if request.user.is_superuser or request.user.is_staff:
         # Get platform statistics for admin
-        total_users = User.objects.count()
-        total_pets = Pet.objects.count()
-        total_services = Service.objects.count()
-        total_adoption_requests = AdoptionRequest.objects.count()
+        stats = get_platform_stats(fresh=request.GET.get('fresh') == '1')
         
         if request.method == 'POST':
             u_form = UserUpdateForm(request.POST, instance=request.user)
@@ -106,10 +105,11 @@ def profile(request):
         context = {
             'u_form': u_form,
             'is_admin': True,
-            'total_users': total_users,
-            'total_pets': total_pets,
-            'total_services': total_services,
-            'total_adoption_requests': total_adoption_requests,
+            'stats': stats,
+            'total_users': stats.total_users,
+            'total_pets': stats.total_pets,
+            'total_services': stats.total_services,
+            'total_adoption_requests': stats.total_adoption_requests,
         }
         return render(request, 'accounts/profile.html', context)
     
@@ -162,10 +162,7 @@ def shelter_dashboard(request):
         messages.error(request, 'Access denied. Shelter account required.')
         return redirect('dashboard')
     
-    context = {
-        'shelter_pets': [],
-        'adoption_requests': [],
-    }
+    context = get_shelter_dashboard(request.user)
     return render(request, 'accounts/shelter_dashboard.html', context)
 
 
@@ -175,10 +172,7 @@ def adopter_dashboard(request):
         messages.error(request, 'Access denied. Adopter account required.')
         return redirect('dashboard')
     
-    context = {
-        'my_adoption_requests': [],
-        'my_bookings': [],
-    }
+    context = get_adopter_dashboard(request.user)
     return render(request, 'accounts/adopter_dashboard.html', context)
 
 
@@ -189,32 +183,27 @@ def admin_dashboard(request):
         messages.error(request, 'Access denied. Admin privileges required.')
         return redirect('dashboard')
     
-    # Platform statistics
-    total_users = User.objects.count()
-    total_pets = Pet.objects.count()
-    total_services = Service.objects.count()
-    total_adoption_requests = AdoptionRequest.objects.count()
-    total_bookings = Booking.objects.count()
+    # Platform statistics come from the stats rollup row; ?fresh=1 recomputes it first
+    stats = get_platform_stats(fresh=request.GET.get('fresh') == '1')
     
     # Recent activities
-    recent_pets = Pet.objects.all().order_by('-created_at')[:5]
+    recent_pets = Pet.objects.select_related('shelter').order_by('-created_at')[:5]
     recent_services = Service.objects.all().order_by('-created_at')[:5]
-    recent_adoption_requests = AdoptionRequest.objects.all().select_related('pet', 'adopter').order_by('-created_at')[:5]
-    
-    # User statistics by role
-    adopters_count = Profile.objects.filter(role='adopter').count()
-    shelters_count = Profile.objects.filter(role='shelter').count()
     
     context = {
-        'total_users': total_users,
-        'total_pets': total_pets,
-        'total_services': total_services,
-        'total_adoption_requests': total_adoption_requests,
-        'total_bookings': total_bookings,
-        'adopters_count': adopters_count,
-        'shelters_count': shelters_count,
+        'stats': stats,
+        'total_users': stats.total_users,
+        'total_pets': stats.total_pets,
+        'pets_available': stats.pets_available,
+        'total_services': stats.total_services,
+        'services_available': stats.services_available,
+        'total_adoption_requests': stats.total_adoption_requests,
+        'adoption_status_counts': stats.adoption_status_counts,
+        'total_bookings': stats.total_bookings,
+        'booking_status_counts': stats.booking_status_counts,
+        'adopters_count': stats.adopters_count,
+        'shelters_count': stats.shelters_count,
         'recent_pets': recent_pets,
         'recent_services': recent_services,
-        'recent_adoption_requests': recent_adoption_requests,
     }
     return render(request, 'accounts/admin_dashboard.html', context)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Pet, AdoptionRequest, Notification
+from .models import Pet, AdoptionRequest, Notification, ArchivedNotification, StatusTransition
 
 @admin.register(Pet)
 class PetAdmin(admin.ModelAdmin):
@@ -51,18 +51,34 @@ class AdoptionRequestAdmin(admin.ModelAdmin):
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ['user', 'message', 'is_read', 'created_at']
-    list_filter = ['is_read', 'created_at']
+    list_display = ['user', 'event', 'get_message', 'is_read', 'created_at']
+    list_filter = ['event', 'is_read', 'created_at']
     search_fields = ['user__username', 'message']
     list_editable = ['is_read']
     readonly_fields = ['created_at']
+    raw_id_fields = ['pet', 'adoption_request', 'booking']
+    list_select_related = ['user', 'pet', 'adoption_request__adopter', 'booking__service', 'booking__adopter']
     
     fieldsets = (
         ('Notification Information', {
-            'fields': ('user', 'message', 'related_url', 'is_read')
+            'fields': ('user', 'event', 'pet', 'adoption_request', 'booking', 'message', 'related_url', 'is_read')
         }),
         ('Timestamps', {
             'fields': ('created_at',),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(admin.ModelAdmin):
+    list_display = ['user', 'message', 'created_at', 'archived_at']
+    list_filter = ['created_at', 'archived_at']
+    search_fields = ['user__username', 'message']
+    readonly_fields = ['created_at', 'archived_at']
+
+@admin.register(StatusTransition)
+class StatusTransitionAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'object_id', 'status', 'created_at']
+    list_filter = ['kind', 'status', 'created_at']
+    search_fields = ['object_id']
+    readonly_fields = ['kind', 'object_id', 'status', 'created_at']
@@ -0,0 +1,72 @@
+from django.db.models import Count, Min, Q
+
+from .models import StatusTransition
+
+ADOPTION_FUNNEL = ('pending', 'approved', 'in_delivery', 'completed')
+BOOKING_FUNNEL = ('pending', 'confirmed', 'in_progress', 'completed')
+
+
+def _entered(kind, status, since=None, until=None):
+    """Transitions into status within [since, until); an index range scan on the log"""
+    transitions = StatusTransition.objects.filter(kind=kind, status=status)
+    if since is not None:
+        transitions = transitions.filter(created_at__gte=since)
+    if until is not None:
+        transitions = transitions.filter(created_at__lt=until)
+    return transitions
+
+
+def funnel(kind, steps, since=None, until=None):
+    """
+    How far the objects that entered steps[0] in [since, until) got through steps.
+
+    Returns one dict per step with the number of objects that reached it, the share
+    of the cohort (rate) and the share of the previous step (step_rate). Only the
+    transition log is read, never the request or booking tables.
+    """
+    cohort = _entered(kind, steps[0], since, until).values('object_id')
+    counts = dict(
+        StatusTransition.objects.filter(kind=kind, status__in=steps, object_id__in=cohort)
+        .values_list('status')
+        .annotate(count=Count('object_id', distinct=True))
+        .order_by()
+    )
+    result = []
+    first = previous = counts.get(steps[0], 0)
+    for status in steps:
+        count = counts.get(status, 0)
+        result.append({
+            'status': status,
+            'count': count,
+            'rate': count / first if first else 0,
+            'step_rate': count / previous if previous else 0,
+        })
+        previous = count
+    return result
+
+
+def latency_percentiles(kind, from_status, to_status, percentiles=(50, 90, 95), since=None, until=None):
+    """
+    Nearest-rank percentiles of the time from first entering from_status to first
+    entering to_status, for objects that entered from_status in [since, until).
+
+    Returns {'count': n, 'percentiles': {p: timedelta}}; objects that haven't reached
+    to_status yet are left out.
+    """
+    cohort = _entered(kind, from_status, since, until).values('object_id')
+    rows = (
+        StatusTransition.objects.filter(kind=kind, status__in=[from_status, to_status], object_id__in=cohort)
+        .values('object_id')
+        .annotate(
+            started=Min('created_at', filter=Q(status=from_status)),
+            finished=Min('created_at', filter=Q(status=to_status)),
+        )
+        .filter(finished__isnull=False)
+        .order_by()
+    )
+    durations = sorted(row['finished'] - row['started'] for row in rows if row['finished'] >= row['started'])
+    result = {}
+    for p in percentiles:
+        if durations:
+            result[p] = durations[max(-(-len(durations) * p // 100) - 1, 0)]
+    return {'count': len(durations), 'percentiles': result}
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AdoptionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'adoption'
+
+    def ready(self):
+        # Registers the deployment checks
+        from . import checks
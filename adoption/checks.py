@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Cached counts and versions are invalidated from the process that made the change"""
+    if settings.CACHES.get('default', {}).get('BACKEND') in PROCESS_LOCAL_CACHES:
+        return [Warning(
+            'The default cache is local to each process.',
+            hint=(
+                'Unread counts, catalog facets, dashboards and platform stats are invalidated by '
+                'the web worker or run_tasks process that changed them; configure a cache every '
+                'process shares (CACHE_BACKEND / CACHE_LOCATION).'
+            ),
+            id='adoption.W001',
+        )]
+    return []
@@ -1,13 +1,16 @@
-from .utils import get_unread_notifications_count, get_recent_notifications
+from django.conf import settings
+
+from .utils import get_unread_notifications_count
 
 def notifications(request):
-    """Add notifications data to all templates"""
+    """Add the unread notifications badge count, and whether to stream updates to it, to all templates"""
+    stream_enabled = getattr(settings, 'NOTIFICATION_STREAM_ENABLED', False)
     if request.user.is_authenticated:
         return {
             'unread_notifications_count': get_unread_notifications_count(request.user),
-            'recent_notifications': get_recent_notifications(request.user, 5),
+            'notification_stream_enabled': stream_enabled,
         }
     return {
         'unread_notifications_count': 0,
-        'recent_notifications': [],
+        'notification_stream_enabled': stream_enabled,
     }
\ No newline at end of file
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, Value, When
+
+FACET_CACHE_TIMEOUT = getattr(settings, 'PET_FACET_CACHE_TIMEOUT', 300)
+CATALOG_VERSION_KEY = 'adoption:catalog_version'
+
+# (key, label, min, max) with inclusive bounds, matching the min/max filters in pet_list
+AGE_BUCKETS = (
+    ('baby', 'Under 6 months', 0, 5),
+    ('young', '6 months - 2 years', 6, 23),
+    ('adult', '2 - 7 years', 24, 83),
+    ('senior', '7+ years', 84, None),
+)
+
+PRICE_BUCKETS = (
+    ('free', 'Free', Decimal('0'), Decimal('0')),
+    ('low', 'Under ₹1,000', Decimal('0.01'), Decimal('999.99')),
+    ('mid', '₹1,000 - ₹4,999', Decimal('1000'), Decimal('4999.99')),
+    ('high', '₹5,000+', Decimal('5000'), None),
+)
+
+
+def _bucket_case(field_name, buckets):
+    whens = [
+        When(**{f'{field_name}__lte': upper}, then=Value(key))
+        for key, label, lower, upper in buckets if upper is not None
+    ]
+    return Case(*whens, default=Value(buckets[-1][0]), output_field=CharField())
+
+
+def get_catalog_version():
+    """
+    Current catalog version, part of every facet cache key.
+
+    Versions are timestamps rather than a counter: if the cache evicts the key,
+    the version starts again from now instead of from 1, so entries cached under
+    an earlier version can never be served again.
+    """
+    cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+    return cache.get(CATALOG_VERSION_KEY) or time.time_ns()
+
+
+def bump_catalog_version():
+    """Invalidate all cached facets after the catalog changes"""
+    cache.set(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+def facet_cache_key(filters):
+    """Cache key for a filter set; sort order and empty values don't change the counts"""
+    normalized = {
+        name: str(value).strip().lower()
+        for name, value in filters.items()
+        if name != 'selected_sort' and str(value).strip()
+    }
+    digest = hashlib.md5(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+    return f'adoption:facets:{get_catalog_version()}:{digest}'
+
+
+def compute_facets(pets):
+    """
+    Count pets per filter value in a single GROUP BY over the filtered queryset.
+
+    Every combination of facet values comes back as one row and is rolled up
+    here, so all facets cost one query no matter how many options there are.
+    """
+    rows = (
+        pets.order_by()
+        .annotate(
+            age_bucket=_bucket_case('age', AGE_BUCKETS),
+            price_bucket=_bucket_case('price', PRICE_BUCKETS),
+        )
+        .values('pet_type', 'gender', 'size', 'age_bucket', 'price_bucket', 'shelter', 'shelter__username')
+        .annotate(count=Count('pk'))
+    )
+
+    facets = {
+        'total': 0,
+        'pet_type': {},
+        'gender': {},
+        'size': {},
+        'age_bucket': {},
+        'price_bucket': {},
+        'shelter': {},
+    }
+    shelter_names = {}
+    for row in rows:
+        count = row['count']
+        facets['total'] += count
+        for name in ('pet_type', 'gender', 'size', 'age_bucket', 'price_bucket', 'shelter'):
+            facets[name][row[name]] = facets[name].get(row[name], 0) + count
+        shelter_names[row['shelter']] = row['shelter__username']
+
+    # Shelters as (id, username, count), busiest first
+    facets['shelter'] = sorted(
+        ((shelter_id, shelter_names[shelter_id], count) for shelter_id, count in facets['shelter'].items()),
+        key=lambda shelter: (-shelter[2], shelter[1])
+    )
+    return facets
+
+
+def get_pet_facets(pets, filters):
+    """Facet counts for the filtered pets, cached per normalized filter set"""
+    key = facet_cache_key(filters)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(pets)
+        cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
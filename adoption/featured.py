@@ -0,0 +1,54 @@
+import math
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Min
+
+from .facets import get_catalog_version
+from .models import Pet
+
+FEATURED_RANGE_TIMEOUT = getattr(settings, 'FEATURED_PETS_RANGE_TIMEOUT', 600)
+# Most ids looked up in one query; sparser catalogs fill the rest from a random starting id
+FEATURED_MAX_CANDIDATES = getattr(settings, 'FEATURED_PETS_MAX_CANDIDATES', 200)
+
+
+def get_available_range():
+    """(lowest id, highest id, count) of the available pets, cached until the catalog changes"""
+    key = f'adoption:featured_range:{get_catalog_version()}'
+    available_range = cache.get(key)
+    if available_range is None:
+        row = Pet.objects.filter(is_available=True).aggregate(low=Min('pk'), high=Max('pk'), count=Count('pk'))
+        available_range = (row['low'], row['high'], row['count'])
+        cache.set(key, available_range, FEATURED_RANGE_TIMEOUT)
+    return available_range
+
+
+def get_featured_pets(count=3):
+    """
+    A random selection of available pets, without ORDER BY RANDOM().
+
+    Ids are drawn uniformly from the range the available pets span and fetched
+    by primary key in one query, drawing enough of them to expect twice the pets
+    needed; ids of adopted or deleted pets are dropped. If that comes up short,
+    e.g. when available pets are thinly spread over the range, the rest are the
+    next available pets from a random id on, wrapping around to the lowest.
+    """
+    low, high, available = get_available_range()
+    if not available:
+        return []
+    count = min(count, available)
+    span = high - low + 1
+    draws = min(span, math.ceil(2 * count * span / available), FEATURED_MAX_CANDIDATES)
+
+    pets = Pet.objects.filter(is_available=True)
+    candidates = random.sample(range(low, high + 1), draws)
+    found = list(pets.filter(pk__in=candidates).in_bulk().values())
+    picked = random.sample(found, min(count, len(found)))
+    if len(picked) < count:
+        start = random.randint(low, high)
+        remaining = pets.exclude(pk__in=[pet.pk for pet in picked]).order_by('pk')
+        picked += remaining.filter(pk__gte=start)[:count - len(picked)]
+        if len(picked) < count:
+            picked += remaining.filter(pk__lt=start)[:count - len(picked)]
+    return picked
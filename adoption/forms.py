@@ -1,8 +1,21 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from django.utils import timezone
+from .images import normalize_upload
 from .models import Pet, AdoptionRequest
 
-class PetForm(forms.ModelForm):
+class NormalizedImageMixin:
+    """Shrinks and strips a newly uploaded image; image_bytes_saved says by how much"""
+    image_bytes_saved = 0
+    
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # Only new uploads; an unchanged field holds the stored file
+        if isinstance(image, UploadedFile):
+            image, self.image_bytes_saved = normalize_upload(image)
+        return image
+
+class PetForm(NormalizedImageMixin, forms.ModelForm):
     class Meta:
         model = Pet
         fields = ['name', 'pet_type', 'breed', 'age', 'gender', 'size', 'description', 'image', 'price']
@@ -0,0 +1,139 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+# Rendition name -> (width, height, crop). Thumbnails are cropped to fill cards;
+# medium renditions keep the aspect ratio and are never upscaled.
+IMAGE_RENDITIONS = getattr(settings, 'IMAGE_RENDITIONS', {
+    'thumb': (320, 240, True),
+    'medium': (800, 600, False),
+})
+# Uploads larger than this are refused outright; anything wider or taller than
+# IMAGE_UPLOAD_MAX_DIMENSION is scaled down before it is stored
+IMAGE_UPLOAD_MAX_BYTES = getattr(settings, 'IMAGE_UPLOAD_MAX_BYTES', 15 * 1024 * 1024)
+IMAGE_UPLOAD_MAX_DIMENSION = getattr(settings, 'IMAGE_UPLOAD_MAX_DIMENSION', 2048)
+IMAGE_UPLOAD_MAX_PIXELS = getattr(settings, 'IMAGE_UPLOAD_MAX_PIXELS', 60_000_000)
+# Formats stored as uploaded when they need no resizing and carry no EXIF
+PASSTHROUGH_FORMATS = ('JPEG', 'PNG', 'WEBP')
+# Format -> (extension, Pillow save options)
+RENDITION_FORMATS = {
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def rendition_name(name, rendition, image_format):
+    """pet_images/rex.png -> pet_images/rex.thumb.webp, stored next to the original"""
+    root, _ = os.path.splitext(name)
+    return f'{root}.{rendition}.{RENDITION_FORMATS[image_format][0]}'
+
+
+def rendition_names(name):
+    return [
+        rendition_name(name, rendition, image_format)
+        for rendition in IMAGE_RENDITIONS
+        for image_format in RENDITION_FORMATS
+    ]
+
+
+def open_image(storage, name):
+    """Open an image upright and in RGB, decoding JPEGs at a reduced scale when they are much larger than needed"""
+    with storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        largest = max((width, height) for width, height, crop in IMAGE_RENDITIONS.values())
+        image.draft('RGB', largest)
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.load()
+    return image
+
+
+def resize(image, width, height, crop):
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    resized = image.copy()
+    resized.thumbnail((width, height), Image.LANCZOS)
+    return resized
+
+
+def generate_renditions(storage, name):
+    """
+    Write every rendition of the image stored as name, replacing old ones.
+
+    Returns the total size in bytes of the files written.
+    """
+    image = open_image(storage, name)
+    written = 0
+    for rendition, (width, height, crop) in IMAGE_RENDITIONS.items():
+        resized = resize(image, width, height, crop)
+        for image_format, (extension, options) in RENDITION_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, **options)
+            store(storage, rendition_name(name, rendition, image_format), ContentFile(buffer.getvalue()))
+            written += buffer.tell()
+    return written
+
+
+def store(storage, name, content):
+    """Write content at exactly name, replacing what is there"""
+    if hasattr(storage, 'store'):
+        # Content-addressed storage would otherwise file it under its hash
+        storage.store(name, content)
+    else:
+        # Delete first so the storage doesn't pick a new name for the same rendition
+        storage.delete(name)
+        storage.save(name, content)
+
+
+def normalize_upload(upload):
+    """
+    Cap, shrink and strip an uploaded image before it is stored.
+
+    Refuses files over IMAGE_UPLOAD_MAX_BYTES or IMAGE_UPLOAD_MAX_PIXELS. Images
+    wider or taller than IMAGE_UPLOAD_MAX_DIMENSION, with EXIF data or in other
+    formats are re-encoded upright and without EXIF. JPEGs are decoded straight
+    at a reduced scale, so a large photo is never held at full size in memory.
+    Returns (file to store, bytes saved).
+    """
+    if upload.size > IMAGE_UPLOAD_MAX_BYTES:
+        raise ValidationError(f'Images must be smaller than {filesizeformat(IMAGE_UPLOAD_MAX_BYTES)}.')
+    upload.seek(0)
+    image = Image.open(upload)
+    width, height = image.size
+    if width * height > IMAGE_UPLOAD_MAX_PIXELS:
+        raise ValidationError(f'Images must be smaller than {IMAGE_UPLOAD_MAX_PIXELS // 1_000_000} megapixels.')
+
+    scale = min(IMAGE_UPLOAD_MAX_DIMENSION / max(width, height), 1)
+    if scale == 1 and image.format in PASSTHROUGH_FORMATS and not image.getexif():
+        upload.seek(0)
+        return upload, 0
+
+    image.draft('RGB', (round(width * scale), round(height * scale)))
+    icc_profile = image.info.get('icc_profile')
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((IMAGE_UPLOAD_MAX_DIMENSION, IMAGE_UPLOAD_MAX_DIMENSION), Image.LANCZOS)
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        # Keep transparency; logos and cut-outs are usually PNGs anyway
+        extension, options = 'png', {'format': 'PNG', 'optimize': True}
+        image = image.convert('RGBA')
+    else:
+        extension, options = 'jpg', {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True}
+        image = image.convert('RGB')
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+
+    buffer = BytesIO()
+    image.save(buffer, **options)
+    root, _ = os.path.splitext(os.path.basename(upload.name))
+    return ContentFile(buffer.getvalue(), name=f'{root}.{extension}'), upload.size - buffer.tell()
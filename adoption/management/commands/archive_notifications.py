@@ -0,0 +1,75 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from adoption.models import Notification, ArchivedNotification
+from adoption.utils import recent_notifications_cache_key
+
+
+class Command(BaseCommand):
+    help = 'Move read notifications older than the retention period into the archive table in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90),
+            help='Archive read notifications older than this many days'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows moved per transaction')
+        parser.add_argument('--delete', action='store_true', help='Delete old notifications instead of archiving them')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would be moved')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        old_notifications = Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f'{old_notifications.count()} read notifications older than {cutoff:%Y-%m-%d} would be moved')
+            return
+
+        moved = 0
+        start = time.perf_counter()
+        while True:
+            batch_moved = self.move_batch(old_notifications, options['batch_size'], options['delete'])
+            if not batch_moved:
+                break
+            moved += batch_moved
+            self.stdout.write(f'  {moved} rows...')
+
+        elapsed = time.perf_counter() - start
+        rate = moved / elapsed if elapsed else 0
+        action = 'Deleted' if options['delete'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {moved} notifications in {elapsed:.2f}s ({rate:.0f} rows/s)'
+        ))
+
+    def move_batch(self, old_notifications, batch_size, delete):
+        """Move one batch in its own transaction so locks stay short; returns rows moved"""
+        with transaction.atomic():
+            batch = list(
+                old_notifications.select_related(*Notification.DISPLAY_RELATED)
+                .order_by('pk')[:batch_size]
+            )
+            if not batch:
+                return 0
+            if not delete:
+                # Event notifications are archived as rendered text so the archive
+                # doesn't depend on the pets, requests and bookings they point to
+                ArchivedNotification.objects.bulk_create([
+                    ArchivedNotification(
+                        user_id=notification.user_id,
+                        message=notification.get_message(),
+                        related_url=notification.get_related_url(),
+                        created_at=notification.created_at,
+                    ) for notification in batch
+                ])
+            Notification.objects.filter(pk__in=[notification.pk for notification in batch]).delete()
+
+        # Archived rows may still sit in a user's cached recent list
+        user_ids = {notification.user_id for notification in batch}
+        cache.delete_many([recent_notifications_cache_key(user_id, 5) for user_id in user_ids])
+        return len(batch)
@@ -0,0 +1,161 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from accounts.models import Profile
+from adoption.models import Pet, AdoptionRequest, Notification
+from services.models import Service, Booking
+
+INDEXED_MODELS = (Pet, AdoptionRequest, Notification, Service, Booking, Profile)
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database and compare query plans and timings of the '
+        'catalog and dashboard queries with and without the Meta.indexes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pets', type=int, default=20000, help='Number of pets to seed')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f"Seeding {options['pets']} pets...")
+            fixtures = self.seed(options['pets'])
+            queries = self.get_queries(fixtures)
+
+            self.drop_indexes()
+            before = self.measure(queries, options['repeat'])
+            self.create_indexes()
+            after = self.measure(queries, options['repeat'])
+
+            for label in queries:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'\n{label}'))
+                self.stdout.write(f'  before ({before[label][1]:.3f} ms): {before[label][0]}')
+                self.stdout.write(f'  after  ({after[label][1]:.3f} ms): {after[label][0]}')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, pet_count):
+        rng = random.Random(42)
+        now = timezone.now()
+        shelter_count = max(pet_count // 100, 1)
+        adopter_count = max(pet_count // 10, 1)
+
+        users = User.objects.bulk_create(
+            [User(username=f'shelter{i}') for i in range(shelter_count)] +
+            [User(username=f'adopter{i}') for i in range(adopter_count)],
+            batch_size=1000
+        )
+        shelters, adopters = users[:shelter_count], users[shelter_count:]
+        Profile.objects.bulk_create(
+            [Profile(user=user, role='shelter') for user in shelters] +
+            [Profile(user=user, role='adopter') for user in adopters],
+            batch_size=1000
+        )
+
+        pets = Pet.objects.bulk_create([
+            Pet(
+                name=f'Pet {i}',
+                pet_type=rng.choice(Pet.PET_TYPES)[0],
+                breed='Mixed',
+                age=rng.randint(1, 180),
+                gender=rng.choice(Pet.GENDER_CHOICES)[0],
+                size=rng.choice(Pet.SIZE_CHOICES)[0],
+                description='Seeded for benchmarking',
+                price=rng.randint(0, 10000),
+                is_available=rng.random() < 0.7,
+                shelter=rng.choice(shelters),
+            ) for i in range(pet_count)
+        ], batch_size=1000)
+        # auto_now_add ignores explicit values, so spread creation times afterwards
+        for pet in pets:
+            pet.created_at = now - timedelta(minutes=rng.randint(0, 525600))
+        Pet.objects.bulk_update(pets, ['created_at'], batch_size=1000)
+
+        requests = {}
+        for pet in rng.sample(pets, k=len(pets) // 2):
+            for adopter in rng.sample(adopters, k=min(3, len(adopters))):
+                requests[(adopter.pk, pet.pk)] = AdoptionRequest(
+                    adopter=adopter, pet=pet, delivery_address='Seeded',
+                    status=rng.choice(AdoptionRequest.STATUS_CHOICES)[0],
+                )
+        AdoptionRequest.objects.bulk_create(requests.values(), batch_size=1000)
+
+        Notification.objects.bulk_create([
+            Notification(user=rng.choice(users), message='Seeded', is_read=rng.random() < 0.8)
+            for i in range(pet_count * 5)
+        ], batch_size=1000)
+
+        services = Service.objects.bulk_create([
+            Service(
+                name=f'Service {i}', description='Seeded', price=rng.randint(100, 5000),
+                category=rng.choice(Service.SERVICE_CATEGORIES)[0], duration='1 hour',
+                shelter=rng.choice(shelters),
+            ) for i in range(pet_count // 10 or 1)
+        ], batch_size=1000)
+        Booking.objects.bulk_create([
+            Booking(
+                adopter=rng.choice(adopters), service=rng.choice(services), address='Seeded',
+                status=rng.choice(Booking.STATUS_CHOICES)[0], booking_date=now,
+            ) for i in range(pet_count)
+        ], batch_size=1000)
+
+        return {
+            'pet': rng.choice(pets),
+            'shelter': rng.choice(shelters),
+            'adopter': rng.choice(adopters),
+            'service': rng.choice(services),
+        }
+
+    def get_queries(self, fixtures):
+        """The queries behind the views the indexes were chosen for"""
+        return {
+            'pet_list (newest)': Pet.objects.filter(is_available=True).order_by('-created_at')[:24],
+            'pet_list (type, price_low)': Pet.objects.filter(is_available=True, pet_type='dog').order_by('price')[:24],
+            'my_pets': Pet.objects.filter(shelter=fixtures['shelter']).order_by('-created_at'),
+            'adoption_request_approve (pending for pet)': AdoptionRequest.objects.filter(pet=fixtures['pet'], status='pending'),
+            'my_adoption_requests': AdoptionRequest.objects.filter(adopter=fixtures['adopter']).order_by('-created_at'),
+            'unread notifications count': Notification.objects.filter(user=fixtures['adopter'], is_read=False).order_by(),
+            'recent notifications': Notification.objects.filter(user=fixtures['adopter']).order_by('-created_at')[:5],
+            'shelter_bookings (service, status)': Booking.objects.filter(service=fixtures['service'], status='pending'),
+            'my_bookings': Booking.objects.filter(adopter=fixtures['adopter']).order_by('-created_at'),
+            'service_list (newest)': Service.objects.filter(is_available=True).order_by('-created_at')[:24],
+            'admin_dashboard (shelters count)': Profile.objects.filter(role='shelter'),
+        }
+
+    def measure(self, queries, repeat):
+        """Return {label: (plan, median ms)} for each query"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        results = {}
+        for label, queryset in queries.items():
+            plan = ' | '.join(queryset.explain().splitlines())
+            timings = []
+            for i in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            results[label] = (plan, statistics.median(timings))
+        return results
+
+    def drop_indexes(self):
+        with connection.schema_editor() as schema_editor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    schema_editor.remove_index(model, index)
+
+    def create_indexes(self):
+        with connection.schema_editor() as schema_editor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    schema_editor.add_index(model, index)
@@ -0,0 +1,151 @@
+import os
+import re
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from adoption.images import IMAGE_RENDITIONS, RENDITION_FORMATS, rendition_names
+from adoption.models import MediaFile, Pet
+from services.models import Service
+
+RENDITION_SUFFIX = re.compile(
+    r'\.(%s)\.(%s)$' % (
+        '|'.join(map(re.escape, IMAGE_RENDITIONS)),
+        '|'.join(re.escape(extension) for extension, options in RENDITION_FORMATS.values()),
+    )
+)
+
+
+def image_root(name):
+    """The part of an image name its renditions share: pet_images/rex for rex.jpg and rex.thumb.webp"""
+    if RENDITION_SUFFIX.search(name):
+        return RENDITION_SUFFIX.sub('', name)
+    return os.path.splitext(name)[0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete files under the pet and service image directories that no Pet or Service '
+        'uses any more, together with their renditions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report orphans without deleting them')
+        parser.add_argument('--batch-size', type=int, default=500, help='Files checked against the database per query')
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Leave files younger than this many seconds alone; their rows may not be committed yet',
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        # Dry runs list every orphan; real runs only at -v 2
+        self.listing = options['verbosity'] > (0 if self.dry_run else 1)
+        self.cutoff = (timezone.now() - timedelta(seconds=options['min_age'])).timestamp()
+        self.fields = [model._meta.get_field('image') for model in (Pet, Service)]
+        self.defaults = {field.default for field in self.fields}
+        self.checked = self.orphans = self.reclaimed = 0
+
+        start = time.perf_counter()
+        for storage, directory in {(field.storage, field.upload_to.rstrip('/')) for field in self.fields}:
+            names = self.scan(storage, directory)
+            while batch := list(islice(names, self.batch_size)):
+                self.checked += len(batch)
+                self.collect_batch(storage, batch)
+
+        verb = 'Would delete' if self.dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {self.checked} files in {time.perf_counter() - start:.1f}s. '
+            f'{verb} {self.orphans} orphans ({self.reclaimed / 1024 / 1024:.1f} MiB).'
+        ))
+
+    def scan(self, storage, directory):
+        """
+        Yield the files under directory older than --min-age, one directory entry at a
+        time, so a flat legacy directory with millions of uploads is never listed whole.
+        """
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            try:
+                entries = os.scandir(storage.path(current))
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    name = f'{current}/{entry.name}'
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(name)
+                        continue
+                    try:
+                        # An earlier batch may have deleted a rendition this listing still holds
+                        if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime <= self.cutoff:
+                            yield name
+                    except FileNotFoundError:
+                        pass
+
+    def referenced(self, names):
+        """The subset of names that a Pet or Service image column holds, in one query per model"""
+        found = set(self.defaults) & names
+        for field in self.fields:
+            found.update(field.model.objects.filter(image__in=names).values_list('image', flat=True))
+        return found
+
+    def claimed(self, names):
+        """The subset of names counted as used, or held by an upload whose row isn't saved yet"""
+        return set(
+            MediaFile.objects.filter(name__in=names)
+            .filter(Q(references__gt=0) | Q(held_until__gt=timezone.now()))
+            .values_list('name', flat=True)
+        )
+
+    def roots_in_use(self, names):
+        """Roots of names that a referenced image shares, e.g. a legacy rex.png next to an orphaned rex.jpg"""
+        prefixes = Q()
+        for name in names:
+            prefixes |= Q(image__startswith=image_root(name) + '.')
+        used = set(self.defaults)
+        for field in self.fields:
+            used.update(field.model.objects.filter(prefixes).values_list('image', flat=True))
+        return {image_root(name) for name in used}
+
+    def collect_batch(self, storage, names):
+        """
+        Delete the originals among names that nothing uses, with their renditions.
+
+        A file that merely looks like a rendition is never deleted on its own; it may
+        be a legacy upload, and renditions go with the original they were made from.
+        Real runs check and delete under the MediaFile row locks in one transaction,
+        so a name that gains a reference or an upload hold in the meantime is kept.
+        """
+        originals = {name for name in names if not RENDITION_SUFFIX.search(name)}
+        if not originals:
+            return
+        with transaction.atomic():
+            if not self.dry_run:
+                list(MediaFile.objects.select_for_update().filter(name__in=originals).values_list('pk'))
+            orphans = sorted(originals - self.referenced(originals) - self.claimed(originals))
+            if not orphans:
+                return
+            roots_in_use = self.roots_in_use(orphans)
+            targets = []
+            for name in orphans:
+                targets.append(name)
+                if image_root(name) not in roots_in_use:
+                    targets.extend(target for target in rendition_names(name) if storage.exists(target))
+
+            for name in targets:
+                self.reclaimed += storage.size(name)
+                if self.listing:
+                    self.stdout.write(f'  {name}')
+            self.orphans += len(targets)
+            if not self.dry_run:
+                MediaFile.objects.filter(name__in=orphans, references=0).delete()
+                for name in targets:
+                    storage.delete(name)
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from adoption.analytics import ADOPTION_FUNNEL, BOOKING_FUNNEL, funnel, latency_percentiles
+from adoption.models import StatusTransition
+
+LATENCIES = (
+    (StatusTransition.ADOPTION_REQUEST, 'pending', 'approved'),
+    (StatusTransition.ADOPTION_REQUEST, 'approved', 'in_delivery'),
+    (StatusTransition.ADOPTION_REQUEST, 'in_delivery', 'completed'),
+    (StatusTransition.BOOKING, 'pending', 'confirmed'),
+    (StatusTransition.BOOKING, 'confirmed', 'completed'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Print adoption and booking funnels and step latencies from the status transition log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Cohort of requests and bookings created in the last N days')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        kinds = dict(StatusTransition.KIND_CHOICES)
+
+        for kind, steps in ((StatusTransition.ADOPTION_REQUEST, ADOPTION_FUNNEL), (StatusTransition.BOOKING, BOOKING_FUNNEL)):
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{kinds[kind]} funnel (last {options["days"]} days)'))
+            for step in funnel(kind, steps, since=since):
+                self.stdout.write(f"  {step['status']:<12} {step['count']:>6}  {step['rate']:>7.1%}  ({step['step_rate']:.1%} of previous)")
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Step latencies'))
+        for kind, from_status, to_status in LATENCIES:
+            latency = latency_percentiles(kind, from_status, to_status, since=since)
+            percentiles = ', '.join(
+                f'p{p} {timedelta(seconds=round(value.total_seconds()))}' for p, value in latency['percentiles'].items()
+            ) or 'no data'
+            self.stdout.write(f"  {kinds[kind]} {from_status} -> {to_status} ({latency['count']}): {percentiles}")
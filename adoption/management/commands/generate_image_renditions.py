@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from PIL import UnidentifiedImageError
+
+from adoption.facets import bump_catalog_version
+from adoption.images import generate_renditions
+from adoption.models import Pet
+from services.models import Service
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnail and medium renditions for pet and service images that have none yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate renditions for every image')
+
+    def handle(self, *args, **options):
+        for model in (Pet, Service):
+            objects = model.objects.exclude(image='')
+            if not options['force']:
+                objects = objects.exclude(image_renditions=F('image'))
+            self.backfill(model, objects)
+        # The backfill updates rows without signals; drop cached catalog pages so they pick up the renditions
+        bump_catalog_version()
+
+    def backfill(self, model, objects):
+        start = time.perf_counter()
+        rendered, missing, written = {}, 0, 0
+        for pk, name in objects.values_list('pk', 'image').iterator(chunk_size=500):
+            # Many rows share an image (the default one, re-used uploads); render each once
+            if name not in rendered:
+                try:
+                    written += generate_renditions(model._meta.get_field('image').storage, name)
+                    rendered[name] = True
+                except (OSError, UnidentifiedImageError) as e:
+                    self.stderr.write(f'  {name}: {e}')
+                    rendered[name] = False
+            if rendered[name]:
+                model.objects.filter(pk=pk, image=name).update(image_renditions=name)
+            else:
+                missing += 1
+        elapsed = time.perf_counter() - start
+        done = sum(rendered.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'{model._meta.verbose_name_plural}: rendered {done} images ({written / 1024:.0f} KiB) '
+            f'in {elapsed:.1f}s, {missing} rows skipped for unreadable images'
+        ))
@@ -0,0 +1,121 @@
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from accounts.models import Profile
+from adoption.models import Pet, AdoptionRequest
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammer one pet at a time with concurrent adoption requests and approvals on a '
+        'throwaway database, check that exactly one approval wins and report throughput'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--adopters', type=int, default=50, help='Adopters competing for each pet')
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent clients')
+        parser.add_argument('--rounds', type=int, default=3, help='Pets to fight over, one after another')
+
+    def handle(self, *args, **options):
+        test_settings = connection.settings_dict['TEST']
+        old_name, old_test_name = connection.settings_dict['NAME'], test_settings.get('NAME')
+        tmpdir = None
+        if connection.vendor == 'sqlite':
+            # Threads need a file database; SQLite's shared in-memory one doesn't wait on locks
+            tmpdir = tempfile.mkdtemp()
+            test_settings['NAME'] = os.path.join(tmpdir, 'load_test.sqlite3')
+
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            shelter, adopters = self.seed(options['adopters'])
+            for round_number in range(1, options['rounds'] + 1):
+                self.run_round(round_number, shelter, adopters, options['threads'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            test_settings['NAME'] = old_test_name
+            teardown_test_environment()
+            if tmpdir:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def seed(self, adopter_count):
+        shelter = User.objects.create(username='load-shelter')
+        adopters = [User.objects.create(username=f'load-adopter{i}') for i in range(adopter_count)]
+        Profile.objects.filter(user=shelter).update(role='shelter')
+        Profile.objects.filter(user__in=adopters).update(role='adopter', address='1 Load Test Lane')
+        return shelter, adopters
+
+    def logged_in_client(self, user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def hammer(self, jobs, threads):
+        """Run (client, url, data) posts concurrently; returns (latencies in ms, errors, elapsed s)"""
+        def post(job):
+            client, url, data = job
+            start = time.perf_counter()
+            try:
+                client.post(url, data)
+                return (time.perf_counter() - start) * 1000, None
+            except Exception as e:
+                return (time.perf_counter() - start) * 1000, e
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(post, jobs))
+        elapsed = time.perf_counter() - start
+        return [latency for latency, error in results], [error for latency, error in results if error], elapsed
+
+    def report(self, label, latencies, errors, elapsed):
+        latencies = sorted(latencies)
+        p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+        self.stdout.write(
+            f'  {label}: {len(latencies)} posts in {elapsed:.2f}s ({len(latencies) / elapsed:.0f}/s), '
+            f'p50 {statistics.median(latencies):.1f} ms, p95 {p95:.1f} ms, {len(errors)} errors'
+        )
+        for error in errors[:3]:
+            self.stdout.write(self.style.ERROR(f'    {error!r}'))
+
+    def run_round(self, round_number, shelter, adopters, threads):
+        pet = Pet.objects.create(
+            name=f'Popular Pet {round_number}', pet_type='dog', breed='Mixed', age=12, gender='female',
+            size='medium', description='Everyone wants this one', price=0, shelter=shelter,
+        )
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Round {round_number}: {len(adopters)} adopters want {pet.name}'))
+
+        # Every adopter submits twice, as an impatient double click would
+        adopt_url = reverse('adoption_request_create', args=[pet.pk])
+        clients = [self.logged_in_client(adopter) for adopter in adopters]
+        jobs = [(client, adopt_url, {'message': 'Pick me'}) for client in clients] * 2
+        self.report('requests', *self.hammer(jobs, threads))
+
+        request_ids = list(AdoptionRequest.objects.filter(pet=pet).values_list('pk', flat=True))
+        jobs = [
+            (self.logged_in_client(shelter), reverse('adoption_request_approve', args=[request_id]), {})
+            for request_id in request_ids
+        ]
+        self.report('approvals', *self.hammer(jobs, threads))
+
+        statuses = dict(AdoptionRequest.objects.filter(pet=pet).values_list('status').annotate(n=Count('pk')))
+        pet.refresh_from_db()
+        self.stdout.write(f'  outcome: {len(request_ids)} requests, statuses {statuses}, pet available: {pet.is_available}')
+        if len(request_ids) != len(adopters):
+            raise CommandError(f'Expected one request per adopter, got {len(request_ids)}')
+        if statuses.get('approved') != 1 or statuses.get('pending') or pet.is_available:
+            raise CommandError('Pet was not reserved by exactly one approval')
+        self.stdout.write(self.style.SUCCESS('  exactly one approval won'))
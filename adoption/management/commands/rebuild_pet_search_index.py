@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from adoption.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the pet catalog full-text search index from the Pet table'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        start = time.perf_counter()
+        indexed = backend.rebuild()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} pets with {type(backend).__name__} in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def create_pet_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS adoption_pet_fts USING fts5("
+        "name, breed, description, tokenize='porter unicode61', prefix='2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO adoption_pet_fts (rowid, name, breed, description) "
+        "SELECT id, name, breed, description FROM adoption_pet"
+    )
+
+
+def drop_pet_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS adoption_pet_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adoption', '0005_notification'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_pet_search_index, drop_pet_search_index),
+    ]
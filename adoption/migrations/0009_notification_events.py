@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adoption', '0008_archivednotification'),
+        ('services', '0002_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='adoption_request',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='adoption.adoptionrequest'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='booking',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='services.booking'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='event',
+            field=models.PositiveSmallIntegerField(blank=True, choices=[(1, 'Adoption requested'), (2, 'Adoption approved'), (3, 'Adoption rejected'), (4, 'Payment completed'), (5, 'Delivery started'), (6, 'Delivery completed'), (7, 'Booking requested'), (8, 'Booking confirmed'), (9, 'Booking started'), (10, 'Booking completed')], null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='pet',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='adoption.pet'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='message',
+            field=models.TextField(blank=True, max_length=500),
+        ),
+    ]
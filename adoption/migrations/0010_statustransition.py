@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_status_history(apps, schema_editor):
+    """
+    Seed the log from existing rows: each one entered 'pending' when it was created
+    and its current status at its last update. Intermediate steps aren't known.
+    """
+    StatusTransition = apps.get_model('adoption', 'StatusTransition')
+    for kind, model in ((1, apps.get_model('adoption', 'AdoptionRequest')), (2, apps.get_model('services', 'Booking'))):
+        transitions = []
+        for object_id, status, created_at, updated_at in model.objects.values_list('pk', 'status', 'created_at', 'updated_at').iterator():
+            transitions.append(StatusTransition(kind=kind, object_id=object_id, status='pending', created_at=created_at))
+            if status != 'pending':
+                transitions.append(StatusTransition(kind=kind, object_id=object_id, status=status, created_at=updated_at))
+        StatusTransition.objects.bulk_create(transitions, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adoption', '0009_notification_events'),
+        ('services', '0002_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Adoption request'), (2, 'Booking')])),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('status', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'status', 'created_at'], name='transition_status_time_idx'), models.Index(fields=['kind', 'object_id'], name='transition_object_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_status_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:35
+
+import adoption.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_image_references(apps, schema_editor):
+    """Existing uploads keep their names; count the rows using each one, leaving out the shared defaults"""
+    MediaFile = apps.get_model('adoption', 'MediaFile')
+    references = {}
+    for model in (apps.get_model('adoption', 'Pet'), apps.get_model('services', 'Service')):
+        default = model._meta.get_field('image').default
+        rows = model.objects.exclude(image__in=['', default]).values_list('image').annotate(n=Count('pk')).order_by()
+        for name, n in rows:
+            references[name] = references.get(name, 0) + n
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name, references=n) for name, n in references.items()], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adoption', '0011_image_renditions'),
+        ('services', '0003_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('references', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='pet',
+            name='image',
+            field=models.ImageField(default='pet_images/default_pet.jpg', storage=adoption.storage.content_addressed_storage, upload_to='pet_images/'),
+        ),
+        migrations.RunPython(count_image_references, migrations.RunPython.noop),
+    ]
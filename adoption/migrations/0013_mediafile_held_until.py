@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adoption', '0012_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediafile',
+            name='held_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adoption', '0013_mediafile_held_until'),
+        ('services', '0004_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='adoption_request',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='adoption.adoptionrequest'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='booking',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='services.booking'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='pet',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='adoption.pet'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adoption', '0014_notification_set_null'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='adoptionrequest',
+            name='payment_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed'), ('refund_due', 'Refund Due'), ('refunded', 'Refunded')], default='pending', max_length=20),
+        ),
+    ]
@@ -1,9 +1,80 @@
-from django.db import models
+from functools import lru_cache
+
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .storage import content_addressed_storage
+
+
+def send_post_save_on_commit(instance, update_fields):
+    """
+    Send post_save for a change written with update(), which skips the model signals,
+    once the transaction commits, so cache invalidation never runs for a rolled-back change.
+    """
+    using = instance._state.db
+    transaction.on_commit(lambda: post_save.send(
+        sender=type(instance), instance=instance, created=False, update_fields=frozenset(update_fields),
+        raw=False, using=using,
+    ), using=using)
+
+
+class ImageReferencesMixin:
+    """Remembers the image a row was loaded with, so a save can tell which stored file it stopped using"""
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'image' in instance.__dict__:
+            instance._loaded_image = instance.image.name
+        return instance
+
+
+class ImageRenditionsMixin:
+    """
+    Thumbnail and medium renditions of a model's image field for srcset.
+    
+    The renditions are written by the generate_image_renditions task, which sets
+    image_renditions to the image name they were made from. Until then, and for a
+    new upload, the URLs fall back to the original.
+    """
+    
+    def _rendition_url(self, rendition, image_format):
+        from .images import rendition_name
+        if not self.image or self.image_renditions != self.image.name:
+            return self.image.url if self.image else ''
+        return self.image.storage.url(rendition_name(self.image.name, rendition, image_format))
+    
+    def _srcset(self, image_format):
+        from .images import IMAGE_RENDITIONS
+        if not self.image or self.image_renditions != self.image.name:
+            return ''
+        return ', '.join(
+            f'{self._rendition_url(rendition, image_format)} {width}w'
+            for rendition, (width, height, crop) in IMAGE_RENDITIONS.items()
+        )
+    
+    @property
+    def image_thumb_url(self):
+        return self._rendition_url('thumb', 'jpeg')
+    
+    @property
+    def image_medium_url(self):
+        return self._rendition_url('medium', 'jpeg')
+    
+    @property
+    def image_srcset(self):
+        return self._srcset('jpeg')
+    
+    @property
+    def image_webp_srcset(self):
+        return self._srcset('webp')
 
 
-class Pet(models.Model):
+class Pet(ImageReferencesMixin, ImageRenditionsMixin, models.Model):
     PET_TYPES = (
         ('dog', 'Dog'),
         ('cat', 'Cat'),
@@ -31,13 +102,27 @@ class Pet(models.Model):
     gender = models.CharField(max_length=10, choices=GENDER_CHOICES)
     size = models.CharField(max_length=10, choices=SIZE_CHOICES)
     description = models.TextField(max_length=1000)
-    image = models.ImageField(upload_to='pet_images/', default='pet_images/default_pet.jpg')
+    image = models.ImageField(upload_to='pet_images/', default='pet_images/default_pet.jpg', storage=content_addressed_storage)
+    # Name of the image the thumbnail renditions were generated from
+    image_renditions = models.CharField(max_length=100, blank=True, editable=False)
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, help_text="Adoption fee")
     is_available = models.BooleanField(default=True)
     shelter = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'profile__role': 'shelter'})
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        # The is_available indexes are partial: SQLite compiles is_available=True to a bare
+        # column test that can't seek a leading boolean column, but it does match the condition
+        indexes = [
+            # pet_list default ordering
+            models.Index(fields=['created_at'], condition=models.Q(is_available=True), name='pet_avail_created_idx'),
+            # pet_list filtered by type and sorted by price
+            models.Index(fields=['pet_type', 'price'], condition=models.Q(is_available=True), name='pet_avail_type_price_idx'),
+            # my_pets
+            models.Index(fields=['shelter', 'created_at'], name='pet_shelter_created_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.name} - {self.get_pet_type_display()}"
     
@@ -61,9 +146,121 @@ class Pet(models.Model):
             return f"{years} year{'s' if years != 1 else ''}"
         else:
             return f"{years} year{'s' if years != 1 else ''} and {months} month{'s' if months != 1 else ''}"
+    
+    def reserve(self):
+        """
+        Take the pet off the catalog with one UPDATE ... WHERE is_available.
+        
+        The availability flag is the pet's optimistic lock: however many callers
+        race for the same pet, exactly one of them gets True.
+        """
+        now = timezone.now()
+        if not Pet.objects.filter(pk=self.pk, is_available=True).update(is_available=False, updated_at=now):
+            return False
+        self.is_available = False
+        self.updated_at = now
+        send_post_save_on_commit(self, ['is_available', 'updated_at'])
+        return True
+
+
+class MediaFile(models.Model):
+    """How many rows use a stored image; identical uploads share one file"""
+    name = models.CharField(max_length=100, unique=True)
+    references = models.PositiveIntegerField(default=0)
+    # Set when an upload is saved to (or deduplicated onto) this file and cleared once its
+    # row takes the reference; until then the file is not deleted even at zero references
+    held_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.references})"
+
+
+class StatusTransition(models.Model):
+    """Append-only log of status changes, written in the same transaction as the change"""
+    ADOPTION_REQUEST = 1
+    BOOKING = 2
+    
+    KIND_CHOICES = (
+        (ADOPTION_REQUEST, 'Adoption request'),
+        (BOOKING, 'Booking'),
+    )
+    
+    # No foreign key: the log is kept narrow and outlives deleted requests and bookings
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    status = models.CharField(max_length=20)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            # Funnel step counts and time windows
+            models.Index(fields=['kind', 'status', 'created_at'], name='transition_status_time_idx'),
+            # One object's history, and joining a cohort to its later steps
+            models.Index(fields=['kind', 'object_id'], name='transition_object_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.object_id} -> {self.status}"
+    
+    @classmethod
+    def record(cls, kind, object_ids, status, created_at=None):
+        created_at = created_at or timezone.now()
+        cls.objects.bulk_create([
+            cls(kind=kind, object_id=object_id, status=status, created_at=created_at)
+            for object_id in object_ids
+        ])
 
 
-class AdoptionRequest(models.Model):
+class StatusHistoryMixin:
+    """
+    Status changes for models with a status field, logged to StatusTransition.
+    
+    Models set HISTORY_KIND and STATUS_TRANSITIONS (target status -> condition the
+    row must still meet). Both save() and transition() write the log entry in the
+    same transaction as the row.
+    """
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'status' in instance.__dict__:
+            instance._loaded_status = instance.status
+        return instance
+    
+    def save(self, *args, **kwargs):
+        changed = self._state.adding or self.status != getattr(self, '_loaded_status', self.status)
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if changed:
+                StatusTransition.record(self.HISTORY_KIND, [self.pk], self.status, self.updated_at)
+        self._loaded_status = self.status
+    
+    def _update_if(self, condition, **fields):
+        """
+        Write fields with a single UPDATE ... WHERE pk = ... AND condition.
+        
+        Returns whether the row still matched; the instance is only updated if it did,
+        so a move that lost a race to another request leaves no trace.
+        """
+        fields['updated_at'] = timezone.now()
+        with transaction.atomic(savepoint=False):
+            if not type(self)._default_manager.filter(condition, pk=self.pk).update(**fields):
+                return False
+            if 'status' in fields:
+                StatusTransition.record(self.HISTORY_KIND, [self.pk], fields['status'], fields['updated_at'])
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self._loaded_status = self.status
+        send_post_save_on_commit(self, fields)
+        return True
+    
+    def transition(self, status, **fields):
+        """Move to status (writing any extra fields alongside) if the current status allows it"""
+        return self._update_if(self.STATUS_TRANSITIONS[status], status=status, **fields)
+
+
+class AdoptionRequest(StatusHistoryMixin, models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
         ('approved', 'Approved'),
@@ -78,6 +275,8 @@ class AdoptionRequest(models.Model):
         ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        # Paid after the request stopped accepting payment, e.g. cancelled during checkout
+        ('refund_due', 'Refund Due'),
         ('refunded', 'Refunded'),
     )
     
@@ -104,6 +303,12 @@ class AdoptionRequest(models.Model):
     class Meta:
         unique_together = ['adopter', 'pet']  # Prevent duplicate requests
         ordering = ['-created_at']
+        indexes = [
+            # Rejecting the other pending requests for a pet on approval
+            models.Index(fields=['pet', 'status'], name='adoptreq_pet_status_idx'),
+            # my_adoption_requests
+            models.Index(fields=['adopter', 'created_at'], name='adoptreq_adopter_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.adopter.username} - {self.pet.name} ({self.status})"
@@ -132,6 +337,55 @@ class AdoptionRequest(models.Model):
     def can_process_payment(self):
         return self.status == 'approved' and self.payment_status == 'pending'
     
+    HISTORY_KIND = StatusTransition.ADOPTION_REQUEST
+    
+    # Target status -> the condition the row must still meet for the move to happen
+    STATUS_TRANSITIONS = {
+        'approved': models.Q(status__in=['pending']),
+        'rejected': models.Q(status__in=['pending']),
+        'cancelled': models.Q(status__in=['pending', 'approved']),
+        'in_delivery': models.Q(status__in=['approved'], payment_status='completed'),
+        'completed': models.Q(status__in=['in_delivery']),
+    }
+    
+    PAYMENT_TRANSITIONS = {
+        'completed': models.Q(status='approved', payment_status__in=['pending', 'processing', 'failed']),
+        'failed': models.Q(payment_status__in=['pending', 'processing']),
+        'refund_due': models.Q(payment_status__in=['pending', 'processing', 'failed']),
+    }
+    
+    def transition_payment(self, payment_status, **fields):
+        """Move to payment_status (writing any extra fields alongside) if the current state allows it"""
+        return self._update_if(self.PAYMENT_TRANSITIONS[payment_status], payment_status=payment_status, **fields)
+    
+    def approve(self):
+        """
+        Approve this request, take the pet off the catalog and reject the other pending
+        requests for it, all in one transaction.
+        
+        Returns (approved, rejected_ids). approved is False when the request is no longer
+        pending or the pet was already taken, e.g. by a concurrent approval.
+        """
+        now = timezone.now()
+        fields = {}
+        if self.payment_amount == 0:
+            # Free adoptions skip the payment step
+            fields = {'payment_status': 'completed', 'payment_date': now, 'payment_reference': 'FREE-ADOPTION'}
+        
+        with transaction.atomic():
+            # Reserving the pet first means only one approval per pet can win
+            if not self.pet.reserve():
+                return False, []
+            if not self.transition('approved', **fields):
+                transaction.set_rollback(True)
+                self.pet.is_available = True
+                return False, []
+            others = AdoptionRequest.objects.filter(pet_id=self.pet_id, status='pending')
+            rejected_ids = list(others.values_list('pk', flat=True))
+            others.filter(pk__in=rejected_ids).update(status='rejected', updated_at=now)
+            StatusTransition.record(self.HISTORY_KIND, rejected_ids, 'rejected', now)
+        return True, rejected_ids
+    
     def get_status_badge_class(self):
         status_classes = {
             'pending': 'bg-warning',
@@ -149,27 +403,157 @@ class AdoptionRequest(models.Model):
             'processing': 'bg-info',
             'completed': 'bg-success',
             'failed': 'bg-danger',
+            'refund_due': 'bg-danger',
             'refunded': 'bg-secondary',
         }
         return status_classes.get(self.payment_status, 'bg-secondary')
 
 class Notification(models.Model):
+    ADOPTION_REQUESTED = 1
+    ADOPTION_APPROVED = 2
+    ADOPTION_REJECTED = 3
+    PAYMENT_COMPLETED = 4
+    DELIVERY_STARTED = 5
+    DELIVERY_COMPLETED = 6
+    BOOKING_REQUESTED = 7
+    BOOKING_CONFIRMED = 8
+    BOOKING_STARTED = 9
+    BOOKING_COMPLETED = 10
+    
+    EVENT_CHOICES = (
+        (ADOPTION_REQUESTED, 'Adoption requested'),
+        (ADOPTION_APPROVED, 'Adoption approved'),
+        (ADOPTION_REJECTED, 'Adoption rejected'),
+        (PAYMENT_COMPLETED, 'Payment completed'),
+        (DELIVERY_STARTED, 'Delivery started'),
+        (DELIVERY_COMPLETED, 'Delivery completed'),
+        (BOOKING_REQUESTED, 'Booking requested'),
+        (BOOKING_CONFIRMED, 'Booking confirmed'),
+        (BOOKING_STARTED, 'Booking started'),
+        (BOOKING_COMPLETED, 'Booking completed'),
+    )
+    
+    # Message template and URL name per event, rendered when the notification is displayed
+    EVENT_TEMPLATES = {
+        ADOPTION_REQUESTED: ("New adoption request for {pet.name} from {adoption_request.adopter.username}", 'shelter_adoption_requests'),
+        ADOPTION_APPROVED: ("Your adoption request for {pet.name} has been approved!", 'my_adoption_requests'),
+        ADOPTION_REJECTED: ("Your adoption request for {pet.name} has been rejected.", 'my_adoption_requests'),
+        PAYMENT_COMPLETED: ("Payment received for {pet.name} from {adoption_request.adopter.username}", 'shelter_adoption_requests'),
+        DELIVERY_STARTED: ("Delivery started for {pet.name}! Estimated delivery: {adoption_request.estimated_delivery_date}", 'my_adoption_requests'),
+        DELIVERY_COMPLETED: ("Delivery completed for {pet.name}! Welcome your new pet home!", 'my_adoption_requests'),
+        BOOKING_REQUESTED: ("New booking for {booking.service.name} from {booking.adopter.username}", 'shelter_bookings'),
+        BOOKING_CONFIRMED: ("Your booking for {booking.service.name} has been confirmed!", 'my_bookings'),
+        BOOKING_STARTED: ("Service {booking.service.name} has started!", 'shelter_bookings'),
+        BOOKING_COMPLETED: ("Service {booking.service.name} has been completed!", 'my_bookings'),
+    }
+    
+    # Relations needed to render any event; select_related these when listing notifications
+    DISPLAY_RELATED = (
+        'pet',
+        'adoption_request__adopter',
+        'booking__service',
+        'booking__adopter',
+    )
+    
     user = models.ForeignKey(
         User, 
         on_delete=models.CASCADE, 
         related_name='adoption_notifications'  # This makes it unique
     )
-    message = models.TextField(max_length=500)
+    # Event notifications store a code plus the objects involved; free-text ones use message/related_url.
+    # Deleting a pet, request or booking keeps the history and only clears the link.
+    event = models.PositiveSmallIntegerField(choices=EVENT_CHOICES, null=True, blank=True)
+    pet = models.ForeignKey(Pet, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    adoption_request = models.ForeignKey(AdoptionRequest, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    booking = models.ForeignKey('services.Booking', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    message = models.TextField(max_length=500, blank=True)
     related_url = models.CharField(max_length=200, blank=True)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Unread badge count (partial for the same reason as the Pet indexes)
+            models.Index(fields=['user', 'created_at'], condition=models.Q(is_read=False), name='notif_user_unread_idx'),
+            # Recent notifications and notification_list
+            models.Index(fields=['user', 'created_at'], name='notif_user_created_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} - {self.message[:50]}"
+        return f"{self.user.username} - {self.get_message()[:50]}"
+    
+    def get_message(self):
+        if self.event is None:
+            return self.message
+        template = self.EVENT_TEMPLATES[self.event][0]
+        try:
+            return template.format(pet=self.pet, adoption_request=self.adoption_request, booking=self.booking)
+        except AttributeError:
+            # Something the message names has been deleted since
+            return f"{self.get_event_display()} (no longer available)"
+    
+    def get_related_url(self):
+        if self.event is None:
+            return self.related_url
+        return _event_url(self.EVENT_TEMPLATES[self.event][1])
     
     def mark_as_read(self):
+        from .utils import clear_notification_cache
         self.is_read = True
-        self.save()
\ No newline at end of file
+        self.save()
+        clear_notification_cache(self.user_id)
+
+
+@lru_cache(maxsize=None)
+def _event_url(url_name):
+    return reverse(url_name)
+
+
+class ArchivedNotification(models.Model):
+    """Read notifications moved out of the Notification table by archive_notifications"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications')
+    message = models.TextField(max_length=500)
+    related_url = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.message[:50]}"
+
+
+@receiver(post_save, sender=Pet)
+def update_pet_search_index(sender, instance, update_fields=None, **kwargs):
+    from .search import get_search_backend, INDEXED_FIELDS
+    # Saves that only touch non-text columns (e.g. is_available) keep the index as is
+    if update_fields is not None and not set(update_fields) & set(INDEXED_FIELDS):
+        return
+    get_search_backend().index_pet(instance)
+
+@receiver(post_delete, sender=Pet)
+def remove_pet_search_index(sender, instance, **kwargs):
+    from .search import get_search_backend
+    get_search_backend().remove_pet(instance.pk)
+
+@receiver(post_save, sender=Pet)
+def update_pet_image(sender, instance, created, update_fields=None, **kwargs):
+    from .storage import update_image_references
+    from .tasks import queue_image_renditions
+    # Renditions are only queued for a new image, not for every save of the pet
+    if (update_fields is None or 'image' in update_fields) and update_image_references(instance, created=created):
+        queue_image_renditions(instance)
+
+@receiver(post_delete, sender=Pet)
+def release_pet_image(sender, instance, **kwargs):
+    from .storage import update_image_references
+    update_image_references(instance, deleted=True)
+
+@receiver(post_save, sender=Pet)
+@receiver(post_delete, sender=Pet)
+def invalidate_pet_facets(sender, **kwargs):
+    from .facets import bump_catalog_version
+    # Only once the change is visible, or a concurrent reader could cache the old rows under the new version
+    transaction.on_commit(bump_catalog_version)
@@ -0,0 +1,92 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 24
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(data):
+    """Pack cursor data into an opaque, URL-safe token"""
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Unpack a token produced by encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(data, dict):
+        raise InvalidCursor(cursor)
+    return data
+
+
+def _keyset_filter(queryset, field_name, descending, cursor_data):
+    """Rows strictly after the (value, pk) position stored in the cursor"""
+    try:
+        field = queryset.model._meta.get_field(field_name)
+        value = field.to_python(cursor_data['v'])
+        pk = int(cursor_data['pk'])
+    except (KeyError, TypeError, ValueError, ValidationError) as e:
+        raise InvalidCursor(str(e))
+
+    op = 'lt' if descending else 'gt'
+    return queryset.filter(
+        Q(**{f'{field_name}__{op}': value}) |
+        Q(**{field_name: value, f'pk__{op}': pk})
+    )
+
+
+def keyset_paginate(queryset, ordering=None, cursor='', page_size=PAGE_SIZE):
+    """
+    Return (items, next_cursor) for the page that follows cursor.
+
+    ordering is a single field such as '-created_at'; pk is used as the tie-breaker
+    so every row has a unique position. With ordering=None the queryset keeps its
+    own order (e.g. search relevance) and the cursor falls back to an offset.
+    An invalid cursor starts again from the first page.
+    """
+    cursor_data = {}
+    if cursor:
+        try:
+            cursor_data = decode_cursor(cursor)
+        except InvalidCursor:
+            cursor_data = {}
+
+    if ordering is None:
+        try:
+            offset = max(int(cursor_data.get('o', 0)), 0)
+        except (TypeError, ValueError):
+            offset = 0
+        items = list(queryset[offset:offset + page_size + 1])
+        next_cursor = encode_cursor({'o': offset + page_size}) if len(items) > page_size else None
+        return items[:page_size], next_cursor
+
+    descending = ordering.startswith('-')
+    field_name = ordering.lstrip('-')
+    queryset = queryset.order_by(ordering, '-pk' if descending else 'pk')
+    if cursor_data:
+        try:
+            queryset = _keyset_filter(queryset, field_name, descending, cursor_data)
+        except InvalidCursor:
+            pass
+
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        last = items[page_size - 1]
+        value = getattr(last, field_name)
+        next_cursor = encode_cursor({
+            'v': value.isoformat() if hasattr(value, 'isoformat') else str(value),
+            'pk': last.pk,
+        })
+    return items[:page_size], next_cursor
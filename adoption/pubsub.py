@@ -0,0 +1,54 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+# user id -> set of (event loop, queue) pairs, one per open notification stream
+_subscribers = defaultdict(set)
+_lock = threading.Lock()
+
+QUEUE_SIZE = 100
+
+
+def subscribe(user_id):
+    """Register a stream for user_id; must be called from the stream's event loop"""
+    subscription = (asyncio.get_running_loop(), asyncio.Queue(maxsize=QUEUE_SIZE))
+    with _lock:
+        _subscribers[user_id].add(subscription)
+    return subscription
+
+
+def unsubscribe(user_id, subscription):
+    with _lock:
+        streams = _subscribers.get(user_id)
+        if streams is not None:
+            streams.discard(subscription)
+            if not streams:
+                del _subscribers[user_id]
+
+
+def _deliver(queue, payload):
+    try:
+        queue.put_nowait(payload)
+    except asyncio.QueueFull:
+        pass  # Already woken; the stream reads everything new from the database
+
+
+def publish(user_id, payload):
+    """
+    Hand payload to every stream open for user_id in this process, waking it.
+
+    Safe to call from sync views running in worker threads; streams in other
+    processes are woken through the shared cache instead.
+    """
+    with _lock:
+        streams = list(_subscribers.get(user_id, ()))
+    for loop, queue in streams:
+        try:
+            loop.call_soon_threadsafe(_deliver, queue, payload)
+        except RuntimeError:
+            pass  # Event loop already closed
+
+
+def subscriber_count():
+    with _lock:
+        return sum(len(streams) for streams in _subscribers.values())
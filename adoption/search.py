@@ -0,0 +1,121 @@
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Pet
+
+FTS_TABLE = 'adoption_pet_fts'
+INDEXED_FIELDS = ('name', 'breed', 'description')
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match_query(query):
+    """Turn free text into an FTS5 prefix query, e.g. 'gold ret' -> '"gold"* "ret"*'"""
+    tokens = TOKEN_RE.findall(query.lower())
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+class DatabaseSearchBackend:
+    """Unindexed search using icontains filters (works on any database)"""
+
+    # Database vendor the backend needs, or None for any
+    vendor = None
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(breed__icontains=query) |
+            Q(description__icontains=query)
+        )
+
+    def index_pet(self, pet):
+        pass
+
+    def remove_pet(self, pet_id):
+        pass
+
+    def rebuild(self):
+        return 0
+
+
+class SQLiteFTSBackend(DatabaseSearchBackend):
+    """Search through the adoption_pet_fts FTS5 table, ranked by bm25"""
+
+    # Migration 0006 only creates the FTS table on SQLite
+    vendor = 'sqlite'
+
+    def search(self, queryset, query):
+        match_query = build_match_query(query)
+        if not match_query:
+            return super().search(queryset, query)
+
+        # Join the FTS table so SQLite drives the query from the index
+        # instead of scanning adoption_pet
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[
+                f'{FTS_TABLE}.rowid = {Pet._meta.db_table}.id',
+                f'{FTS_TABLE} MATCH %s',
+            ],
+            params=[match_query],
+            select={'search_rank': f'{FTS_TABLE}.rank'},
+        ).order_by('search_rank', '-created_at')
+
+    def index_pet(self, pet):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pet.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, breed, description) VALUES (%s, %s, %s, %s)',
+                [pet.pk, pet.name, pet.breed, pet.description]
+            )
+
+    def remove_pet(self, pet_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pet_id])
+
+    def rebuild(self):
+        """Repopulate the index from adoption_pet and return the number of rows indexed"""
+        pet_table = Pet._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, breed, description) '
+                f'SELECT id, name, breed, description FROM {pet_table}'
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+            cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+            return cursor.fetchone()[0]
+
+
+# Default backend per connection.vendor; other databases use the icontains filters
+VENDOR_BACKENDS = {
+    'sqlite': 'adoption.search.SQLiteFTSBackend',
+}
+
+_backend = None
+
+
+def get_search_backend():
+    """
+    Return the backend configured by settings.PET_SEARCH_BACKEND, or the default
+    one for the database in use. A backend made for another database falls back
+    to DatabaseSearchBackend, since its index table was never created.
+    """
+    global _backend
+    if _backend is None:
+        backend_path = getattr(settings, 'PET_SEARCH_BACKEND', '') or VENDOR_BACKENDS.get(
+            connection.vendor, 'adoption.search.DatabaseSearchBackend'
+        )
+        backend = import_string(backend_path)()
+        if backend.vendor not in (None, connection.vendor):
+            backend = DatabaseSearchBackend()
+        _backend = backend
+    return _backend
+
+
+def search_pets(queryset, query):
+    """Filter a Pet queryset down to matches for query, best matches first"""
+    return get_search_backend().search(queryset, query)
@@ -0,0 +1,137 @@
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .images import rendition_names
+
+# How long a saved upload is kept without any row referencing it, e.g. while the form
+# that uploaded it is still being saved
+MEDIA_UPLOAD_HOLD = getattr(settings, 'MEDIA_UPLOAD_HOLD', 3600)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Media storage that names files by the SHA-256 of their bytes.
+
+    pet_images/rex.jpg is stored as pet_images/3f/a2/3fa2...c1.jpg, so a directory
+    never holds more than a few hundred files and uploading the same photo again
+    writes nothing. Files named by content never change, which is what lets them
+    be shared between rows and served with far-future cache headers.
+    """
+
+    def __init__(self, **kwargs):
+        # Two uploads of the same bytes may race for one address; either write is correct
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def content_address(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower().replace('.jpeg', '.jpg')
+        hexdigest = digest.hexdigest()
+        return os.path.join(directory, hexdigest[:2], hexdigest[2:4], hexdigest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        address = self.content_address(self.generate_filename(name), content)
+        # Held before looking for the file: a release that is about to delete it either
+        # finishes first (and the file is written again) or sees the hold and keeps it
+        hold_file(address)
+        if self.exists(address):
+            return address
+        return super().save(address, content, max_length=max_length)
+
+    def store(self, name, content):
+        """Write content at exactly name, replacing any file there (for derived files such as renditions)"""
+        return super().save(name, content)
+
+
+media_storage = ContentAddressedStorage()
+
+
+def content_addressed_storage():
+    return media_storage
+
+
+def hold_file(name):
+    """Keep name from being deleted for MEDIA_UPLOAD_HOLD seconds, until a row references it"""
+    from .models import MediaFile
+    held_until = timezone.now() + timedelta(seconds=MEDIA_UPLOAD_HOLD)
+    with transaction.atomic():
+        if not MediaFile.objects.filter(name=name).update(held_until=held_until):
+            MediaFile.objects.get_or_create(name=name, defaults={'held_until': held_until})
+
+
+def add_reference(name):
+    from .models import MediaFile
+    MediaFile.objects.get_or_create(name=name)
+    MediaFile.objects.filter(name=name).update(references=F('references') + 1, held_until=None)
+
+
+def release_reference(storage, name):
+    """Drop one reference to name; the last one deletes the file and its renditions after commit"""
+    from .models import MediaFile
+    MediaFile.objects.filter(name=name, references__gt=0).update(references=F('references') - 1)
+    if MediaFile.objects.filter(name=name, references=0).exists():
+        transaction.on_commit(lambda: delete_unreferenced(storage, name))
+
+
+def delete_unreferenced(storage, name):
+    """
+    Delete name and its renditions if nothing references or holds it, re-checked with
+    the row locked; the files go inside that transaction, so a concurrent upload of the
+    same bytes waits for them to be gone and writes the file again.
+    """
+    from .models import MediaFile
+    with transaction.atomic():
+        media_file = MediaFile.objects.select_for_update().filter(name=name).first()
+        if media_file is None or media_file.references or (
+            media_file.held_until and media_file.held_until > timezone.now()
+        ):
+            return False
+        media_file.delete()
+        for target in [name] + rendition_names(name):
+            storage.delete(target)
+    return True
+
+
+def update_image_references(instance, created=False, deleted=False):
+    """
+    Keep MediaFile counts in step with an object's image; called from post_save and
+    post_delete. The field's default image is shared by design and never counted.
+    Returns whether the stored image name changed.
+    """
+    field = instance._meta.get_field('image')
+    if created:
+        old = None
+    elif deleted:
+        old = instance.image.name
+    elif hasattr(instance, '_loaded_image'):
+        old = instance._loaded_image
+    else:
+        # Loaded without the image column; nothing known to compare against
+        return False
+    new = None if deleted else instance.image.name
+    if old == new:
+        return False
+    with transaction.atomic(savepoint=False):
+        if new and new != field.default:
+            add_reference(new)
+        if old and old != field.default:
+            release_reference(field.storage, old)
+    instance._loaded_image = new
+    return True
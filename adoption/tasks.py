@@ -0,0 +1,65 @@
+from django.apps import apps
+
+from tasks.queue import task, enqueue
+
+from .images import generate_renditions, rendition_names
+from .models import AdoptionRequest, Notification
+from .utils import create_notifications, event_notification
+
+# Events the pet's shelter is told about; the rest go to the adopter
+SHELTER_EVENTS = (Notification.ADOPTION_REQUESTED, Notification.PAYMENT_COMPLETED)
+
+
+@task()
+def send_adoption_notifications(events):
+    """Create the notifications for [event, adoption request ids] pairs in one INSERT"""
+    adoption_requests = AdoptionRequest.objects.select_related('adopter', 'pet__shelter').in_bulk(
+        {pk for _, ids in events for pk in ids}
+    )
+    create_notifications([
+        event_notification(
+            adoption_request.pet.shelter if event in SHELTER_EVENTS else adoption_request.adopter,
+            event,
+            adoption_request
+        )
+        for event, ids in events
+        for adoption_request in (adoption_requests.get(pk) for pk in ids)
+        if adoption_request is not None
+    ])
+
+
+def queue_adoption_notifications(*events):
+    """
+    Notify about (event, adoption request ids) pairs from the task worker instead of
+    the request, with one task for all of them
+    """
+    events = [[event, list(ids)] for event, ids in events if ids]
+    if events:
+        enqueue(send_adoption_notifications, events=events)
+
+
+def queue_adoption_notification(event, adoption_request):
+    queue_adoption_notifications((event, [adoption_request.pk]))
+
+
+@task()
+def generate_image_renditions(model, pk, name):
+    """Write the thumbnail renditions of an image and mark the object as having them"""
+    instance = apps.get_model(model).objects.filter(pk=pk, image=name).first()
+    if instance is None:
+        # Deleted, or the image was replaced and a newer task has been queued
+        return
+    storage = instance.image.storage
+    if not storage.exists(name):
+        return
+    # Shared images such as the default one only need rendering once
+    if not all(storage.exists(target) for target in rendition_names(name)):
+        generate_renditions(storage, name)
+    instance.image_renditions = name
+    instance.save(update_fields=['image_renditions'])
+
+
+def queue_image_renditions(instance):
+    """Queue rendition generation for a Pet or Service whose image has none yet"""
+    if instance.image and instance.image_renditions != instance.image.name:
+        enqueue(generate_image_renditions, model=instance._meta.label, pk=instance.pk, name=instance.image.name)
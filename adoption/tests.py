@@ -1,3 +1,1057 @@
-from django.test import TestCase
+import hashlib
+import hmac
+from datetime import timedelta
+from functools import partial
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from petconnect.testing import QueryBudgetTestCase, TempMediaRootMixin
+from tasks.models import Task
+
+from . import featured, images, search, urls
+from .views import notification_events
+from .analytics import ADOPTION_FUNNEL, funnel, latency_percentiles
+from .forms import PetForm
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_paginate
+from .images import rendition_names
+from .facets import CATALOG_VERSION_KEY, bump_catalog_version, get_catalog_version
+from .models import AdoptionRequest, ArchivedNotification, MediaFile, Pet, Notification, StatusTransition
+from .tasks import generate_image_renditions, queue_adoption_notification
+from .utils import (
+    create_event_notification, create_notifications, get_unread_notifications_count, latest_notification_cache_key,
+    unread_count_cache_key,
+)
+
+
+class AdoptionQueryBudgetTests(QueryBudgetTestCase):
+    """Query and time budgets for every view in adoption.urls, against a seeded catalog"""
+    urlconf = urls
+
+    def setUp(self):
+        super().setUp()
+        self.pet = self.data['pets'][0]
+        # adopter0's requests are for shelter0's first pets; the second one carries a fee
+        self.adoption_request = self.data['adoption_requests'][0]
+        self.paid_request = self.data['adoption_requests'][1]
+
+    def approve_paid_request(self):
+        self.paid_request.approve()
+        self.paid_request.refresh_from_db()
+        self.assertTrue(self.paid_request.can_process_payment())
+
+    def test_every_url_has_a_budget(self):
+        self.assertEveryUrlHasBudget()
+
+    def test_pet_list(self):
+        self.assertWithinBudget(reverse('pet_list'), 6, user=self.adopter, status=200)
+
+    def test_pet_list_page(self):
+        response = self.assertWithinBudget(
+            reverse('pet_list_page'), 5, user=self.adopter, data={'type': 'dog'}, status=200,
+        )
+        pets = response.context['pets']
+        self.assertTrue(pets)
+        self.assertEqual({pet.pet_type for pet in pets}, {'dog'})
+
+    def test_pet_detail(self):
+        self.assertWithinBudget(reverse('pet_detail', args=[self.pet.pk]), 6, user=self.adopter, status=200)
+
+    def test_pet_create(self):
+        self.assertWithinBudget(reverse('pet_create'), 4, user=self.shelter, status=200)
+
+    def test_pet_update(self):
+        self.assertWithinBudget(reverse('pet_update', args=[self.pet.pk]), 6, user=self.shelter, status=200)
+
+    def test_pet_delete(self):
+        self.assertWithinBudget(reverse('pet_delete', args=[self.pet.pk]), 11, user=self.shelter, method='post', status=302)
+
+    def test_my_pets(self):
+        self.assertWithinBudget(reverse('my_pets'), 5, user=self.shelter, status=200)
+
+    def test_adoption_request_create(self):
+        pet = self.data['pets'][-1]
+        self.assertWithinBudget(
+            reverse('adoption_request_create', args=[pet.pk]), 11, user=self.adopter, method='post',
+            data={'message': 'We have a big garden'}, status=302,
+        )
+
+    def test_my_adoption_requests(self):
+        self.assertWithinBudget(reverse('my_adoption_requests'), 5, user=self.adopter, status=200)
+
+    def test_adoption_request_cancel(self):
+        self.assertWithinBudget(
+            reverse('adoption_request_cancel', args=[self.adoption_request.pk]), 7,
+            user=self.adopter, method='post', status=302,
+        )
+
+    def test_shelter_adoption_requests(self):
+        self.assertWithinBudget(reverse('shelter_adoption_requests'), 5, user=self.shelter, status=200)
+
+    def test_adoption_request_approve(self):
+        self.assertWithinBudget(
+            reverse('adoption_request_approve', args=[self.adoption_request.pk]), 13,
+            user=self.shelter, method='post', status=302,
+        )
+
+    def test_adoption_request_reject(self):
+        self.assertWithinBudget(
+            reverse('adoption_request_reject', args=[self.adoption_request.pk]), 8,
+            user=self.shelter, method='post', status=302,
+        )
+
+    def test_adoption_request_start_delivery(self):
+        self.adoption_request.approve()
+        self.assertWithinBudget(
+            reverse('adoption_request_start_delivery', args=[self.adoption_request.pk]), 8,
+            user=self.shelter, method='post', status=302,
+            data={'estimated_delivery_date': (timezone.now() + timedelta(days=3)).date().isoformat()},
+        )
+
+    def test_adoption_request_complete_delivery(self):
+        self.adoption_request.approve()
+        self.adoption_request.transition('in_delivery', estimated_delivery_date=timezone.now().date())
+        self.assertWithinBudget(
+            reverse('adoption_request_complete_delivery', args=[self.adoption_request.pk]), 8,
+            user=self.shelter, method='post', status=302,
+            data={'actual_delivery_date': timezone.now().date().isoformat()},
+        )
+
+    def test_process_payment(self):
+        self.approve_paid_request()
+        self.assertWithinBudget(reverse('process_payment', args=[self.paid_request.pk]), 7, user=self.adopter, status=200)
+
+    def test_payment_success(self):
+        self.approve_paid_request()
+        self.client.force_login(self.adopter)
+        session = self.client.session
+        session.update({'razorpay_order_id': 'order_test', 'adoption_request_id': self.paid_request.pk})
+        session.save()
+        signature = hmac.new(
+            settings.RAZORPAY_KEY_SECRET.encode(), b'order_test|pay_test', hashlib.sha256
+        ).hexdigest()
+        self.assertWithinBudget(
+            reverse('payment_success'), 9, method='post', status=302,
+            data={'razorpay_order_id': 'order_test', 'razorpay_payment_id': 'pay_test', 'razorpay_signature': signature},
+        )
+        self.paid_request.refresh_from_db()
+        self.assertEqual(self.paid_request.payment_status, 'completed')
+
+    def test_payment_failed(self):
+        self.approve_paid_request()
+        self.client.force_login(self.adopter)
+        session = self.client.session
+        session['adoption_request_id'] = self.paid_request.pk
+        session.save()
+        self.assertWithinBudget(reverse('payment_failed'), 8, status=302)
+
+    def test_payment_success_page(self):
+        self.assertWithinBudget(reverse('payment_success_page', args=[self.paid_request.pk]), 7, user=self.adopter, status=200)
+
+    def test_notification_list(self):
+        self.assertWithinBudget(reverse('notification_list'), 7, user=self.shelter, status=200)
+
+    def test_mark_notification_read(self):
+        notification = Notification.objects.filter(user=self.shelter).first()
+        self.assertWithinBudget(
+            reverse('mark_notification_read', args=[notification.pk]), 4, user=self.shelter, method='post', status=302,
+        )
+
+    def test_mark_all_notifications_read(self):
+        self.assertWithinBudget(reverse('mark_all_notifications_read'), 3, user=self.shelter, method='post', status=302)
+
+    def test_notification_dropdown(self):
+        self.assertWithinBudget(reverse('notification_dropdown'), 4, user=self.shelter, status=200)
+
+    def test_notification_stream(self):
+        # Only the response head; the test client never reads the stream
+        self.assertWithinBudget(reverse('notification_stream'), 3, user=self.shelter, status=200)
+
+
+class StatusTransitionTests(TestCase):
+    def setUp(self):
+        shelter = User.objects.create(username='shelter')
+        adopter = User.objects.create(username='adopter')
+        pet = Pet.objects.create(
+            name='Rex', breed='Mixed', age=12, gender='male', size='large', description='Friendly', shelter=shelter,
+        )
+        self.adoption_request = AdoptionRequest.objects.create(adopter=adopter, pet=pet, message='Hello')
+
+    def history(self):
+        return list(
+            StatusTransition.objects.filter(kind=StatusTransition.ADOPTION_REQUEST, object_id=self.adoption_request.pk)
+            .order_by('pk').values_list('status', flat=True)
+        )
+
+    def test_transition_writes_the_row_and_its_history(self):
+        self.assertTrue(self.adoption_request.transition('approved', delivery_notes='Ring twice'))
+        self.assertEqual((self.adoption_request.status, self.adoption_request.delivery_notes), ('approved', 'Ring twice'))
+        row = AdoptionRequest.objects.get()
+        self.assertEqual((row.status, row.delivery_notes), ('approved', 'Ring twice'))
+        self.assertEqual(self.history(), ['pending', 'approved'])
+
+    def test_transition_from_an_unexpected_state_writes_nothing(self):
+        updated_at = self.adoption_request.updated_at
+        self.assertFalse(self.adoption_request.transition('completed'))
+        self.assertFalse(self.adoption_request.transition_payment('completed', payment_reference='X'))
+        row = AdoptionRequest.objects.get()
+        self.assertEqual((row.status, row.payment_status, row.payment_reference, row.updated_at), ('pending', 'pending', '', updated_at))
+        self.assertEqual((self.adoption_request.status, self.adoption_request.updated_at), ('pending', updated_at))
+        self.assertEqual(self.history(), ['pending'])
+
+    def test_lost_race_leaves_row_and_instance_unchanged(self):
+        stale = AdoptionRequest.objects.get()
+        self.assertTrue(self.adoption_request.transition('approved'))
+        approved_at = AdoptionRequest.objects.get().updated_at
+        self.assertFalse(stale.transition('rejected', delivery_notes='Too late'))
+        self.assertEqual((stale.status, stale.delivery_notes), ('pending', ''))
+        row = AdoptionRequest.objects.get()
+        self.assertEqual((row.status, row.delivery_notes, row.updated_at), ('approved', '', approved_at))
+        self.assertEqual(self.history(), ['pending', 'approved'])
+
+
+class FunnelAnalyticsTests(TestCase):
+    def setUp(self):
+        self.start = timezone.now() - timedelta(days=10)
+        hours = lambda n: self.start + timedelta(hours=n)
+        rows = [
+            (1, 'pending', hours(0)), (1, 'approved', hours(1)), (1, 'in_delivery', hours(24)), (1, 'completed', hours(72)),
+            # Entered approved twice; only the first time counts
+            (1, 'approved', hours(5)),
+            (2, 'pending', hours(1)), (2, 'approved', hours(3)),
+            (3, 'pending', hours(2)), (3, 'rejected', hours(4)),
+            (4, 'pending', hours(2)), (4, 'approved', hours(12)),
+            # Requested long before the cohort, approved inside it
+            (5, 'pending', hours(-480)), (5, 'approved', hours(1)),
+        ]
+        StatusTransition.objects.bulk_create([
+            StatusTransition(kind=StatusTransition.ADOPTION_REQUEST, object_id=object_id, status=status, created_at=created_at)
+            for object_id, status, created_at in rows
+        ] + [
+            # Same ids, other kind
+            StatusTransition(kind=StatusTransition.BOOKING, object_id=1, status='pending', created_at=hours(0)),
+            StatusTransition(kind=StatusTransition.BOOKING, object_id=1, status='confirmed', created_at=hours(100)),
+        ])
+
+    def test_funnel_counts_and_rates(self):
+        steps = funnel(StatusTransition.ADOPTION_REQUEST, ADOPTION_FUNNEL, since=self.start - timedelta(days=1))
+        self.assertEqual([(step['status'], step['count']) for step in steps], [
+            ('pending', 4), ('approved', 3), ('in_delivery', 1), ('completed', 1),
+        ])
+        self.assertEqual([step['rate'] for step in steps], [1, 0.75, 0.25, 0.25])
+        self.assertEqual([step['step_rate'] for step in steps], [1, 0.75, 1 / 3, 1])
+
+    def test_cohort_window(self):
+        steps = funnel(
+            StatusTransition.ADOPTION_REQUEST, ADOPTION_FUNNEL, since=self.start, until=self.start + timedelta(minutes=90),
+        )
+        self.assertEqual([step['count'] for step in steps], [2, 2, 1, 1])
+        steps = funnel(StatusTransition.ADOPTION_REQUEST, ADOPTION_FUNNEL, since=timezone.now())
+        self.assertEqual([(step['count'], step['rate'], step['step_rate']) for step in steps], [(0, 0, 0)] * 4)
+
+    def test_latency_percentiles(self):
+        latency = latency_percentiles(
+            StatusTransition.ADOPTION_REQUEST, 'pending', 'approved', percentiles=(50, 90, 100),
+            since=self.start - timedelta(days=1),
+        )
+        # Request 3 was never approved and request 5 is outside the cohort
+        self.assertEqual(latency, {'count': 3, 'percentiles': {
+            50: timedelta(hours=2), 90: timedelta(hours=10), 100: timedelta(hours=10),
+        }})
+        latency = latency_percentiles(StatusTransition.BOOKING, 'pending', 'confirmed', percentiles=(50,))
+        self.assertEqual(latency, {'count': 1, 'percentiles': {50: timedelta(hours=100)}})
+        self.assertEqual(
+            latency_percentiles(StatusTransition.BOOKING, 'confirmed', 'completed'), {'count': 0, 'percentiles': {}},
+        )
+
+    def test_funnel_report(self):
+        out = StringIO()
+        call_command('funnel_report', days=30, stdout=out)
+        self.assertIn('approved          3    75.0%  (75.0% of previous)', out.getvalue())
+        self.assertIn('Booking pending -> confirmed (1): p50 4 days, 4:00:00', out.getvalue())
+
+
+class AdoptionApprovalTests(TestCase):
+    def setUp(self):
+        shelter = User.objects.create(username='shelter')
+        self.pet, other_pet = [
+            Pet.objects.create(
+                name=name, breed='Mixed', age=12, gender='male', size='large', description='Friendly', shelter=shelter,
+            )
+            for name in ('Rex', 'Max')
+        ]
+        adopters = [User.objects.create(username=f'adopter{i}') for i in range(4)]
+        self.requests = [AdoptionRequest.objects.create(adopter=adopter, pet=self.pet) for adopter in adopters[:3]]
+        self.cancelled = AdoptionRequest.objects.create(adopter=adopters[3], pet=self.pet, status='cancelled')
+        self.other_pet_request = AdoptionRequest.objects.create(adopter=adopters[0], pet=other_pet)
+
+    def statuses(self):
+        return dict(AdoptionRequest.objects.values_list('pk', 'status'))
+
+    def test_approve_rejects_the_other_pending_requests(self):
+        approved = self.requests[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            approved_now, rejected_ids = approved.approve()
+        self.assertTrue(approved_now)
+        self.assertEqual(sorted(rejected_ids), [self.requests[1].pk, self.requests[2].pk])
+        self.assertEqual(self.statuses(), {
+            approved.pk: 'approved', self.requests[1].pk: 'rejected', self.requests[2].pk: 'rejected',
+            self.cancelled.pk: 'cancelled', self.other_pet_request.pk: 'pending',
+        })
+        self.assertFalse(Pet.objects.get(pk=self.pet.pk).is_available)
+        # Free adoptions skip the payment step
+        self.assertEqual(AdoptionRequest.objects.get(pk=approved.pk).payment_status, 'completed')
+        self.assertEqual(
+            sorted(StatusTransition.objects.filter(status='rejected').values_list('object_id', flat=True)),
+            [self.requests[1].pk, self.requests[2].pk],
+        )
+
+    @override_settings(TASK_QUEUE_EAGER=False)
+    def test_approval_notifications_are_sent_by_one_task(self):
+        self.client.force_login(self.pet.shelter)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('adoption_request_approve', args=[self.requests[0].pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Task.objects.filter(name='adoption.tasks.send_adoption_notifications').count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('run_tasks', once=True, stdout=StringIO())
+        self.assertEqual(
+            sorted(Notification.objects.values_list('user__username', 'event')),
+            [('adopter0', Notification.ADOPTION_APPROVED), ('adopter1', Notification.ADOPTION_REJECTED),
+             ('adopter2', Notification.ADOPTION_REJECTED)],
+        )
+
+    def test_second_approval_of_the_same_pet_fails(self):
+        # Loaded before the first approval, as by a concurrent request
+        rival = AdoptionRequest.objects.select_related('pet').get(pk=self.requests[1].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.requests[0].approve()[0])
+        self.assertEqual(rival.approve(), (False, []))
+        self.assertEqual(rival.status, 'pending')
+        self.assertEqual(self.statuses()[rival.pk], 'rejected')
+        self.assertEqual(StatusTransition.objects.filter(status='approved').count(), 1)
+
+    def test_request_stays_pending_when_the_pet_is_taken(self):
+        Pet.objects.filter(pk=self.pet.pk).update(is_available=False)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertEqual(self.requests[0].approve(), (False, []))
+        self.assertEqual(callbacks, [])
+        self.assertEqual(set(self.statuses().values()), {'pending', 'cancelled'})
+
+    def test_lost_approval_puts_the_pet_back(self):
+        # Cancelled by the adopter after the shelter loaded the request
+        AdoptionRequest.objects.filter(pk=self.requests[0].pk).update(status='cancelled')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertEqual(self.requests[0].approve(), (False, []))
+        # The reservation was rolled back, so nothing was told about it either
+        self.assertEqual(callbacks, [])
+        self.assertTrue(self.pet.is_available)
+        self.assertTrue(Pet.objects.get(pk=self.pet.pk).is_available)
+        self.assertEqual(self.statuses()[self.requests[1].pk], 'pending')
+
+
+class PaymentSuccessTests(TestCase):
+    def setUp(self):
+        shelter = User.objects.create(username='shelter')
+        self.adopter = User.objects.create(username='adopter')
+        pet = Pet.objects.create(
+            name='Rex', breed='Mixed', age=12, gender='male', size='large', description='Friendly',
+            price=1500, shelter=shelter,
+        )
+        self.adoption_request = AdoptionRequest.objects.create(adopter=self.adopter, pet=pet)
+        self.adoption_request.approve()
+        self.client.force_login(self.adopter)
+
+    def pay(self, payment_id):
+        session = self.client.session
+        session.update({'razorpay_order_id': 'order_test', 'adoption_request_id': self.adoption_request.pk})
+        session.save()
+        signature = hmac.new(
+            settings.RAZORPAY_KEY_SECRET.encode(), f'order_test|{payment_id}'.encode(), hashlib.sha256
+        ).hexdigest()
+        response = self.client.post(reverse('payment_success'), {
+            'razorpay_order_id': 'order_test', 'razorpay_payment_id': payment_id, 'razorpay_signature': signature,
+        }, follow=True)
+        self.adoption_request.refresh_from_db()
+        return [str(message) for message in response.context['messages']]
+
+    def test_payment_for_a_cancelled_request_is_flagged_for_refund(self):
+        # Cancelled in another tab while the adopter was at checkout
+        self.adoption_request.transition('cancelled')
+        self.assertIn('Your payment will be refunded', ' '.join(self.pay('pay_late')))
+        self.assertEqual(
+            (self.adoption_request.payment_status, self.adoption_request.payment_reference), ('refund_due', 'pay_late'),
+        )
+
+    def test_repeated_payment_is_not_flagged(self):
+        self.pay('pay_test')
+        self.assertEqual(self.adoption_request.payment_status, 'completed')
+        self.assertIn('already been recorded', ' '.join(self.pay('pay_test')))
+        self.assertEqual(self.adoption_request.payment_status, 'completed')
+
+    def test_second_payment_is_logged_for_refund(self):
+        self.pay('pay_test')
+        with self.assertLogs('adoption.views', 'ERROR') as logs:
+            self.assertIn('Your payment will be refunded', ' '.join(self.pay('pay_again')))
+        self.assertIn('pay_again', logs.output[0])
+        self.assertEqual(self.adoption_request.payment_reference, 'pay_test')
+
+
+class CatalogVersionTests(TestCase):
+    def test_version_is_bumped_after_commit(self):
+        shelter = User.objects.create(username='shelter')
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            pet = Pet.objects.create(
+                name='Rex', breed='Mixed', age=12, gender='male', size='large', description='Friendly', shelter=shelter,
+            )
+            pet.reserve()
+            self.assertEqual(get_catalog_version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(get_catalog_version(), version)
+
+    def test_evicted_version_does_not_go_back(self):
+        old = get_catalog_version()
+        bump_catalog_version()
+        current = get_catalog_version()
+        # e.g. culled by the file cache
+        cache.delete(CATALOG_VERSION_KEY)
+        self.assertGreater(get_catalog_version(), current)
+        self.assertGreater(current, old)
+
+
+class FeaturedPetsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        shelter = User.objects.create(username='shelter')
+        pets = [
+            Pet.objects.create(
+                name=f'Pet {i}', breed='Mixed', age=12, gender='male', size='large', description='Friendly',
+                shelter=shelter,
+            )
+            for i in range(12)
+        ]
+        for pet in pets[1::3]:
+            pet.reserve()
+        self.available = {pet.pk for pet in pets if pet.is_available}
+
+    def picked(self, rounds=300):
+        seen = set()
+        for i in range(rounds):
+            pets = featured.get_featured_pets()
+            self.assertEqual(len(pets), 3)
+            self.assertEqual(len({pet.pk for pet in pets}), 3)
+            seen.update(pet.pk for pet in pets)
+        return seen
+
+    def test_every_available_pet_can_be_featured(self):
+        self.assertEqual(self.picked(), self.available)
+        with self.assertNumQueries(1):
+            featured.get_featured_pets()
+
+    def test_sparse_ids_are_filled_in(self):
+        with mock.patch.object(featured, 'FEATURED_MAX_CANDIDATES', 1):
+            self.assertEqual(self.picked(), self.available)
+            # The drawn id, then the pets from a random id on and, at worst, wrapping around
+            with self.assertNumQueries(3):
+                with mock.patch.object(featured.random, 'randint', return_value=max(self.available)):
+                    self.assertEqual(len(featured.get_featured_pets()), 3)
+
+    def test_short_draws_are_filled_in(self):
+        # Every drawn id misses, as can happen by chance when few ids are drawn
+        with mock.patch.object(featured.random, 'sample', return_value=[]):
+            pets = featured.get_featured_pets()
+        self.assertEqual(len({pet.pk for pet in pets}), 3)
+        self.assertTrue({pet.pk for pet in pets} <= self.available)
+
+
+class NotificationCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='adopter')
+
+    def test_new_notifications_drop_the_cached_count(self):
+        self.assertEqual(get_unread_notifications_count(self.user), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_notifications([Notification(user=self.user, message='Hello'), Notification(user=self.user, message='Again')])
+        self.assertIsNone(cache.get(unread_count_cache_key(self.user.pk)))
+        self.assertEqual(get_unread_notifications_count(self.user), 2)
+
+    @override_settings(TASK_QUEUE_EAGER=False)
+    def test_notifications_from_the_task_worker_reach_the_web(self):
+        shelter = User.objects.create(username='shelter')
+        pet = Pet.objects.create(
+            name='Rex', breed='Mixed', age=12, gender='male', size='large', description='Friendly', shelter=shelter,
+        )
+        adoption_request = AdoptionRequest.objects.create(adopter=self.user, pet=pet, message='Hello')
+        self.assertEqual(get_unread_notifications_count(shelter), 0)
+        queue_adoption_notification(Notification.ADOPTION_REQUESTED, adoption_request)
+        # Queued, not run: the web still shows the count it cached
+        self.assertEqual(get_unread_notifications_count(shelter), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('run_tasks', once=True, stdout=StringIO())
+        notification = Notification.objects.get(user=shelter)
+        self.assertEqual(get_unread_notifications_count(shelter), 1)
+        # What open streams in the web processes wake up on
+        self.assertEqual(cache.get(latest_notification_cache_key(shelter.pk)), notification.pk)
+
+    def test_notifications_outlive_the_pet(self):
+        shelter = User.objects.create(username='shelter')
+        pet = Pet.objects.create(
+            name='Rex', breed='Mixed', age=12, gender='male', size='large', description='Friendly', shelter=shelter,
+        )
+        adoption_request = AdoptionRequest.objects.create(adopter=self.user, pet=pet, message='Hello')
+        notification = create_event_notification(self.user, Notification.ADOPTION_APPROVED, adoption_request)
+        self.assertEqual(notification.get_message(), 'Your adoption request for Rex has been approved!')
+
+        pet.delete()
+        notification.refresh_from_db()
+        self.assertEqual((notification.pet, notification.adoption_request), (None, None))
+        self.assertEqual(notification.get_message(), 'Adoption approved (no longer available)')
+
+
+class NotificationListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='adopter')
+        Notification.objects.bulk_create([Notification(user=self.user, message=f'Update {i}') for i in range(5)])
+        self.client.force_login(self.user)
+
+    @mock.patch('adoption.views.NOTIFICATIONS_PAGE_SIZE', 3)
+    def test_only_the_displayed_page_is_marked_read(self):
+        self.assertEqual(get_unread_notifications_count(self.user), 5)
+        response = self.client.get(reverse('notification_list'))
+        first_page = response.context['notifications']
+        self.assertEqual([n.message for n in first_page], ['Update 4', 'Update 3', 'Update 2'])
+        self.assertEqual(response.context['unread_count'], 5)
+        self.assertEqual(
+            set(Notification.objects.filter(is_read=True).values_list('pk', flat=True)), {n.pk for n in first_page},
+        )
+        # The cached badge count is dropped along with them
+        self.assertEqual(get_unread_notifications_count(self.user), 2)
+
+        response = self.client.get(response.context['next_page_url'])
+        self.assertEqual([n.message for n in response.context['notifications']], ['Update 1', 'Update 0'])
+        self.assertIsNone(response.context['next_page_url'])
+        self.assertEqual(response.context['read_count'], 3)
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+    def test_other_users_notifications_are_left_alone(self):
+        other = User.objects.create(username='other')
+        Notification.objects.create(user=other, message='Not yours')
+        response = self.client.get(reverse('notification_list'))
+        self.assertEqual(len(response.context['notifications']), 5)
+        self.assertFalse(Notification.objects.get(user=other).is_read)
+
+
+class ArchiveNotificationsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='adopter')
+        shelter = User.objects.create(username='shelter')
+        pet = Pet.objects.create(
+            name='Rex', breed='Mixed', age=12, gender='male', size='large', description='Friendly', shelter=shelter,
+        )
+        adoption_request = AdoptionRequest.objects.create(adopter=self.user, pet=pet, message='Hello')
+        old = timezone.now() - timedelta(days=100)
+        self.old_read = [
+            create_event_notification(self.user, Notification.ADOPTION_APPROVED, adoption_request),
+            *create_notifications([Notification(user=self.user, message=f'Old {i}', is_read=True) for i in range(4)]),
+        ]
+        self.old_unread = Notification.objects.create(user=self.user, message='Old but unread')
+        self.recent_read = Notification.objects.create(user=self.user, message='Recent', is_read=True)
+        Notification.objects.filter(pk__in=[n.pk for n in self.old_read] + [self.old_unread.pk]).update(created_at=old)
+        Notification.objects.filter(pk=self.old_read[0].pk).update(is_read=True)
+
+    def test_dry_run_only_counts(self):
+        out = StringIO()
+        call_command('archive_notifications', dry_run=True, stdout=out)
+        self.assertIn('5 read notifications older than', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 7)
+        self.assertFalse(ArchivedNotification.objects.exists())
+
+    def test_old_read_notifications_are_moved_in_batches(self):
+        out = StringIO()
+        call_command('archive_notifications', batch_size=2, stdout=out)
+        self.assertEqual([line.strip() for line in out.getvalue().splitlines()[:3]], ['2 rows...', '4 rows...', '5 rows...'])
+        self.assertIn('Archived 5 notifications', out.getvalue())
+        self.assertEqual(
+            set(Notification.objects.values_list('pk', flat=True)), {self.old_unread.pk, self.recent_read.pk},
+        )
+        archived = ArchivedNotification.objects.filter(user=self.user)
+        self.assertEqual(archived.count(), 5)
+        # Event notifications are kept as their rendered text
+        self.assertTrue(archived.filter(message='Your adoption request for Rex has been approved!').exists())
+
+    def test_age_cutoff(self):
+        call_command('archive_notifications', days=200, stdout=StringIO())
+        self.assertEqual(Notification.objects.count(), 7)
+        call_command('archive_notifications', days=0, stdout=StringIO())
+        self.assertEqual(list(Notification.objects.values_list('pk', flat=True)), [self.old_unread.pk])
+
+    def test_delete_skips_the_archive(self):
+        out = StringIO()
+        call_command('archive_notifications', delete=True, stdout=out)
+        self.assertIn('Deleted 5 notifications', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertFalse(ArchivedNotification.objects.exists())
+
+
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        shelter = User.objects.create(username='shelter')
+        self.adopter = User.objects.create(username='adopter')
+        pet = Pet.objects.create(
+            name='Rex', pet_type='dog', breed='Mixed', age=12, gender='male', size='medium',
+            description='Friendly', shelter=shelter,
+        )
+        self.adoption_request = AdoptionRequest.objects.create(adopter=self.adopter, pet=pet, message='Hello')
+
+    def first_notification(self, last_id=0, when_idle=None):
+        """The first notification frame of a stream; when_idle runs at its first keep-alive"""
+        async def read():
+            events = notification_events(self.adopter.pk, last_id)
+            try:
+                async for frame in events:
+                    if frame.startswith('id:'):
+                        return frame
+                    if frame.startswith(': keep-alive') and when_idle:
+                        await when_idle()
+            finally:
+                await events.aclose()
+        return async_to_sync(read)()
+
+    @override_settings(NOTIFICATION_STREAM_POLL_INTERVAL=0.01, NOTIFICATION_STREAM_WAKE_INTERVAL=0.01)
+    def test_stream_renders_event_notifications(self):
+        notification = create_event_notification(self.adopter, Notification.ADOPTION_APPROVED, self.adoption_request)
+        frame = self.first_notification()
+        self.assertIn(f'id: {notification.pk}\n', frame)
+        self.assertIn('approved', frame)
+
+    @override_settings(NOTIFICATION_STREAM_POLL_INTERVAL=60, NOTIFICATION_STREAM_WAKE_INTERVAL=0.01)
+    def test_stream_wakes_on_notifications_from_other_processes(self):
+        created = []
+
+        async def other_process():
+            # Written elsewhere: nothing is published to this process
+            notification = await Notification.objects.acreate(
+                user=self.adopter, event=Notification.ADOPTION_APPROVED,
+                adoption_request=self.adoption_request, pet=self.adoption_request.pet,
+            )
+            created.append(notification)
+            await cache.aset(latest_notification_cache_key(self.adopter.pk), notification.pk)
+
+        # Read from the database long before the next regular poll
+        frame = self.first_notification(when_idle=other_process)
+        self.assertIn(f'id: {created[0].pk}\n', frame)
+
+    @override_settings(NOTIFICATION_STREAM_WSGI_MAX_AGE=0, NOTIFICATION_STREAM_POLL_INTERVAL=20)
+    def test_wsgi_stream_ends_after_sending_what_is_new(self):
+        notification = create_event_notification(self.adopter, Notification.ADOPTION_APPROVED, self.adoption_request)
+        self.client.force_login(self.adopter)
+        response = self.client.get(reverse('notification_stream'), headers={'Last-Event-ID': '0'})
+        content = b''.join(response.streaming_content).decode()
+        self.assertTrue(content.startswith('retry: 20000\n\n'))
+        self.assertIn(f'id: {notification.pk}\n', content)
+
+    def test_pages_only_open_the_stream_when_enabled(self):
+        self.client.force_login(self.adopter)
+        self.assertNotContains(self.client.get(reverse('home')), 'data-stream-url="')
+        with self.settings(NOTIFICATION_STREAM_ENABLED=True):
+            self.assertContains(self.client.get(reverse('home')), 'data-stream-url="')
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        shelter = User.objects.create(username='shelter')
+        # Prices repeat so pages have to break ties on pk
+        self.pets = [
+            Pet.objects.create(
+                name=f'Pet {i:02}', breed='Mixed', age=12, gender='male', size='large', description='Friendly',
+                price=[100, 200, 200, 300][i % 4], shelter=shelter,
+            )
+            for i in range(10)
+        ]
+
+    def walk(self, queryset, ordering, page_size):
+        """Every page from the first, following next cursors"""
+        pages, cursor = [], ''
+        while True:
+            items, cursor = keyset_paginate(queryset, ordering, cursor, page_size=page_size)
+            pages.append([pet.pk for pet in items])
+            if cursor is None:
+                return pages
+
+    def test_cursor_round_trip(self):
+        data = {'v': '2026-01-01T00:00:00+00:00', 'pk': 7}
+        cursor = encode_cursor(data)
+        self.assertRegex(cursor, r'^[A-Za-z0-9_-]+$')
+        self.assertEqual(decode_cursor(cursor), data)
+
+    def test_malformed_cursors_are_rejected(self):
+        for cursor in ('!!!', encode_cursor([1, 2])[:-1] + '*', 'bm90IGpzb24', encode_cursor([1, 2])):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_pages_follow_on_without_gaps_or_repeats(self):
+        ordered = list(Pet.objects.order_by('price', 'pk').values_list('pk', flat=True))
+        pages = self.walk(Pet.objects.all(), 'price', 3)
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 1])
+        self.assertEqual(sum(pages, []), ordered)
+
+        ordered = list(Pet.objects.order_by('-price', '-pk').values_list('pk', flat=True))
+        self.assertEqual(sum(self.walk(Pet.objects.all(), '-price', 4), []), ordered)
+
+    def test_first_and_last_page(self):
+        items, cursor = keyset_paginate(Pet.objects.all(), 'name', page_size=5)
+        self.assertEqual([pet.name for pet in items], [f'Pet {i:02}' for i in range(5)])
+        items, cursor = keyset_paginate(Pet.objects.all(), 'name', cursor, page_size=5)
+        # Exactly a full last page has no next page
+        self.assertEqual(len(items), 5)
+        self.assertIsNone(cursor)
+        self.assertEqual(keyset_paginate(Pet.objects.none(), 'name'), ([], None))
+
+    def test_cursor_after_the_last_row(self):
+        last = Pet.objects.order_by('created_at', 'pk').last()
+        cursor = encode_cursor({'v': last.created_at.isoformat(), 'pk': last.pk})
+        self.assertEqual(keyset_paginate(Pet.objects.all(), 'created_at', cursor), ([], None))
+
+    def test_relevance_order_falls_back_to_offsets(self):
+        ordered = Pet.objects.order_by('-name')
+        items, cursor = keyset_paginate(ordered, None, page_size=4)
+        self.assertEqual(decode_cursor(cursor), {'o': 4})
+        items, cursor = keyset_paginate(ordered, None, cursor, page_size=4)
+        self.assertEqual([pet.name for pet in items], [f'Pet {i:02}' for i in range(5, 1, -1)])
+        self.assertEqual(self.walk(ordered, None, 4)[-1], [pet.pk for pet in ordered[8:]])
+
+    def test_bad_cursors_start_from_the_first_page(self):
+        first, _ = keyset_paginate(Pet.objects.all(), 'price', page_size=3)
+        for cursor in ('!!!', encode_cursor({'v': 'not a price', 'pk': 1}), encode_cursor({'pk': 1})):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(keyset_paginate(Pet.objects.all(), 'price', cursor, page_size=3)[0], first)
+        ordered = Pet.objects.order_by('-name')
+        items, _ = keyset_paginate(ordered, None, encode_cursor({'o': 'x'}), page_size=3)
+        self.assertEqual(items, list(ordered[:3]))
+
+    @mock.patch('adoption.views.keyset_paginate', partial(keyset_paginate, page_size=4))
+    def test_pet_list_links_the_next_page(self):
+        response = self.client.get(reverse('pet_list'), {'sort_by': 'price_low', 'gender': 'male'})
+        pets = response.context['pets']
+        url = response.context['next_fragment_url']
+        self.assertTrue(url.startswith(reverse('pet_list_page') + '?'))
+        self.assertEqual(parse_qs(urlsplit(url).query)['sort_by'], ['price_low'])
+        self.assertEqual(parse_qs(urlsplit(url).query)['gender'], ['male'])
+        next_page = self.client.get(url).context['pets']
+        self.assertEqual(
+            [pet.pk for pet in pets] + [pet.pk for pet in next_page],
+            list(Pet.objects.order_by('price', 'pk').values_list('pk', flat=True)[:8]),
+        )
+
+    @mock.patch('adoption.views.keyset_paginate', partial(keyset_paginate, page_size=4))
+    def test_search_pages_by_relevance(self):
+        response = self.client.get(reverse('pet_list'), {'search': 'friendly'})
+        self.assertEqual(len(response.context['pets']), 4)
+        cursor = parse_qs(urlsplit(response.context['next_page_url']).query)['cursor'][0]
+        self.assertEqual(decode_cursor(cursor), {'o': 4})
+
+
+class PetSearchTests(TestCase):
+    def setUp(self):
+        self.shelter = User.objects.create(username='shelter')
+        self.goldie = self.create_pet('Goldie', 'Golden Retriever', 'Calm, great with kids')
+        self.whiskers = self.create_pet('Whiskers', 'Tabby', 'Loves naps AND near windows')
+
+    def create_pet(self, name, breed, description):
+        return Pet.objects.create(
+            name=name, breed=breed, age=12, gender='female', size='medium', description=description,
+            shelter=self.shelter,
+        )
+
+    def search(self, query):
+        return list(search.search_pets(Pet.objects.all(), query))
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.search('gold ret'), [self.goldie])
+        self.assertEqual(self.search('WHISK'), [self.whiskers])
+        self.assertEqual(self.search('retrievers'), [self.goldie])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.goldie.name = 'Sunny'
+        self.goldie.save()
+        self.assertEqual(self.search('sunny'), [self.goldie])
+        self.assertEqual(self.search('goldie'), [])
+
+        pk = self.goldie.pk
+        self.goldie.delete()
+        self.assertEqual(self.search('golden'), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {search.FTS_TABLE} WHERE rowid = %s', [pk])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_fts_syntax_is_escaped(self):
+        # Operators and quotes are searched for as words, never parsed as FTS5 syntax
+        self.assertEqual(self.search('AND'), [self.whiskers])
+        self.assertEqual(self.search('near'), [self.whiskers])
+        self.assertEqual(self.search('NEAR(tabby naps)'), [self.whiskers])
+        self.assertEqual(self.search('tabby OR golden'), [])
+        self.assertEqual(self.search('"*'), [])
+        self.assertEqual(self.search('golden"* -'), [self.goldie])
+
+    def backend_for(self, vendor, backend_path=''):
+        with mock.patch.object(search, '_backend', None), mock.patch.object(connection, 'vendor', vendor), \
+                override_settings(PET_SEARCH_BACKEND=backend_path):
+            return type(search.get_search_backend())
+
+    def test_backend_follows_the_database(self):
+        self.assertIs(self.backend_for('sqlite'), search.SQLiteFTSBackend)
+        self.assertIs(self.backend_for('postgresql'), search.DatabaseSearchBackend)
+        # The FTS table only exists on SQLite, so asking for it elsewhere falls back
+        self.assertIs(self.backend_for('postgresql', 'adoption.search.SQLiteFTSBackend'), search.DatabaseSearchBackend)
+
+
+class ImageRenditionTests(TempMediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.shelter = User.objects.create(username='shelter')
+
+    def upload(self, size=(3000, 2000)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'teal').save(buffer, 'JPEG')
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_renditions_are_generated_and_used(self):
+        pet = Pet.objects.create(
+            name='Rex', breed='Mixed', age=12, gender='male', size='large', description='Friendly',
+            shelter=self.shelter, image=self.upload(),
+        )
+        # Until the task has run the templates get the original
+        self.assertEqual(pet.image_thumb_url, pet.image.url)
+        self.assertEqual(pet.image_srcset, '')
+
+        generate_image_renditions(model='adoption.Pet', pk=pet.pk, name=pet.image.name)
+        pet.refresh_from_db()
+        for name in rendition_names(pet.image.name):
+            self.assertTrue(pet.image.storage.exists(name), name)
+        with pet.image.storage.open(pet.image.name.replace('.jpg', '.thumb.webp')) as f:
+            self.assertEqual(Image.open(f).size, (320, 240))
+        with pet.image.storage.open(pet.image.name.replace('.jpg', '.medium.jpg')) as f:
+            self.assertEqual(Image.open(f).size, (800, 533))
+        self.assertTrue(pet.image_thumb_url.endswith('.thumb.jpg'))
+        self.assertIn('.medium.webp 800w', pet.image_webp_srcset)
+
+    @override_settings(TASK_QUEUE_EAGER=False)
+    def test_renditions_are_only_queued_for_a_new_image(self):
+        def queued():
+            return Task.objects.filter(name='adoption.tasks.generate_image_renditions').count()
+
+        pet = Pet.objects.create(
+            name='Rex', breed='Mixed', age=12, gender='male', size='large', description='Friendly',
+            shelter=self.shelter, image=self.upload(),
+        )
+        self.assertEqual(queued(), 1)
+        pet = Pet.objects.get(pk=pet.pk)
+        pet.name = 'Max'
+        pet.save()
+        self.assertEqual(queued(), 1)
+        pet.image = self.upload(size=(1000, 1000))
+        pet.save()
+        self.assertEqual(queued(), 2)
+
+
+class UploadNormalizationTests(TestCase):
+    data = {
+        'name': 'Rex', 'pet_type': 'dog', 'breed': 'Mixed', 'age': 12, 'gender': 'male',
+        'size': 'large', 'description': 'Friendly', 'price': 0,
+    }
+
+    def photo(self, size, image_format='JPEG', orientation=None):
+        image = Image.new('RGB', size, 'teal')
+        exif = Image.Exif()
+        if orientation:
+            exif[0x0112] = orientation
+        exif[0x010F] = 'Phone Maker'
+        buffer = BytesIO()
+        image.save(buffer, image_format, exif=exif)
+        return SimpleUploadedFile(f'photo.{image_format.lower()}', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_large_photo_is_shrunk_rotated_and_stripped(self):
+        upload = self.photo((4000, 3000), orientation=6)
+        form = PetForm(self.data, {'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        image = Image.open(form.cleaned_data['image'])
+        # Orientation 6 is a 90 degree turn, applied before scaling to the 2048px cap
+        self.assertEqual(image.size, (1536, 2048))
+        self.assertEqual(dict(image.getexif()), {})
+        self.assertEqual(form.image_bytes_saved, upload.size - form.cleaned_data['image'].size)
+
+    def test_small_clean_photo_is_stored_as_uploaded(self):
+        buffer = BytesIO()
+        Image.new('RGB', (800, 600), 'teal').save(buffer, 'PNG')
+        upload = SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+        form = PetForm(self.data, {'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIs(form.cleaned_data['image'], upload)
+        self.assertEqual(form.image_bytes_saved, 0)
+
+    def test_oversized_file_is_rejected(self):
+        upload = self.photo((400, 300))
+        with mock.patch.object(images, 'IMAGE_UPLOAD_MAX_BYTES', upload.size - 1):
+            form = PetForm(self.data, {'image': upload})
+            self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+
+class ContentAddressedStorageTests(TempMediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.shelter = User.objects.create(username='shelter')
+
+    def upload(self, color='teal', name='photo.jpg'):
+        buffer = BytesIO()
+        Image.new('RGB', (64, 64), color).save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def create_pet(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Pet.objects.create(
+                name='Rex', breed='Mixed', age=12, gender='male', size='large', description='Friendly',
+                shelter=self.shelter, image=image,
+            )
+
+    def test_identical_uploads_share_one_sharded_file(self):
+        first = self.create_pet(self.upload(name='rex.jpg'))
+        second = self.create_pet(self.upload(name='rex-again.jpeg'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^pet_images/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.jpg$')
+        self.assertEqual(MediaFile.objects.get(name=first.image.name).references, 2)
+
+    def test_last_reference_deletes_the_file(self):
+        first = self.create_pet(self.upload())
+        second = self.create_pet(self.upload())
+        storage, name = first.image.storage, first.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_reupload_before_the_delete_keeps_the_file(self):
+        pet = self.create_pet(self.upload())
+        storage, name = pet.image.storage, pet.image.name
+        with self.captureOnCommitCallbacks() as callbacks:
+            pet.delete()
+        # The same photo is uploaded again before the delete runs; its row isn't saved yet
+        self.assertEqual(storage.save('pet_images/again.jpg', self.upload()), name)
+        for callback in callbacks:
+            callback()
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(self.create_pet(name).image.name, name)
+        self.assertEqual(MediaFile.objects.get(name=name).references, 1)
+
+    def test_delete_rechecks_the_references(self):
+        pet = self.create_pet(self.upload())
+        storage, name = pet.image.storage, pet.image.name
+        with self.captureOnCommitCallbacks() as callbacks:
+            pet.delete()
+        self.create_pet(name)
+        for callback in callbacks:
+            callback()
+        self.assertTrue(storage.exists(name))
+
+    def test_replacing_an_image_releases_the_old_one(self):
+        pet = Pet.objects.get(pk=self.create_pet(self.upload('teal')).pk)
+        old = pet.image.name
+        pet.image = self.upload('orange')
+        with self.captureOnCommitCallbacks(execute=True):
+            pet.save()
+        self.assertNotEqual(pet.image.name, old)
+        self.assertFalse(pet.image.storage.exists(old))
+        self.assertEqual(MediaFile.objects.get(name=pet.image.name).references, 1)
+
+    def test_default_image_is_not_counted(self):
+        pet = self.create_pet('pet_images/default_pet.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            pet.delete()
+        self.assertFalse(MediaFile.objects.exists())
+
+    def test_collect_orphaned_media(self):
+        pet = self.create_pet(self.upload())
+        storage = pet.image.storage
+        live = [pet.image.name] + rendition_names(pet.image.name)
+        for name in live[1:]:
+            storage.store(name, ContentFile(b'rendition'))
+        orphans = ['pet_images/00/00/orphan.jpg', 'pet_images/legacy.png'] + rendition_names('pet_images/00/00/orphan.jpg')
+        for name in orphans:
+            storage.store(name, ContentFile(b'orphan'))
+        MediaFile.objects.create(name=orphans[0], references=0)
+
+        out = StringIO()
+        call_command('collect_orphaned_media', dry_run=True, min_age=0, stdout=out)
+        self.assertIn('Would delete 6 orphans', out.getvalue())
+        self.assertTrue(all(storage.exists(name) for name in orphans))
+
+        call_command('collect_orphaned_media', min_age=0, batch_size=1, stdout=StringIO())
+        self.assertFalse(any(storage.exists(name) for name in orphans))
+        self.assertTrue(all(storage.exists(name) for name in live))
+        self.assertEqual(list(MediaFile.objects.values_list('name', flat=True)), [pet.image.name])
+
+        # Files younger than --min-age may belong to an upload that hasn't committed yet
+        storage.store(orphans[0], ContentFile(b'orphan'))
+        call_command('collect_orphaned_media', stdout=StringIO())
+        self.assertTrue(storage.exists(orphans[0]))
+
+    def test_collect_orphaned_media_keeps_renditions_without_a_known_source(self):
+        pet = self.create_pet(self.upload())
+        storage = pet.image.storage
+        original = pet.image.name
+        # An upload from before renditions existed whose name happens to look like one
+        legacy = storage.store('pet_images/legacy.thumb.jpg', ContentFile(b'legacy'))
+        pet.image = legacy
+        pet.save()
+        # A rendition whose original is gone; nothing says which file it belonged to
+        stray = storage.store('pet_images/00/00/stray.medium.webp', ContentFile(b'stray'))
+
+        out = StringIO()
+        call_command('collect_orphaned_media', min_age=0, stdout=out)
+        self.assertTrue(storage.exists(legacy))
+        self.assertTrue(storage.exists(stray))
+        self.assertFalse(storage.exists(original))
+        self.assertIn('Deleted 1 orphans', out.getvalue())
+
+    def test_collect_orphaned_media_keeps_held_and_referenced_files(self):
+        storage = Pet._meta.get_field('image').storage
+        # An old file that a new upload deduplicated onto; its mtime doesn't change
+        held = storage.save('pet_images/held.jpg', self.upload('teal'))
+        referenced = storage.save('pet_images/referenced.jpg', self.upload('orange'))
+        MediaFile.objects.filter(name=referenced).update(held_until=None, references=1)
+
+        out = StringIO()
+        call_command('collect_orphaned_media', min_age=0, stdout=out)
+        self.assertTrue(storage.exists(held))
+        self.assertTrue(storage.exists(referenced))
+        self.assertIn('Deleted 0 orphans', out.getvalue())
+
+        MediaFile.objects.filter(name=held).update(held_until=None)
+        call_command('collect_orphaned_media', min_age=0, stdout=StringIO())
+        self.assertFalse(storage.exists(held))
+        self.assertFalse(MediaFile.objects.filter(name=held).exists())
@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('', views.pet_list, name='pet_list'),
+    path('pets/page/', views.pet_list_page, name='pet_list_page'),
     path('pet/<int:pk>/', views.pet_detail, name='pet_detail'),
     path('pet/new/', views.pet_create, name='pet_create'),
     path('pet/<int:pk>/edit/', views.pet_update, name='pet_update'),
@@ -31,4 +32,6 @@ urlpatterns = [
     path('notifications/', views.notification_list, name='notification_list'),
     path('notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
     path('notifications/mark-all-read/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
+    path('notifications/dropdown/', views.notification_dropdown, name='notification_dropdown'),
+    path('notifications/stream/', views.notification_stream, name='notification_stream'),
 ]
\ No newline at end of file
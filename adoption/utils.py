@@ -1,55 +1,103 @@
+from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
 from .models import Notification
+from .pubsub import publish
 
-def create_notification(user, message, related_url=''):
-    """Create a new notification for a user"""
-    notification = Notification.objects.create(
+NOTIFICATION_CACHE_TIMEOUT = getattr(settings, 'NOTIFICATION_CACHE_TIMEOUT', 300)
+
+def unread_count_cache_key(user_id):
+    return f'adoption:unread_notifications:{user_id}'
+
+def recent_notifications_cache_key(user_id, limit):
+    return f'adoption:recent_notifications:{user_id}:{limit}'
+
+def latest_notification_cache_key(user_id):
+    return f'adoption:latest_notification:{user_id}'
+
+def clear_notification_cache(user_id, limit=5):
+    """Drop a user's cached unread count and recent list, e.g. after marking notifications read"""
+    cache.delete_many([unread_count_cache_key(user_id), recent_notifications_cache_key(user_id, limit)])
+
+def event_notification(user, event, adoption_request=None, booking=None):
+    """Unsaved notification for an event; its text is rendered from Notification.EVENT_TEMPLATES when shown"""
+    return Notification(
         user=user,
-        message=message,
-        related_url=related_url
+        event=event,
+        pet=adoption_request.pet if adoption_request else None,
+        adoption_request=adoption_request,
+        booking=booking,
     )
-    return notification
-
-def create_adoption_request_notification(adoption_request):
-    """Create notification for shelter when adoption request is made"""
-    message = f"New adoption request for {adoption_request.pet.name} from {adoption_request.adopter.username}"
-    related_url = f"/adoption/shelter/requests/"
-    create_notification(adoption_request.pet.shelter, message, related_url)
-
-def create_adoption_approved_notification(adoption_request):
-    """Create notification for adopter when adoption is approved"""
-    message = f"Your adoption request for {adoption_request.pet.name} has been approved!"
-    related_url = f"/adoption/my-requests/"
-    create_notification(adoption_request.adopter, message, related_url)
-
-def create_adoption_rejected_notification(adoption_request):
-    """Create notification for adopter when adoption is rejected"""
-    message = f"Your adoption request for {adoption_request.pet.name} has been rejected."
-    related_url = f"/adoption/my-requests/"
-    create_notification(adoption_request.adopter, message, related_url)
-
-def create_payment_completed_notification(adoption_request):
-    """Create notification for shelter when payment is completed"""
-    message = f"Payment received for {adoption_request.pet.name} from {adoption_request.adopter.username}"
-    related_url = f"/adoption/shelter/requests/"
-    create_notification(adoption_request.pet.shelter, message, related_url)
-
-def create_delivery_started_notification(adoption_request):
-    """Create notification for adopter when delivery starts"""
-    message = f"Delivery started for {adoption_request.pet.name}! Estimated delivery: {adoption_request.estimated_delivery_date}"
-    related_url = f"/adoption/my-requests/"
-    create_notification(adoption_request.adopter, message, related_url)
-
-def create_delivery_completed_notification(adoption_request):
-    """Create notification for adopter when delivery is completed"""
-    message = f"Delivery completed for {adoption_request.pet.name}! Welcome your new pet home!"
-    related_url = f"/adoption/my-requests/"
-    create_notification(adoption_request.adopter, message, related_url)
+
+def create_event_notification(user, event, adoption_request=None, booking=None):
+    """Create a notification for an event such as Notification.ADOPTION_APPROVED"""
+    return create_notifications([event_notification(user, event, adoption_request, booking)])[0]
+
+def create_notifications(notifications):
+    """
+    Save many unsaved Notification objects with a single INSERT.
+
+    Runs inside the caller's transaction; badge caches and open notification streams
+    are only updated once it commits.
+    """
+    notifications = Notification.objects.bulk_create(notifications)
+    transaction.on_commit(lambda: notifications_created(notifications))
+    return notifications
+
+def notifications_created(notifications):
+    """Drop cached badge counts and wake the open streams of the notified users"""
+    user_ids = {notification.user_id for notification in notifications}
+    # Dropped rather than incremented: an incr racing a recount could keep a stale count
+    cache.delete_many([
+        key for user_id in user_ids
+        for key in (unread_count_cache_key(user_id), recent_notifications_cache_key(user_id, 5))
+    ])
+    # Wakes streams in other processes (web workers, or the web when the task worker
+    # created these); streams in this process are woken through pubsub
+    latest_ids = {}
+    for notification in notifications:
+        key = latest_notification_cache_key(notification.user_id)
+        latest_ids[key] = max(latest_ids.get(key, 0), notification.pk)
+    cache.set_many(latest_ids, NOTIFICATION_CACHE_TIMEOUT)
+    for user_id in user_ids:
+        publish(user_id, 'notification')
+
+def serialize_notification(notification):
+    """JSON-friendly representation used by the dropdown and the notification stream"""
+    return {
+        'id': notification.pk,
+        'message': notification.get_message(),
+        'related_url': notification.get_related_url(),
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.isoformat(),
+    }
 
 def get_unread_notifications_count(user):
-    """Get count of unread notifications for a user"""
-    return Notification.objects.filter(user=user, is_read=False).count()
+    """Get count of unread notifications for a user (cached)"""
+    key = unread_count_cache_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user=user, is_read=False).count()
+        cache.set(key, count, NOTIFICATION_CACHE_TIMEOUT)
+    return count
 
 def get_recent_notifications(user, limit=5):
-    """Get recent notifications for a user"""
-    return Notification.objects.filter(user=user).order_by('-created_at')[:limit]
\ No newline at end of file
+    """Get recent notifications for a user (cached)"""
+    key = recent_notifications_cache_key(user.pk, limit)
+    notifications = cache.get(key)
+    if notifications is None:
+        notifications = list(
+            Notification.objects.filter(user=user)
+            .select_related(*Notification.DISPLAY_RELATED)
+            .order_by('-created_at')[:limit]
+        )
+        cache.set(key, notifications, NOTIFICATION_CACHE_TIMEOUT)
+    return notifications
+
+def report_image_savings(request, form):
+    """Tell the user how much smaller normalizing their photo made it"""
+    if form.image_bytes_saved > 0:
+        messages.info(request, f'Photo optimized: {filesizeformat(form.image_bytes_saved)} smaller than the upload.')
@@ -1,17 +1,25 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Max
 from django.utils import timezone
-from django.http import JsonResponse
-from django.db import IntegrityError
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.db import IntegrityError, transaction
 from datetime import timedelta
+import asyncio
+import json
+import logging
 import random
 import string
 import time
 
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
 from .models import Pet, AdoptionRequest, Notification
 from .forms import (
     PetForm,
@@ -21,213 +29,155 @@ from .forms import (
     RazorpayPaymentForm,
 )
 from .razorpay_utils import create_razorpay_order, verify_razorpay_payment, get_razorpay_payment_details
+from .search import search_pets
+from .utils import (
+    clear_notification_cache,
+    get_unread_notifications_count,
+    get_recent_notifications,
+    latest_notification_cache_key,
+    report_image_savings,
+    serialize_notification,
+)
+from .pubsub import subscribe, unsubscribe
+from .tasks import queue_adoption_notification, queue_adoption_notifications
+from .pagination import keyset_paginate
+from .facets import get_pet_facets, AGE_BUCKETS, PRICE_BUCKETS
 
+logger = logging.getLogger(__name__)
 
 
-# Utility functions
-def update_payment_status(adoption_request):
-    """Auto-complete payment for free adoptions"""
-    if adoption_request.payment_amount == 0:
-        adoption_request.payment_status = 'completed'
-        adoption_request.payment_date = timezone.now()
-        adoption_request.payment_reference = 'FREE-ADOPTION'
-        adoption_request.save()
-        return True
-    return False
-
-
-
-def create_notification(user, message, related_url=''):
-    """Create a new notification for a user"""
-    notification = Notification.objects.create(
-        user=user,
-        message=message,
-        related_url=related_url
-    )
-    return notification
-
-
-
-def create_adoption_request_notification(adoption_request):
-    """Create notification for shelter when adoption request is made"""
-    message = f"New adoption request for {adoption_request.pet.name} from {adoption_request.adopter.username}"
-    related_url = f"/adoption/shelter/requests/"
-    create_notification(adoption_request.pet.shelter, message, related_url)
-
-
-
-def create_adoption_approved_notification(adoption_request):
-    """Create notification for adopter when adoption is approved"""
-    message = f"Your adoption request for {adoption_request.pet.name} has been approved!"
-    related_url = f"/adoption/my-requests/"
-    create_notification(adoption_request.adopter, message, related_url)
-
-
-
-def create_adoption_rejected_notification(adoption_request):
-    """Create notification for adopter when adoption is rejected"""
-    message = f"Your adoption request for {adoption_request.pet.name} has been rejected."
-    related_url = f"/adoption/my-requests/"
-    create_notification(adoption_request.adopter, message, related_url)
-
-
-
-def create_payment_completed_notification(adoption_request):
-    """Create notification for shelter when payment is completed"""
-    message = f"Payment received for {adoption_request.pet.name} from {adoption_request.adopter.username}"
-    related_url = f"/adoption/shelter/requests/"
-    create_notification(adoption_request.pet.shelter, message, related_url)
-
-
-
-def create_delivery_started_notification(adoption_request):
-    """Create notification for adopter when delivery starts"""
-    message = f"Delivery started for {adoption_request.pet.name}! Estimated delivery: {adoption_request.estimated_delivery_date}"
-    related_url = f"/adoption/my-requests/"
-    create_notification(adoption_request.adopter, message, related_url)
-
-
-
-def create_delivery_completed_notification(adoption_request):
-    """Create notification for adopter when delivery is completed"""
-    message = f"Delivery completed for {adoption_request.pet.name}! Welcome your new pet home!"
-    related_url = f"/adoption/my-requests/"
-    create_notification(adoption_request.adopter, message, related_url)
-
-
-
-def get_unread_notifications_count(user):
-    """Get count of unread notifications for a user"""
-    return Notification.objects.filter(user=user, is_read=False).count()
-
-
-
-def get_recent_notifications(user, limit=5):
-    """Get recent notifications for a user"""
-    return Notification.objects.filter(user=user).order_by('-created_at')[:limit]
-
-
-
-# Booking notification functions
-def create_booking_notification(booking, message, notification_type='info'):
-    """Create notification for booking activities"""
-    if notification_type == 'info':
-        create_notification(booking.service.shelter, message, '/services/shelter/bookings/')
-    elif notification_type == 'success':
-        create_notification(booking.adopter, message, '/services/my-bookings/')
-
-
-
-def create_booking_request_notification(booking):
-    """Create notification for shelter when booking is made"""
-    message = f"New booking for {booking.service.name} from {booking.adopter.username}"
-    create_booking_notification(booking, message, 'info')
+# Main views
+PET_FACET_SHELTER_LIMIT = 20
 
+PET_SORT_ORDERINGS = {
+    'newest': '-created_at',
+    'name_asc': 'name',
+    'name_desc': '-name',
+    'price_low': 'price',
+    'price_high': '-price',
+    'age_low': 'age',
+    'age_high': '-age',
+}
 
 
-def create_booking_confirmed_notification(booking):
-    """Create notification for adopter when booking is confirmed"""
-    message = f"Your booking for {booking.service.name} has been confirmed!"
-    create_booking_notification(booking, message, 'success')
+def get_filtered_pets(params):
+    """Apply the catalog search and filter parameters, returning (pets, ordering, filters)"""
+    pets = Pet.objects.filter(is_available=True).select_related('shelter')
+    
+    # Get filter parameters
+    filters = {
+        'search_query': params.get('search', ''),
+        'selected_type': params.get('type', ''),
+        'selected_gender': params.get('gender', ''),
+        'selected_size': params.get('size', ''),
+        'selected_min_age': params.get('min_age', ''),
+        'selected_max_age': params.get('max_age', ''),
+        'selected_min_price': params.get('min_price', ''),
+        'selected_max_price': params.get('max_price', ''),
+        'selected_shelter': params.get('shelter', ''),
+    }
+    search_query = filters['search_query']
+    sort_by = params.get('sort_by', 'relevance' if search_query else 'newest')
+    filters['selected_sort'] = sort_by
+    
+    # Search functionality (full-text index, best matches first)
+    if search_query:
+        pets = search_pets(pets, search_query)
+    
+    if filters['selected_type']:
+        pets = pets.filter(pet_type=filters['selected_type'])
+    if filters['selected_gender']:
+        pets = pets.filter(gender=filters['selected_gender'])
+    if filters['selected_size']:
+        pets = pets.filter(size=filters['selected_size'])
+    if filters['selected_min_age']:
+        pets = pets.filter(age__gte=filters['selected_min_age'])
+    if filters['selected_max_age']:
+        pets = pets.filter(age__lte=filters['selected_max_age'])
+    if filters['selected_min_price']:
+        pets = pets.filter(price__gte=filters['selected_min_price'])
+    if filters['selected_max_price']:
+        pets = pets.filter(price__lte=filters['selected_max_price'])
+    if filters['selected_shelter'].isdigit():
+        pets = pets.filter(shelter_id=filters['selected_shelter'])
+    
+    # Sorting: None keeps the relevance order from search_pets
+    if sort_by == 'relevance' and search_query:
+        ordering = None
+    else:
+        ordering = PET_SORT_ORDERINGS.get(sort_by, '-created_at')
+    
+    return pets, ordering, filters
 
 
 
-def create_booking_started_notification(booking):
-    """Create notification for adopter when service starts"""
-    message = f"Service {booking.service.name} has started!"
-    create_booking_notification(booking, message, 'info')
+def get_pet_page(request, pets, ordering):
+    """Fetch one keyset page of pets plus the URLs of the page after it"""
+    page, next_cursor = keyset_paginate(pets, ordering, request.GET.get('cursor', ''))
+    next_page_url = next_fragment_url = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        next_page_url = f"{reverse('pet_list')}?{params.urlencode()}"
+        next_fragment_url = f"{reverse('pet_list_page')}?{params.urlencode()}"
+    return {
+        'pets': page,
+        'next_page_url': next_page_url,
+        'next_fragment_url': next_fragment_url,
+    }
 
 
 
-def create_booking_completed_notification(booking):
-    """Create notification for adopter when service completes"""
-    message = f"Service {booking.service.name} has been completed!"
-    create_booking_notification(booking, message, 'success')
+def bucket_facet_links(request, buckets, counts, min_param, max_param):
+    """Facet options for a bucketed range filter, each linking to the list narrowed to it"""
+    links = []
+    for key, label, lower, upper in buckets:
+        params = request.GET.copy()
+        params.pop('cursor', None)
+        params[min_param] = lower
+        if upper is None:
+            params.pop(max_param, None)
+        else:
+            params[max_param] = upper
+        links.append({
+            'label': label,
+            'count': counts.get(key, 0),
+            'url': f"{reverse('pet_list')}?{params.urlencode()}",
+        })
+    return links
 
 
 
-# Main views
 def pet_list(request):
-    pets = Pet.objects.filter(is_available=True).order_by('-created_at')
-    
-    # Get filter parameters
-    search_query = request.GET.get('search', '')
-    pet_type = request.GET.get('type', '')
-    gender = request.GET.get('gender', '')
-    size = request.GET.get('size', '')
-    min_age = request.GET.get('min_age', '')
-    max_age = request.GET.get('max_age', '')
-    min_price = request.GET.get('min_price', '')
-    max_price = request.GET.get('max_price', '')
-    sort_by = request.GET.get('sort_by', 'newest')
-    
-    # Search functionality
-    if search_query:
-        pets = pets.filter(
-            Q(name__icontains=search_query) | 
-            Q(breed__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
-    
-    if pet_type:
-        pets = pets.filter(pet_type=pet_type)
-    if gender:
-        pets = pets.filter(gender=gender)
-    if size:
-        pets = pets.filter(size=size)
-    if min_age:
-        pets = pets.filter(age__gte=min_age)
-    if max_age:
-        pets = pets.filter(age__lte=max_age)
-    if min_price:
-        pets = pets.filter(price__gte=min_price)
-    if max_price:
-        pets = pets.filter(price__lte=max_price)
-    
-    # Sorting
-    if sort_by == 'name_asc':
-        pets = pets.order_by('name')
-    elif sort_by == 'name_desc':
-        pets = pets.order_by('-name')
-    elif sort_by == 'price_low':
-        pets = pets.order_by('price')
-    elif sort_by == 'price_high':
-        pets = pets.order_by('-price')
-    elif sort_by == 'age_low':
-        pets = pets.order_by('age')
-    elif sort_by == 'age_high':
-        pets = pets.order_by('-age')
-    else:
-        pets = pets.order_by('-created_at')
-    
-    pet_types_count = pets.values('pet_type').distinct().count()
-    shelters_count = pets.values('shelter').distinct().count()
+    pets, ordering, filters = get_filtered_pets(request.GET)
     
-    pet_types = Pet.PET_TYPES
-    gender_choices = Pet.GENDER_CHOICES
-    size_choices = Pet.SIZE_CHOICES
+    # Totals and per-option counts all come from one cached aggregate
+    facets = get_pet_facets(pets, filters)
     
     context = {
-        'pets': pets,
-        'search_query': search_query,
-        'selected_type': pet_type,
-        'selected_gender': gender,
-        'selected_size': size,
-        'selected_min_age': min_age,
-        'selected_max_age': max_age,
-        'selected_min_price': min_price,
-        'selected_max_price': max_price,
-        'selected_sort': sort_by,
-        'pet_types': pet_types,
-        'gender_choices': gender_choices,
-        'size_choices': size_choices,
-        'pet_types_count': pet_types_count,
-        'shelters_count': shelters_count,
+        **filters,
+        **get_pet_page(request, pets, ordering),
+        'pet_count': facets['total'],
+        'pet_types': [(value, name, facets['pet_type'].get(value, 0)) for value, name in Pet.PET_TYPES],
+        'gender_choices': [(value, name, facets['gender'].get(value, 0)) for value, name in Pet.GENDER_CHOICES],
+        'size_choices': [(value, name, facets['size'].get(value, 0)) for value, name in Pet.SIZE_CHOICES],
+        'shelter_choices': facets['shelter'][:PET_FACET_SHELTER_LIMIT],
+        'age_facets': bucket_facet_links(request, AGE_BUCKETS, facets['age_bucket'], 'min_age', 'max_age'),
+        'price_facets': bucket_facet_links(request, PRICE_BUCKETS, facets['price_bucket'], 'min_price', 'max_price'),
+        'pet_types_count': len(facets['pet_type']),
+        'shelters_count': len(facets['shelter']),
     }
     return render(request, 'adoption/pet_list.html', context)
 
 
 
+def pet_list_page(request):
+    """HTML fragment with the next page of pet cards, used for infinite scroll"""
+    pets, ordering, filters = get_filtered_pets(request.GET)
+    return render(request, 'adoption/pet_list_page.html', get_pet_page(request, pets, ordering))
+
+
+
 def pet_detail(request, pk):
     pet = get_object_or_404(Pet, pk=pk)
     return render(request, 'adoption/pet_detail.html', {'pet': pet})
@@ -247,6 +197,7 @@ def pet_create(request):
             pet.shelter = request.user
             pet.save()
             messages.success(request, f'Pet "{pet.name}" has been listed successfully!')
+            report_image_savings(request, form)
             return redirect('pet_detail', pk=pet.pk)
         else:
             messages.error(request, 'Please correct the errors below.')
@@ -269,6 +220,7 @@ def pet_update(request, pk):
         if form.is_valid():
             form.save()
             messages.success(request, f'Pet "{pet.name}" has been updated successfully!')
+            report_image_savings(request, form)
             return redirect('pet_detail', pk=pet.pk)
         else:
             messages.error(request, 'Please correct the errors below.')
@@ -329,14 +281,20 @@ def adoption_request_create(request, pet_id):
         
         if form.is_valid():
             try:
-                adoption_request = form.save(commit=False)
-                adoption_request.adopter = request.user
-                adoption_request.pet = pet
-                adoption_request.delivery_address = request.user.profile.address
-                adoption_request.save()
+                with transaction.atomic():
+                    # Lock the pet row so an approval can't take the pet while this request
+                    # is being inserted (a no-op on SQLite, which serializes writers anyway)
+                    if not Pet.objects.select_for_update().filter(pk=pet.pk, is_available=True).exists():
+                        messages.error(request, f'{pet.name} has just been adopted by someone else.')
+                        return redirect('pet_list')
+                    adoption_request = form.save(commit=False)
+                    adoption_request.adopter = request.user
+                    adoption_request.pet = pet
+                    adoption_request.delivery_address = request.user.profile.address
+                    adoption_request.save()
+                    queue_adoption_notification(Notification.ADOPTION_REQUESTED, adoption_request)
                 print("Adoption request saved successfully")
                 
-                create_adoption_request_notification(adoption_request)
                 messages.success(request, f'Adoption request for {pet.name} submitted successfully!')
                 return redirect('my_adoption_requests')
                 
@@ -377,8 +335,9 @@ def adoption_request_cancel(request, request_id):
         return redirect('my_adoption_requests')
     
     if request.method == 'POST':
-        adoption_request.status = 'cancelled'
-        adoption_request.save()
+        if not adoption_request.transition('cancelled'):
+            messages.error(request, 'This adoption request cannot be cancelled.')
+            return redirect('my_adoption_requests')
         messages.success(request, f'Adoption request for {adoption_request.pet.name} has been cancelled.')
         return redirect('my_adoption_requests')
     
@@ -394,7 +353,7 @@ def shelter_adoption_requests(request):
     
     adoption_requests = AdoptionRequest.objects.filter(
         pet__shelter=request.user
-    ).select_related('adopter', 'pet').order_by('-created_at')
+    ).select_related('adopter__profile', 'pet').order_by('-created_at')
     
     status_filter = request.GET.get('status', '')
     if status_filter:
@@ -415,20 +374,23 @@ def adoption_request_approve(request, request_id):
         return redirect('shelter_adoption_requests')
     
     if request.method == 'POST':
-        AdoptionRequest.objects.filter(pet=adoption_request.pet, status='pending').exclude(pk=request_id).update(status='rejected')
-        adoption_request.status = 'approved'
-        adoption_request.save()
+        with transaction.atomic():
+            approved, rejected_ids = adoption_request.approve()
+            if approved:
+                # Notifications are sent by the task worker once this commits
+                queue_adoption_notifications(
+                    (Notification.ADOPTION_APPROVED, [adoption_request.pk]),
+                    (Notification.ADOPTION_REJECTED, rejected_ids),
+                )
+        
+        if not approved:
+            messages.error(request, f'This adoption request cannot be approved; {adoption_request.pet.name} may already have been adopted.')
+            return redirect('shelter_adoption_requests')
         
         if adoption_request.payment_amount == 0:
-            update_payment_status(adoption_request)
             payment_msg = " (Payment auto-completed for free adoption)"
         else:
             payment_msg = " (Payment pending)"
-        
-        adoption_request.pet.is_available = False
-        adoption_request.pet.save()
-        create_adoption_approved_notification(adoption_request)
-        
         messages.success(request, f'Adoption request for {adoption_request.pet.name} has been approved!{payment_msg}')
         return redirect('shelter_adoption_requests')
     
@@ -444,9 +406,10 @@ def adoption_request_reject(request, request_id):
         return redirect('shelter_adoption_requests')
     
     if request.method == 'POST':
-        adoption_request.status = 'rejected'
-        adoption_request.save()
-        create_adoption_rejected_notification(adoption_request)
+        if not adoption_request.transition('rejected'):
+            messages.error(request, 'This adoption request cannot be rejected.')
+            return redirect('shelter_adoption_requests')
+        queue_adoption_notification(Notification.ADOPTION_REJECTED, adoption_request)
         messages.success(request, f'Adoption request for {adoption_request.pet.name} has been rejected.')
         return redirect('shelter_adoption_requests')
     
@@ -472,10 +435,10 @@ def adoption_request_start_delivery(request, request_id):
     if request.method == 'POST':
         form = DeliveryStartForm(request.POST, instance=adoption_request)
         if form.is_valid():
-            adoption_request = form.save(commit=False)
-            adoption_request.status = 'in_delivery'
-            adoption_request.save()
-            create_delivery_started_notification(adoption_request)
+            if not adoption_request.transition('in_delivery', estimated_delivery_date=form.cleaned_data['estimated_delivery_date']):
+                messages.error(request, 'This adoption request cannot be marked as in delivery.')
+                return redirect('shelter_adoption_requests')
+            queue_adoption_notification(Notification.DELIVERY_STARTED, adoption_request)
             messages.success(request, f'Delivery started for {adoption_request.pet.name}! Estimated delivery: {adoption_request.estimated_delivery_date}')
             return redirect('shelter_adoption_requests')
         else:
@@ -501,10 +464,15 @@ def adoption_request_complete_delivery(request, request_id):
     if request.method == 'POST':
         form = DeliveryCompleteForm(request.POST, instance=adoption_request)
         if form.is_valid():
-            adoption_request = form.save(commit=False)
-            adoption_request.status = 'completed'
-            adoption_request.save()
-            create_delivery_completed_notification(adoption_request)
+            completed = adoption_request.transition(
+                'completed',
+                actual_delivery_date=form.cleaned_data['actual_delivery_date'],
+                delivery_notes=form.cleaned_data['delivery_notes'],
+            )
+            if not completed:
+                messages.error(request, 'This adoption request cannot be marked as completed.')
+                return redirect('shelter_adoption_requests')
+            queue_adoption_notification(Notification.DELIVERY_COMPLETED, adoption_request)
             messages.success(request, f'Delivery completed for {adoption_request.pet.name}! The adoption process is now complete.')
             return redirect('shelter_adoption_requests')
     else:
@@ -565,6 +533,26 @@ def process_payment(request, request_id):
 
 
 
+def record_refund_due(adoption_request, razorpay_payment_id):
+    """
+    Keep hold of a payment Razorpay captured but the request couldn't take, so it can be
+    refunded. Returns False for a repeat of the payment already recorded.
+    """
+    if adoption_request.transition_payment(
+        'refund_due', payment_date=timezone.now(), payment_reference=razorpay_payment_id
+    ):
+        return True
+    adoption_request.refresh_from_db(fields=['payment_status', 'payment_reference'])
+    if adoption_request.payment_reference == razorpay_payment_id:
+        return False
+    # A second payment for a request that already has one recorded; only the log has it
+    logger.error(
+        'Payment %s for adoption request %s needs a refund: the request already has payment %s (%s)',
+        razorpay_payment_id, adoption_request.pk, adoption_request.payment_reference, adoption_request.payment_status,
+    )
+    return True
+
+
 @login_required
 def payment_success(request):
     if request.method == 'POST':
@@ -585,11 +573,16 @@ def payment_success(request):
             
             if verify_razorpay_payment(razorpay_order_id, razorpay_payment_id, razorpay_signature):
                 adoption_request = get_object_or_404(AdoptionRequest, pk=adoption_request_id, adopter=request.user)
-                adoption_request.payment_status = 'completed'
-                adoption_request.payment_date = timezone.now()
-                adoption_request.payment_reference = razorpay_payment_id
-                adoption_request.save()
-                create_payment_completed_notification(adoption_request)
+                paid = adoption_request.transition_payment(
+                    'completed', payment_date=timezone.now(), payment_reference=razorpay_payment_id
+                )
+                if not paid:
+                    if record_refund_due(adoption_request, razorpay_payment_id):
+                        messages.error(request, 'This request is no longer awaiting payment. Your payment will be refunded.')
+                    else:
+                        messages.error(request, 'This payment has already been recorded.')
+                    return redirect('my_adoption_requests')
+                queue_adoption_notification(Notification.PAYMENT_COMPLETED, adoption_request)
                 
                 for key in ['razorpay_order_id', 'adoption_request_id', 'payment_amount']:
                     request.session.pop(key, None)
@@ -611,8 +604,7 @@ def payment_failed(request):
     adoption_request_id = request.session.get('adoption_request_id')
     if adoption_request_id:
         adoption_request = get_object_or_404(AdoptionRequest, pk=adoption_request_id, adopter=request.user)
-        adoption_request.payment_status = 'failed'
-        adoption_request.save()
+        adoption_request.transition_payment('failed')
     
     for key in ['razorpay_order_id', 'adoption_request_id', 'payment_amount']:
         request.session.pop(key, None)
@@ -629,20 +621,38 @@ def payment_success_page(request, request_id):
 
 
 
+NOTIFICATIONS_PAGE_SIZE = 20
+
+
+
 @login_required
 def notification_list(request):
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
-    unread_count = notifications.filter(is_read=False).count()
-    read_count = notifications.filter(is_read=True).count()
-    today_count = notifications.filter(created_at__date=timezone.now().date()).count()
+    notifications = Notification.objects.filter(user=request.user)
+    
+    # All three counters in one conditional aggregate
+    today_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    counts = notifications.aggregate(
+        unread_count=Count('pk', filter=Q(is_read=False)),
+        read_count=Count('pk', filter=Q(is_read=True)),
+        today_count=Count('pk', filter=Q(created_at__gte=today_start)),
+    )
     
-    notifications.filter(is_read=False).update(is_read=True)
+    page, next_cursor = keyset_paginate(
+        notifications.select_related(*Notification.DISPLAY_RELATED), '-created_at', request.GET.get('cursor', ''), page_size=NOTIFICATIONS_PAGE_SIZE
+    )
+    
+    # Only the notifications shown on this page count as read
+    unread_ids = [notification.pk for notification in page if not notification.is_read]
+    if unread_ids:
+        Notification.objects.filter(pk__in=unread_ids).update(is_read=True)
+        clear_notification_cache(request.user.pk)
+    
+    next_page_url = f"{reverse('notification_list')}?cursor={next_cursor}" if next_cursor else None
     
     return render(request, 'adoption/notification_list.html', {
-        'notifications': notifications,
-        'unread_count': unread_count,
-        'read_count': read_count,
-        'today_count': today_count,
+        'notifications': page,
+        'next_page_url': next_page_url,
+        **counts,
     })
 
 
@@ -652,6 +662,7 @@ def mark_notification_read(request, notification_id):
     notification = get_object_or_404(Notification, pk=notification_id, user=request.user)
     notification.is_read = True
     notification.save()
+    clear_notification_cache(request.user.pk)
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
@@ -662,7 +673,157 @@ def mark_notification_read(request, notification_id):
 @login_required
 def mark_all_notifications_read(request):
     Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    clear_notification_cache(request.user.pk)
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
     return redirect('notification_list')
+
+
+
+def notification_dropdown_etag(request):
+    """ETag from the newest notification id and unread count (both served from cache)"""
+    if not request.user.is_authenticated:
+        return None
+    recent = get_recent_notifications(request.user, 5)
+    latest_id = recent[0].pk if recent else 0
+    unread_count = get_unread_notifications_count(request.user)
+    response_format = 'json' if request.GET.get('format') == 'json' else 'html'
+    return f'{response_format}-{latest_id}-{unread_count}'
+
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=notification_dropdown_etag)
+def notification_dropdown(request):
+    """Recent notifications for the navbar dropdown, fetched when it opens or by the badge poll"""
+    recent_notifications = get_recent_notifications(request.user, 5)
+    unread_count = get_unread_notifications_count(request.user)
+    
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'unread_count': unread_count,
+            'notifications': [serialize_notification(notification) for notification in recent_notifications],
+        })
+    
+    return render(request, 'adoption/notification_dropdown.html', {
+        'recent_notifications': recent_notifications,
+        'unread_count': unread_count,
+    })
+
+
+
+def format_notification_event(payload):
+    """Server-Sent Events frame for one notification"""
+    return f"id: {payload['id']}\nevent: notification\ndata: {json.dumps(payload)}\n\n"
+
+
+
+def new_notifications(user_id, last_id):
+    """The user's notifications after last_id, oldest first, ready to serialize"""
+    return Notification.objects.filter(
+        user_id=user_id, pk__gt=last_id
+    ).select_related(*Notification.DISPLAY_RELATED).order_by('pk')[:50]
+
+
+
+async def notification_events(user_id, last_id):
+    """
+    Yield SSE frames for new notifications of user_id.
+
+    Frames are only ever built from the database, read for ids above the last one
+    sent, so rows committed out of id order by other processes are not skipped.
+    The read happens when adoption.pubsub signals a notification created in this
+    process, when the newest id other processes (web workers and the run_tasks
+    worker) leave in the shared cache has moved, checked every
+    NOTIFICATION_STREAM_WAKE_INTERVAL seconds, and every
+    NOTIFICATION_STREAM_POLL_INTERVAL seconds regardless, which doubles as a keep-alive.
+    The stream ends after NOTIFICATION_STREAM_MAX_AGE seconds; EventSource reconnects
+    with Last-Event-ID so nothing is missed.
+    """
+    poll_interval = getattr(settings, 'NOTIFICATION_STREAM_POLL_INTERVAL', 15)
+    wake_interval = getattr(settings, 'NOTIFICATION_STREAM_WAKE_INTERVAL', 2)
+    max_age = getattr(settings, 'NOTIFICATION_STREAM_MAX_AGE', 300)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_age
+    key = latest_notification_cache_key(user_id)
+    subscription = subscribe(user_id)
+    queue = subscription[1]
+    try:
+        yield 'retry: 5000\n\n'
+        while loop.time() < deadline:
+            announced_id = await cache.aget(key, 0)
+            next_poll = loop.time() + poll_interval
+            sent = False
+            async for notification in new_notifications(user_id, last_id):
+                last_id = notification.pk
+                sent = True
+                yield format_notification_event(serialize_notification(notification))
+            if not sent:
+                yield ': keep-alive\n\n'
+
+            while loop.time() < min(next_poll, deadline):
+                try:
+                    await asyncio.wait_for(queue.get(), timeout=wake_interval)
+                except asyncio.TimeoutError:
+                    if await cache.aget(key, 0) > announced_id:
+                        break
+                else:
+                    while not queue.empty():
+                        queue.get_nowait()
+                    break
+    finally:
+        unsubscribe(user_id, subscription)
+
+
+
+def short_notification_events(user_id, last_id):
+    """
+    Yield SSE frames for a stream served by a WSGI worker, which it holds until the end.
+
+    Sends what is new, then waits for the shared cache to announce more for at most
+    NOTIFICATION_STREAM_WSGI_MAX_AGE seconds. The retry hint has EventSource reconnect
+    after NOTIFICATION_STREAM_POLL_INTERVAL seconds, making the stream a cheap poll.
+    """
+    poll_interval = getattr(settings, 'NOTIFICATION_STREAM_POLL_INTERVAL', 15)
+    wake_interval = getattr(settings, 'NOTIFICATION_STREAM_WAKE_INTERVAL', 2)
+    deadline = time.monotonic() + getattr(settings, 'NOTIFICATION_STREAM_WSGI_MAX_AGE', 5)
+    key = latest_notification_cache_key(user_id)
+    yield f'retry: {int(poll_interval * 1000)}\n\n'
+    while True:
+        announced_id = cache.get(key, 0)
+        for notification in new_notifications(user_id, last_id):
+            last_id = notification.pk
+            yield format_notification_event(serialize_notification(notification))
+        while cache.get(key, 0) <= announced_id:
+            if time.monotonic() + wake_interval > deadline:
+                return
+            time.sleep(wake_interval)
+
+
+
+@login_required
+async def notification_stream(request):
+    """
+    Server-Sent Events stream of new notifications for the logged-in user.
+
+    Only long-lived under ASGI; see NOTIFICATION_STREAM_ENABLED in settings.
+    """
+    user = await request.auser()
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    if last_event_id.isdigit():
+        last_id = int(last_event_id)
+    else:
+        latest = await Notification.objects.filter(user=user).aaggregate(latest=Max('pk'))
+        last_id = latest['latest'] or 0
+    
+    if isinstance(request, ASGIRequest):
+        events = notification_events(user.pk, last_id)
+    else:
+        # A WSGI server would drain an async iterator in full before sending a byte
+        events = short_notification_events(user.pk, last_id)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
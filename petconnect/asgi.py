@@ -2,6 +2,10 @@
 ASGI config for petconnect project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn petconnect.asgi:application``) so the
+async notification stream can hold many idle connections on one event loop, and set
+NOTIFICATION_STREAM_ENABLED=True so pages open that stream. The stream needs ASGI:
+behind the WSGI entry points it only runs for a few seconds per connection.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -0,0 +1,143 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# Uploads stored by ContentAddressedStorage: dir/ab/cd/abcd<60 more hex digits>.ext.
+# Their bytes can never change, so the name itself is a strong validator.
+CONTENT_ADDRESSED = re.compile(r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})\.\w+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Everything else (default images, renditions, legacy uploads) is revalidated after this
+MEDIA_CACHE_MAX_AGE = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)
+# Internal location nginx maps onto MEDIA_ROOT, e.g. /protected-media/; when set the
+# view only decides on headers and nginx sends the file
+MEDIA_ACCEL_REDIRECT = getattr(settings, 'MEDIA_ACCEL_REDIRECT', '')
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """
+    Read at most length bytes of an open file from its current position.
+
+    fileno() is kept so WSGI servers with a sendfile file_wrapper (gunicorn) still
+    send the range straight from the page cache; they use Content-Length as the count.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def media_etag(name, st):
+    match = CONTENT_ADDRESSED.search(name)
+    if match:
+        return f'"{match.group(3)}"'
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single satisfiable byte range, None to send the whole file, or False"""
+    match = BYTE_RANGE.match(header.replace(' ', ''))
+    if not match or not any(match.groups()):
+        # Malformed and multi-range requests may be answered with the full file
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def if_range_matches(request, etag, last_modified):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve a file from MEDIA_ROOT with validators, a cache policy and byte ranges.
+
+    Content-addressed uploads are cached for a year as immutable; everything else
+    for MEDIA_CACHE_MAX_AGE, after which a conditional GET usually ends in a 304.
+    """
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        st = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404('Media file not found')
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404('Media file not found')
+
+    name = path.replace(os.sep, '/')
+    etag = media_etag(name, st)
+    last_modified = int(st.st_mtime)
+    immutable = CONTENT_ADDRESSED.search(name) is not None
+
+    def cache_headers(response):
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(last_modified)
+        response.headers['Cache-Control'] = (
+            IMMUTABLE_CACHE_CONTROL if immutable else f'public, max-age={MEDIA_CACHE_MAX_AGE}'
+        )
+        response.headers['Accept-Ranges'] = 'bytes'
+        return response
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return cache_headers(response)
+
+    if MEDIA_ACCEL_REDIRECT:
+        # nginx handles Range itself on internal redirects
+        response = HttpResponse(content_type=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = MEDIA_ACCEL_REDIRECT.rstrip('/') + '/' + name
+        return cache_headers(response)
+
+    byte_range = None
+    if 'Range' in request.headers and if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(request.headers['Range'], st.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response.headers['Content-Range'] = f'bytes */{st.st_size}'
+        return cache_headers(response)
+
+    file = open(fullpath, 'rb')
+    if byte_range:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(FileRange(file, end - start + 1), status=206)
+        response.headers['Content-Length'] = end - start + 1
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{st.st_size}'
+    else:
+        response = FileResponse(file)
+    return cache_headers(response)
@@ -27,9 +27,11 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.humanize',
     'accounts',
     'adoption',
     'services',
+    'tasks',
 ]
 
 MIDDLEWARE = [
@@ -56,6 +58,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'adoption.context_processors.notifications',
             ],
         },
     },
@@ -68,6 +71,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts and wait for it instead of
+            # failing with "database is locked" when adopters submit requests at once
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -101,10 +110,33 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Content-hashed uploads are always cached for a year; other media for this many seconds
+MEDIA_CACHE_MAX_AGE = config('MEDIA_CACHE_MAX_AGE', default=3600, cast=int)
+# Behind nginx, set to an internal location aliased to MEDIA_ROOT (e.g. /protected-media/)
+# so nginx sends the file while Django only sets the headers
+MEDIA_ACCEL_REDIRECT = config('MEDIA_ACCEL_REDIRECT', default='')
 
 # Static files configuration for production
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Cache shared by every web worker and the run_tasks worker. Unread counts, the
+# catalog version, dashboards and the admin stats are invalidated by whichever
+# process made the change, so a per-process cache (LocMemCache) would keep serving
+# stale values in the others. The file cache is shared by all processes on one
+# host; with several hosts set CACHE_BACKEND and CACHE_LOCATION to Redis or Memcached.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / 'cache')),
+        'OPTIONS': {
+            # Per-user counts and dashboards add up; culling also drops the catalog version
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=20000, cast=int),
+        },
+    }
+}
+# Runs the tests against a cache of their own that starts out empty
+TEST_RUNNER = 'petconnect.testing.TestRunner'
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -118,4 +150,20 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 # Razorpay configuration
 RAZORPAY_KEY_ID = config('RAZORPAY_KEY_ID', default='')
-RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET', default='')
\ No newline at end of file
+RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET', default='')
+
+# Pet catalog search; empty picks the FTS5 index on SQLite and icontains filters elsewhere
+PET_SEARCH_BACKEND = config('PET_SEARCH_BACKEND', default='')
+
+# Read notifications older than this are moved out by archive_notifications
+NOTIFICATION_RETENTION_DAYS = config('NOTIFICATION_RETENTION_DAYS', default=90, cast=int)
+
+# Push new notifications to the navbar badge over Server-Sent Events. Requires serving
+# petconnect.asgi with an ASGI server (uvicorn, daphne): under WSGI (gunicorn, the
+# PythonAnywhere WSGI file) every open page would hold a worker, so the stream ends after
+# a few seconds there and pages poll the dropdown JSON instead while this is off.
+NOTIFICATION_STREAM_ENABLED = config('NOTIFICATION_STREAM_ENABLED', default=False, cast=bool)
+
+# Background tasks are stored in the database and run by `python manage.py run_tasks`.
+# Set TASK_QUEUE_EAGER=True to run them in-process right after the request commits instead.
+TASK_QUEUE_EAGER = config('TASK_QUEUE_EAGER', default=False, cast=bool)
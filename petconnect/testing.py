@@ -0,0 +1,170 @@
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from adoption.models import Pet, AdoptionRequest, Notification
+from services.models import Service, Booking
+
+# Wall-clock ceiling for a single request in the budget suites; generous enough for slow CI boxes
+VIEW_TIME_BUDGET = getattr(settings, 'VIEW_TIME_BUDGET', 1.0)
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Point a file cache at a fresh directory for the run, so neither a running dev
+    server nor a previous run leaves entries behind (LOCATION of other backends is kept).
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = None
+        cache_settings = settings.CACHES['default']
+        if cache_settings['BACKEND'].endswith('FileBasedCache'):
+            self.cache_dir = tempfile.mkdtemp(prefix='petconnect-test-cache-')
+            self.cache_override = override_settings(CACHES={'default': {**cache_settings, 'LOCATION': self.cache_dir}})
+            self.cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        if self.cache_dir:
+            self.cache_override.disable()
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
+
+
+class TempMediaRootMixin:
+    """Point MEDIA_ROOT at a fresh directory for each test, removed afterwards"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+def seed_platform(shelters=3, adopters=20, pets_per_shelter=40, services_per_shelter=10, per_adopter=4):
+    """
+    A catalog big enough that an N+1 query shows up as dozens of extra queries.
+
+    Every adopter gets per_adopter adoption requests and bookings spread over the
+    shelters, each with the notification it would have sent. Returns a dict of the created objects.
+    """
+    shelter_users = [User.objects.create(username=f'shelter{i}', email=f'shelter{i}@example.com') for i in range(shelters)]
+    adopter_users = [User.objects.create(username=f'adopter{i}', email=f'adopter{i}@example.com') for i in range(adopters)]
+    # Through the cached profiles, which force_login saves again along with last_login
+    for user in shelter_users:
+        user.profile.role = 'shelter'
+        user.profile.save()
+    for user in adopter_users:
+        user.profile.address = '1 Test Lane'
+        user.profile.phone_number = '5550100'
+        user.profile.save()
+
+    pets, services = [], []
+    for shelter in shelter_users:
+        for i in range(pets_per_shelter):
+            pets.append(Pet.objects.create(
+                name=f'{shelter.username} pet {i}', pet_type=('dog', 'cat', 'bird')[i % 3], breed='Mixed',
+                age=3 + i, gender=('male', 'female')[i % 2], size=('small', 'medium', 'large')[i % 3],
+                description='Friendly and house trained', price=(0, 500, 1500)[i % 3], shelter=shelter,
+            ))
+        for i in range(services_per_shelter):
+            services.append(Service.objects.create(
+                name=f'{shelter.username} service {i}', description='Care for your pet', price=300 + i,
+                duration='1 hour', shelter=shelter,
+            ))
+
+    adoption_requests, bookings = [], []
+    now = timezone.now()
+    for n, adopter in enumerate(adopter_users):
+        for i in range(per_adopter):
+            adoption_requests.append(AdoptionRequest.objects.create(
+                adopter=adopter, pet=pets[(n * per_adopter + i) % len(pets)], message='We have a big garden',
+            ))
+            bookings.append(Booking.objects.create(
+                adopter=adopter, service=services[(n + i) % len(services)], address='1 Test Lane',
+                booking_date=now + timedelta(days=i + 1), status=('pending', 'confirmed')[i % 2],
+            ))
+    Notification.objects.bulk_create(
+        [
+            Notification(
+                user=adoption_request.pet.shelter, event=Notification.ADOPTION_REQUESTED,
+                adoption_request=adoption_request, pet=adoption_request.pet,
+            )
+            for adoption_request in adoption_requests
+        ] + [
+            Notification(user=booking.adopter, event=Notification.BOOKING_CONFIRMED, booking=booking)
+            for booking in bookings
+        ]
+    )
+    return {
+        'shelters': shelter_users,
+        'adopters': adopter_users,
+        'pets': pets,
+        'services': services,
+        'adoption_requests': adoption_requests,
+        'bookings': bookings,
+    }
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Base class for the per-view performance budgets.
+
+    Subclasses set urlconf to the app's urls module and define a test_<url name>
+    method for every pattern in it, which assertEveryUrlHasBudget checks.
+    """
+    urlconf = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_platform()
+        cls.shelter = cls.data['shelters'][0]
+        cls.adopter = cls.data['adopters'][0]
+        cls.admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        # Budgets are for a cold cache, the worst case a user sees
+        cache.clear()
+
+    def assertEveryUrlHasBudget(self):
+        missing = [
+            pattern.name for pattern in self.urlconf.urlpatterns
+            if not hasattr(self, f'test_{pattern.name}')
+        ]
+        self.assertEqual(missing, [], 'URLs without a query budget')
+
+    def assertWithinBudget(self, url, queries, user=None, method='get', data=None, status=None, seconds=None, **extra):
+        """
+        Request url as user and fail if it runs more than queries queries or takes
+        longer than seconds. Callbacks registered with transaction.on_commit run
+        and count towards the budget. Returns the response.
+        """
+        if user is not None:
+            self.client.force_login(user)
+        seconds = VIEW_TIME_BUDGET if seconds is None else seconds
+        with CaptureQueriesContext(connection) as captured:
+            with self.captureOnCommitCallbacks(execute=True):
+                start = time.perf_counter()
+                response = getattr(self.client, method)(url, data, **extra)
+                elapsed = time.perf_counter() - start
+        if status is not None:
+            self.assertEqual(response.status_code, status)
+        self.assertLessEqual(
+            len(captured), queries,
+            f'{method.upper()} {url} ran {len(captured)} queries, budget is {queries}:\n'
+            + '\n'.join(f"{i}. {query['sql']}" for i, query in enumerate(captured.captured_queries, 1))
+        )
+        self.assertLessEqual(elapsed, seconds, f'{method.upper()} {url} took {elapsed:.3f}s, budget is {seconds}s')
+        return response
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import TestCase
+from django.utils.http import http_date
+
+from adoption.storage import media_storage
+
+from . import media
+from .testing import TempMediaRootMixin
+
+
+class MediaServingTests(TempMediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(256)) * 4
+        self.hashed = media_storage.save('pet_images/rex.jpg', ContentFile(self.content))
+        self.plain = media_storage.store('pet_images/default_pet.jpg', ContentFile(self.content))
+
+    def get(self, name, **headers):
+        return self.client.get(f'/media/{name}', headers=headers)
+
+    def test_content_addressed_files_are_immutable(self):
+        response = self.get(self.hashed)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Cache-Control'], media.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn(response['ETag'].strip('"'), self.hashed)
+
+        plain = self.get(self.plain)
+        self.assertEqual(plain['Cache-Control'], f'public, max-age={media.MEDIA_CACHE_MAX_AGE}')
+        self.assertRegex(plain['ETag'], r'^"[0-9a-f]+-400"$')
+
+    def test_conditional_get(self):
+        etag = self.get(self.plain)['ETag']
+        response = self.get(self.plain, if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.get(self.plain, if_modified_since=http_date()).status_code, 304)
+        self.assertEqual(self.get(self.plain, if_none_match='"stale"').status_code, 200)
+
+    def test_byte_ranges(self):
+        response = self.get(self.hashed, range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+        response = self.get(self.hashed, range='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-4:])
+
+        response = self.get(self.hashed, range='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+        # A range against an outdated copy gets the whole file instead
+        response = self.get(self.hashed, range='bytes=10-19', if_range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_missing_and_unsafe_paths(self):
+        self.assertEqual(self.get('pet_images/missing.jpg').status_code, 404)
+        self.assertEqual(self.get('pet_images').status_code, 404)
+        self.assertEqual(self.get('../manage.py').status_code, 404)
+        self.assertEqual(self.client.post(f'/media/{self.hashed}').status_code, 405)
+
+    @mock.patch.object(media, 'MEDIA_ACCEL_REDIRECT', '/protected-media/')
+    def test_accel_redirect(self):
+        response = self.get(self.hashed)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.hashed}')
+        self.assertEqual(response['Cache-Control'], media.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response.content, b'')
@@ -1,9 +1,13 @@
+import re
+from urllib.parse import urlsplit
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
+from accounts.forms import QueuedPasswordResetForm
 from . import views
+from .media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -18,7 +22,8 @@ urlpatterns = [
         auth_views.PasswordResetView.as_view(
             template_name='registration/password_reset_form.html',
             email_template_name='registration/password_reset_email.html',
-            subject_template_name='registration/password_reset_subject.txt'
+            subject_template_name='registration/password_reset_subject.txt',
+            form_class=QueuedPasswordResetForm
         ),
         name='password_reset'
     ),
@@ -47,5 +52,8 @@ urlpatterns = [
     
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Uploaded media, with cache validators and byte ranges; skipped when MEDIA_URL points at another host
+if not urlsplit(settings.MEDIA_URL).netloc:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+    ]
@@ -1,11 +1,14 @@
+from django.conf import settings
 from django.shortcuts import render
-from adoption.models import Pet
+from adoption.facets import get_catalog_version
+from adoption.featured import get_featured_pets
 
 def home(request):
-    # Get 3 random available pets for featured section
-    featured_pets = Pet.objects.filter(is_available=True).order_by('?')[:3]
-    
+    # Random trio of available pets; the template only calls
+    # get_featured_pets when the cached block for anonymous visitors has expired
     context = {
-        'featured_pets': featured_pets
+        'featured_pets': get_featured_pets,
+        'featured_cache_timeout': getattr(settings, 'FEATURED_PETS_CACHE_TIMEOUT', 60),
+        'catalog_version': get_catalog_version(),
     }
     return render(request, 'home.html', context)
\ No newline at end of file
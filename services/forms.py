@@ -1,8 +1,9 @@
 from django import forms
+from adoption.forms import NormalizedImageMixin
 from .models import Service, Booking
 from django.utils import timezone
 
-class ServiceForm(forms.ModelForm):
+class ServiceForm(NormalizedImageMixin, forms.ModelForm):
     class Meta:
         model = Service
         fields = ['name', 'description', 'price', 'category', 'image', 'duration']
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0002_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='image_renditions',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+    ]
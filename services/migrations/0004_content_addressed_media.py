@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:35
+
+import adoption.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0003_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='service',
+            name='image',
+            field=models.ImageField(default='service_images/default_service.jpg', storage=adoption.storage.content_addressed_storage, upload_to='service_images/'),
+        ),
+    ]
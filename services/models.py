@@ -1,7 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from adoption.models import ImageReferencesMixin, ImageRenditionsMixin, StatusHistoryMixin, StatusTransition
+from adoption.storage import content_addressed_storage
 
-class Service(models.Model):
+class Service(ImageReferencesMixin, ImageRenditionsMixin, models.Model):
     SERVICE_CATEGORIES = (
         ('grooming', 'Grooming'),
         ('veterinary', 'Veterinary Care'),
@@ -16,13 +20,21 @@ class Service(models.Model):
     description = models.TextField(max_length=1000)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.CharField(max_length=20, choices=SERVICE_CATEGORIES, default='other')
-    image = models.ImageField(upload_to='service_images/', default='service_images/default_service.jpg')
+    image = models.ImageField(upload_to='service_images/', default='service_images/default_service.jpg', storage=content_addressed_storage)
+    # Name of the image the thumbnail renditions were generated from
+    image_renditions = models.CharField(max_length=100, blank=True, editable=False)
     duration = models.CharField(max_length=50, help_text="e.g., 1 hour, 30 minutes")
     shelter = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'profile__role': 'shelter'})
     is_available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # service_list default ordering
+            models.Index(fields=['created_at'], condition=models.Q(is_available=True), name='service_avail_created_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.name} - {self.shelter.username}"
     
@@ -30,7 +42,7 @@ class Service(models.Model):
         from django.urls import reverse
         return reverse('service_detail', kwargs={'pk': self.pk})
 
-class Booking(models.Model):
+class Booking(StatusHistoryMixin, models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
         ('confirmed', 'Confirmed'),
@@ -50,6 +62,22 @@ class Booking(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # shelter_bookings filtered by status
+            models.Index(fields=['service', 'status'], name='booking_service_status_idx'),
+            # my_bookings
+            models.Index(fields=['adopter', 'created_at'], name='booking_adopter_created_idx'),
+        ]
+    
+    HISTORY_KIND = StatusTransition.BOOKING
+    
+    # Target status -> the condition the row must still meet for the move to happen
+    STATUS_TRANSITIONS = {
+        'confirmed': models.Q(status__in=['pending']),
+        'in_progress': models.Q(status__in=['confirmed']),
+        'completed': models.Q(status__in=['in_progress']),
+        'cancelled': models.Q(status__in=['pending', 'confirmed']),
+    }
     
     def __str__(self):
         return f"{self.adopter.username} - {self.service.name}"
@@ -65,4 +93,19 @@ class Booking(models.Model):
             'completed': 'bg-primary',
             'cancelled': 'bg-secondary',
         }
-        return status_classes.get(self.status, 'bg-secondary')
\ No newline at end of file
+        return status_classes.get(self.status, 'bg-secondary')
+
+
+@receiver(post_save, sender=Service)
+def update_service_image(sender, instance, created, update_fields=None, **kwargs):
+    from adoption.storage import update_image_references
+    from adoption.tasks import queue_image_renditions
+    # Renditions are only queued for a new image, not for every save of the service
+    if (update_fields is None or 'image' in update_fields) and update_image_references(instance, created=created):
+        queue_image_renditions(instance)
+
+
+@receiver(post_delete, sender=Service)
+def release_service_image(sender, instance, **kwargs):
+    from adoption.storage import update_image_references
+    update_image_references(instance, deleted=True)
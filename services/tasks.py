@@ -0,0 +1,19 @@
+from tasks.queue import task
+
+from .models import Booking
+
+
+@task()
+def send_booking_notification(booking_id, event, notification_type='info'):
+    """Create notification for booking activities; skipped if the booking was deleted meanwhile"""
+    from adoption.utils import create_event_notification
+    
+    booking = Booking.objects.select_related('service__shelter', 'adopter').filter(pk=booking_id).first()
+    if booking is None:
+        return
+    if notification_type == 'info':
+        # Notify shelter about new booking
+        create_event_notification(booking.service.shelter, event, booking=booking)
+    elif notification_type == 'success':
+        # Notify adopter about booking updates
+        create_event_notification(booking.adopter, event, booking=booking)
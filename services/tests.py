@@ -1,3 +1,135 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from adoption.models import StatusTransition
+from petconnect.testing import QueryBudgetTestCase
+
+from . import urls
+from .models import Booking, Service
+
+
+class ServicesQueryBudgetTests(QueryBudgetTestCase):
+    """Query and time budgets for every view in services.urls, against a seeded catalog"""
+    urlconf = urls
+
+    def setUp(self):
+        super().setUp()
+        self.service = self.data['services'][0]
+        # adopter0's bookings alternate pending and confirmed, all with shelter0
+        self.pending_booking = self.data['bookings'][0]
+        self.confirmed_booking = self.data['bookings'][1]
+
+    def test_every_url_has_a_budget(self):
+        self.assertEveryUrlHasBudget()
+
+    def test_service_list(self):
+        self.assertWithinBudget(reverse('service_list'), 5, user=self.adopter, status=200)
+
+    def test_service_detail(self):
+        self.assertWithinBudget(reverse('service_detail', args=[self.service.pk]), 6, user=self.adopter, status=200)
+
+    def test_service_create(self):
+        self.assertWithinBudget(reverse('service_create'), 4, user=self.shelter, status=200)
+
+    def test_service_update(self):
+        self.assertWithinBudget(reverse('service_update', args=[self.service.pk]), 6, user=self.shelter, status=200)
+
+    def test_service_delete(self):
+        self.assertWithinBudget(
+            reverse('service_delete', args=[self.service.pk]), 9, user=self.shelter, method='post', status=302,
+        )
+
+    def test_my_services(self):
+        self.assertWithinBudget(reverse('my_services'), 5, user=self.shelter, status=200)
+
+    def test_booking_create(self):
+        booking_date = (timezone.now() + timedelta(days=7)).strftime('%Y-%m-%dT%H:%M')
+        self.assertWithinBudget(
+            reverse('booking_create', args=[self.service.pk]), 7, user=self.adopter, method='post',
+            data={'booking_date': booking_date, 'special_instructions': 'Gentle with the ears'}, status=302,
+        )
+
+    def test_my_bookings(self):
+        self.assertWithinBudget(reverse('my_bookings'), 5, user=self.adopter, status=200)
+
+    def test_booking_cancel(self):
+        self.assertWithinBudget(
+            reverse('booking_cancel', args=[self.pending_booking.pk]), 7, user=self.adopter, method='post', status=302,
+        )
+
+    def test_shelter_bookings(self):
+        self.assertWithinBudget(reverse('shelter_bookings'), 5, user=self.shelter, status=200)
+
+    def test_booking_confirm(self):
+        self.assertWithinBudget(
+            reverse('booking_confirm', args=[self.pending_booking.pk]), 8, user=self.shelter, method='post', status=302,
+        )
+
+    def test_booking_start(self):
+        self.assertWithinBudget(
+            reverse('booking_start', args=[self.confirmed_booking.pk]), 8, user=self.shelter, method='post', status=302,
+        )
+
+    def test_booking_complete(self):
+        self.confirmed_booking.transition('in_progress')
+        self.assertWithinBudget(
+            reverse('booking_complete', args=[self.confirmed_booking.pk]), 8, user=self.shelter, method='post', status=302,
+        )
+
+
+class BookingTransitionTests(TestCase):
+    def setUp(self):
+        shelter = User.objects.create(username='shelter')
+        adopter = User.objects.create(username='adopter')
+        service = Service.objects.create(
+            name='Grooming', description='Wash and trim', price=300, duration='1 hour', shelter=shelter,
+        )
+        self.booking = Booking.objects.create(
+            adopter=adopter, service=service, address='1 Test Lane', booking_date=timezone.now() + timedelta(days=1),
+        )
+        self.saved = []
+        post_save.connect(self.record_save, sender=Booking)
+        self.addCleanup(post_save.disconnect, self.record_save, sender=Booking)
+
+    def record_save(self, instance, update_fields, **kwargs):
+        self.saved.append((instance.pk, instance.status, update_fields))
+
+    def history(self):
+        return list(
+            StatusTransition.objects.filter(kind=StatusTransition.BOOKING, object_id=self.booking.pk)
+            .order_by('pk').values_list('status', flat=True)
+        )
+
+    def test_transitions_follow_the_allowed_moves(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.booking.transition('confirmed'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.booking.transition('in_progress'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertFalse(self.booking.transition('cancelled'))
+            self.assertTrue(self.booking.transition('completed'))
+        self.assertEqual(Booking.objects.get().status, 'completed')
+        self.assertEqual(self.history(), ['pending', 'confirmed', 'in_progress', 'completed'])
+        self.assertEqual(
+            [status for pk, status, update_fields in self.saved], ['confirmed', 'in_progress', 'completed'],
+        )
+        self.assertEqual(self.saved[0][2], frozenset(['status', 'updated_at']))
 
-# Create your tests here.
+    def test_lost_race_leaves_row_and_instance_unchanged(self):
+        stale = Booking.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.booking.transition('cancelled'))
+        cancelled_at = Booking.objects.get().updated_at
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertFalse(stale.transition('confirmed'))
+        self.assertEqual(stale.status, 'pending')
+        row = Booking.objects.get()
+        self.assertEqual((row.status, row.updated_at), ('cancelled', cancelled_at))
+        self.assertEqual(self.history(), ['pending', 'cancelled'])
+        # Only the winning move told the caches
+        self.assertEqual(len(self.saved), 1)
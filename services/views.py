@@ -1,56 +1,49 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.utils import timezone
+from adoption.models import Notification
+from adoption.utils import report_image_savings
+from tasks.queue import enqueue
 from .models import Service, Booking
 from .forms import ServiceForm, BookingForm
+from .tasks import send_booking_notification
 
 
 # ==========================
 # 🔔 Booking Notification Helpers
 # ==========================
-def create_booking_notification(booking, message, notification_type='info'):
-    """Create notification for booking activities"""
-    from adoption.views import create_notification  # Import from adoption views
-    
-    if notification_type == 'info':
-        # Notify shelter about new booking
-        create_notification(booking.service.shelter, message, '/services/shelter/bookings/')
-    elif notification_type == 'success':
-        # Notify adopter about booking updates
-        create_notification(booking.adopter, message, '/services/my-bookings/')
+def create_booking_notification(booking, event, notification_type='info'):
+    """Queue notification for booking activities; the task worker creates it"""
+    enqueue(send_booking_notification, booking_id=booking.pk, event=event, notification_type=notification_type)
 
 
 def create_booking_request_notification(booking):
     """Notify shelter when a booking is made"""
-    message = f"New booking for {booking.service.name} from {booking.adopter.username}"
-    create_booking_notification(booking, message, 'info')
+    create_booking_notification(booking, Notification.BOOKING_REQUESTED, 'info')
 
 
 def create_booking_confirmed_notification(booking):
     """Notify adopter when booking is confirmed"""
-    message = f"Your booking for {booking.service.name} has been confirmed!"
-    create_booking_notification(booking, message, 'success')
+    create_booking_notification(booking, Notification.BOOKING_CONFIRMED, 'success')
 
 
 def create_booking_started_notification(booking):
     """Notify adopter when service starts"""
-    message = f"Service {booking.service.name} has started!"
-    create_booking_notification(booking, message, 'info')
+    create_booking_notification(booking, Notification.BOOKING_STARTED, 'info')
 
 
 def create_booking_completed_notification(booking):
     """Notify adopter when service completes"""
-    message = f"Service {booking.service.name} has been completed!"
-    create_booking_notification(booking, message, 'success')
+    create_booking_notification(booking, Notification.BOOKING_COMPLETED, 'success')
 
 
 # ==========================
 # 🐾 Service Views
 # ==========================
 def service_list(request):
-    services = Service.objects.filter(is_available=True).order_by('-created_at')
+    services = Service.objects.filter(is_available=True).select_related('shelter').order_by('-created_at')
 
     # Get filter parameters
     search_query = request.GET.get('search', '')
@@ -121,6 +114,7 @@ def service_create(request):
             service.shelter = request.user
             service.save()
             messages.success(request, f'Service "{service.name}" has been listed successfully!')
+            report_image_savings(request, form)
             return redirect('service_detail', pk=service.pk)
         else:
             messages.error(request, 'Please correct the errors below.')
@@ -143,6 +137,7 @@ def service_update(request, pk):
         if form.is_valid():
             form.save()
             messages.success(request, f'Service "{service.name}" has been updated successfully!')
+            report_image_savings(request, form)
             return redirect('service_detail', pk=service.pk)
         else:
             messages.error(request, 'Please correct the errors below.')
@@ -175,7 +170,7 @@ def my_services(request):
         messages.error(request, 'Only shelters can manage service listings.')
         return redirect('dashboard')
 
-    services = Service.objects.filter(shelter=request.user).order_by('-created_at')
+    services = Service.objects.filter(shelter=request.user).annotate(booking_count=Count('bookings')).order_by('-created_at')
     return render(request, 'services/my_services.html', {'services': services})
 
 
@@ -229,8 +224,9 @@ def booking_cancel(request, booking_id):
         return redirect('my_bookings')
 
     if request.method == 'POST':
-        booking.status = 'cancelled'
-        booking.save()
+        if not booking.transition('cancelled'):
+            messages.error(request, 'This booking cannot be cancelled.')
+            return redirect('my_bookings')
         messages.success(request, f'Booking for {booking.service.name} has been cancelled.')
         return redirect('my_bookings')
 
@@ -245,7 +241,7 @@ def shelter_bookings(request):
 
     bookings = Booking.objects.filter(
         service__shelter=request.user
-    ).select_related('adopter', 'service').order_by('-created_at')
+    ).select_related('adopter__profile', 'service').order_by('-created_at')
 
     status_filter = request.GET.get('status', '')
     if status_filter:
@@ -263,8 +259,9 @@ def booking_confirm(request, booking_id):
         return redirect('shelter_bookings')
 
     if request.method == 'POST':
-        booking.status = 'confirmed'
-        booking.save()
+        if not booking.transition('confirmed'):
+            messages.error(request, 'This booking cannot be confirmed.')
+            return redirect('shelter_bookings')
 
         # ✅ Notification to adopter
         create_booking_confirmed_notification(booking)
@@ -284,8 +281,9 @@ def booking_start(request, booking_id):
         return redirect('shelter_bookings')
 
     if request.method == 'POST':
-        booking.status = 'in_progress'
-        booking.save()
+        if not booking.transition('in_progress'):
+            messages.error(request, 'This booking cannot be started.')
+            return redirect('shelter_bookings')
 
         # ✅ Notification to adopter
         create_booking_started_notification(booking)
@@ -305,8 +303,9 @@ def booking_complete(request, booking_id):
         return redirect('shelter_bookings')
 
     if request.method == 'POST':
-        booking.status = 'completed'
-        booking.save()
+        if not booking.transition('completed'):
+            messages.error(request, 'This booking cannot be completed.')
+            return redirect('shelter_bookings')
 
         # ✅ Notification to adopter
         create_booking_completed_notification(booking)
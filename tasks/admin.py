@@ -0,0 +1,18 @@
+from django.contrib import admin
+from .models import Task
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'duration_ms', 'run_at', 'created_at', 'finished_at']
+    list_filter = ['status', 'name', 'created_at']
+    search_fields = ['name', 'last_error']
+    readonly_fields = ['created_at', 'started_at', 'finished_at', 'duration_ms', 'last_error']
+    
+    fieldsets = (
+        ('Task', {
+            'fields': ('name', 'kwargs', 'status', 'attempts', 'max_attempts', 'run_at')
+        }),
+        ('Execution', {
+            'fields': ('created_at', 'started_at', 'finished_at', 'duration_ms', 'last_error'),
+        }),
+    )
@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max, Q
+
+from tasks.models import Task
+from tasks.queue import claim_next, purge_finished, requeue_stale, run_task
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks from the database, retrying failures with exponential backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when no task is due instead of polling')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait between polls when idle')
+        parser.add_argument('--stats', action='store_true', help='Print per-task timing metrics and exit')
+        parser.add_argument(
+            '--purge-older-than', type=int, metavar='DAYS',
+            help='Delete done and failed tasks that finished more than DAYS ago and exit',
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.print_stats()
+            return
+        if options['purge_older_than'] is not None:
+            purged = purge_finished(options['purge_older_than'])
+            self.stdout.write(self.style.SUCCESS(f'Purged {purged} finished tasks'))
+            return
+
+        self.requeue_stale()
+        try:
+            while True:
+                claimed = claim_next()
+                if claimed is None:
+                    # Idle: pick up what other workers left behind before waiting
+                    if self.requeue_stale():
+                        continue
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+                run_task(claimed)
+                line = f'{claimed.name} #{claimed.pk}: {claimed.status} in {claimed.duration_ms:.1f} ms (attempt {claimed.attempts})'
+                if claimed.status == 'done':
+                    self.stdout.write(line)
+                else:
+                    self.stdout.write(self.style.ERROR(f"{line}\n{claimed.last_error}"))
+        except KeyboardInterrupt:
+            pass
+
+    def requeue_stale(self):
+        requeued = requeue_stale()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Requeued {requeued} tasks whose worker stopped'))
+        return requeued
+
+    def print_stats(self):
+        rows = (
+            Task.objects.order_by('name').values('name')
+            .annotate(
+                total=Count('pk'),
+                queued=Count('pk', filter=Q(status='queued')),
+                failed=Count('pk', filter=Q(status='failed')),
+                avg_ms=Avg('duration_ms', filter=Q(status='done')),
+                max_ms=Max('duration_ms', filter=Q(status='done')),
+                retried=Count('pk', filter=Q(attempts__gt=1)),
+            )
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['name']}: {row['total']} total, {row['queued']} queued, {row['failed']} failed, "
+                f"{row['retried']} retried, avg {row['avg_ms'] or 0:.1f} ms, max {row['max_ms'] or 0:.1f} ms"
+            )
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:21
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def expire_running_tasks(apps, schema_editor):
+    """Tasks running before leases existed have none; let the next worker start requeue them"""
+    apps.get_model('tasks', 'Task').objects.filter(status='running').update(locked_until=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status', 'running')), fields=['locked_until'], name='task_running_lease_idx'),
+        ),
+        migrations.RunPython(expire_running_tasks, migrations.RunPython.noop),
+    ]
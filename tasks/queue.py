@@ -0,0 +1,154 @@
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+# Retries wait RETRY_DELAY * 2 ** (attempt - 1) seconds, capped at RETRY_DELAY_MAX
+RETRY_DELAY = getattr(settings, 'TASK_QUEUE_RETRY_DELAY', 10)
+RETRY_DELAY_MAX = getattr(settings, 'TASK_QUEUE_RETRY_DELAY_MAX', 3600)
+# A claimed task is leased to its worker for this many seconds, renewed every LEASE / 3 while it
+# runs; a lease that runs out belongs to a worker that died, and the task is queued again
+LEASE = getattr(settings, 'TASK_QUEUE_LEASE', 300)
+
+_registry = {}
+
+
+def task(max_attempts=3):
+    """Register a function as a background task; its kwargs must be JSON-serializable"""
+    def decorator(func):
+        func.task_name = f'{func.__module__}.{func.__name__}'
+        func.max_attempts = max_attempts
+        _registry[func.task_name] = func
+        return func
+    return decorator
+
+
+def enqueue(func, **kwargs):
+    """
+    Queue func(**kwargs) for the run_tasks worker.
+
+    The row is written in the caller's transaction, so a task is never picked up
+    for changes that were rolled back. With TASK_QUEUE_EAGER the task runs in
+    this process as soon as the transaction commits instead.
+    """
+    queued = Task.objects.create(name=func.task_name, kwargs=kwargs, max_attempts=func.max_attempts)
+    if getattr(settings, 'TASK_QUEUE_EAGER', False):
+        transaction.on_commit(lambda: run_now(queued.pk))
+    return queued
+
+
+def run_now(task_id):
+    if claim(task_id):
+        run_task(Task.objects.get(pk=task_id))
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_DELAY * 2 ** (attempts - 1), RETRY_DELAY_MAX))
+
+
+def claim(task_id):
+    """Mark a queued task as running under a fresh lease; returns False if another worker got there first"""
+    now = timezone.now()
+    return Task.objects.filter(pk=task_id, status='queued').update(
+        status='running', started_at=now, locked_until=now + timedelta(seconds=LEASE), attempts=F('attempts') + 1
+    ) == 1
+
+
+def claim_next():
+    """Claim the oldest due task, or return None when there is nothing to do"""
+    due = Task.objects.filter(status='queued', run_at__lte=timezone.now()).order_by('run_at')
+    for task_id in due.values_list('pk', flat=True)[:10]:
+        if claim(task_id):
+            return Task.objects.get(pk=task_id)
+    return None
+
+
+@contextmanager
+def heartbeat(claimed):
+    """Keep renewing claimed's lease from a background thread while the block runs"""
+    stopped = threading.Event()
+
+    def renew():
+        try:
+            while not stopped.wait(LEASE / 3):
+                try:
+                    Task.objects.filter(pk=claimed.pk, status='running', attempts=claimed.attempts).update(
+                        locked_until=timezone.now() + timedelta(seconds=LEASE)
+                    )
+                except DatabaseError:
+                    # e.g. SQLite is busy with the task's own transaction; the next beat tries again
+                    pass
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=renew, name=f'task-{claimed.pk}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def requeue_stale():
+    """
+    Put tasks whose lease ran out back in the queue; returns how many.
+
+    A task that has already used all its attempts is failed instead, so a task
+    that keeps killing its worker doesn't run forever.
+    """
+    now = timezone.now()
+    expired = Task.objects.filter(status='running', locked_until__lt=now)
+    expired.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', locked_until=None, finished_at=now, last_error='The worker stopped before the task finished',
+    )
+    return expired.filter(attempts__lt=F('max_attempts')).update(status='queued', locked_until=None)
+
+
+def purge_finished(days, batch_size=1000):
+    """Delete done and failed tasks that finished more than days ago, in batches; returns how many"""
+    finished = Task.objects.filter(
+        status__in=['done', 'failed'], finished_at__lt=timezone.now() - timedelta(days=days),
+    )
+    purged = 0
+    while batch := list(finished.values_list('pk', flat=True)[:batch_size]):
+        purged += Task.objects.filter(pk__in=batch).delete()[0]
+    return purged
+
+
+def run_task(claimed):
+    """Run a claimed task, recording its timing and scheduling a retry if it fails"""
+    func = _registry.get(claimed.name)
+    start = time.perf_counter()
+    try:
+        if func is None:
+            raise LookupError(f'No task registered as {claimed.name}')
+        with heartbeat(claimed), transaction.atomic():
+            func(**claimed.kwargs)
+    except Exception:
+        claimed.last_error = traceback.format_exc()
+        if claimed.attempts < claimed.max_attempts:
+            claimed.status = 'queued'
+            claimed.run_at = timezone.now() + retry_delay(claimed.attempts)
+        else:
+            claimed.status = 'failed'
+    else:
+        claimed.status = 'done'
+        claimed.last_error = ''
+    claimed.duration_ms = (time.perf_counter() - start) * 1000
+    claimed.finished_at = timezone.now()
+    claimed.locked_until = None
+    # Only while the lease is still ours; after it ran out, whichever worker holds the task now records it
+    Task.objects.filter(pk=claimed.pk, status='running', attempts=claimed.attempts).update(
+        status=claimed.status, run_at=claimed.run_at, last_error=claimed.last_error,
+        duration_ms=claimed.duration_ms, finished_at=claimed.finished_at, locked_until=None,
+    )
+    return claimed
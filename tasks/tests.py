@@ -0,0 +1,187 @@
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import queue
+from .models import Task
+from .queue import claim, claim_next, enqueue, heartbeat, purge_finished, requeue_stale, retry_delay, run_task, task
+
+calls = []
+
+
+@task()
+def record(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def explode():
+    raise ValueError('boom')
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    @override_settings(TASK_QUEUE_EAGER=False)
+    def test_enqueue_writes_a_queued_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            queued = enqueue(record, value=1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.name, queued.kwargs, queued.status), ('tasks.tests.record', {'value': 1}, 'queued'))
+        self.assertEqual(calls, [])
+
+    @override_settings(TASK_QUEUE_EAGER=True)
+    def test_eager_tasks_run_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            queued = enqueue(record, value=1)
+        self.assertEqual(calls, [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(calls, [1])
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('done', 1))
+
+    def test_claim_is_exclusive(self):
+        queued = Task.objects.create(name=record.task_name, kwargs={'value': 1})
+        self.assertTrue(claim(queued.pk))
+        self.assertFalse(claim(queued.pk))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('running', 1))
+        self.assertIsNotNone(queued.started_at)
+        self.assertGreater(queued.locked_until, timezone.now() + timedelta(seconds=queue.LEASE - 60))
+
+    def test_claim_next_takes_the_oldest_due_task(self):
+        now = timezone.now()
+        Task.objects.create(name=record.task_name, run_at=now + timedelta(minutes=5))
+        newer = Task.objects.create(name=record.task_name, run_at=now - timedelta(minutes=1))
+        older = Task.objects.create(name=record.task_name, run_at=now - timedelta(minutes=2))
+        self.assertEqual(claim_next(), older)
+        self.assertEqual(claim_next(), newer)
+        self.assertIsNone(claim_next())
+
+    def test_failures_are_retried_with_backoff(self):
+        self.assertEqual(retry_delay(1), timedelta(seconds=queue.RETRY_DELAY))
+        self.assertEqual(retry_delay(3), timedelta(seconds=queue.RETRY_DELAY * 4))
+        self.assertEqual(retry_delay(50), timedelta(seconds=queue.RETRY_DELAY_MAX))
+
+        queued = Task.objects.create(name=explode.task_name, max_attempts=explode.max_attempts)
+        claim(queued.pk)
+        before = timezone.now()
+        failed = run_task(Task.objects.get(pk=queued.pk))
+        self.assertEqual(failed.status, 'queued')
+        self.assertIn('ValueError: boom', failed.last_error)
+        self.assertGreaterEqual(failed.run_at, before + retry_delay(1))
+        # Not due again until the delay has passed
+        self.assertIsNone(claim_next())
+
+    def test_tasks_fail_after_max_attempts(self):
+        queued = Task.objects.create(name=explode.task_name, max_attempts=explode.max_attempts)
+        for attempt in range(explode.max_attempts):
+            Task.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+            run_task(claim_next())
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 2))
+        self.assertIsNone(claim_next())
+
+    def test_unknown_tasks_fail(self):
+        queued = Task.objects.create(name='tasks.tests.missing', max_attempts=1)
+        claim(queued.pk)
+        self.assertEqual(run_task(Task.objects.get(pk=queued.pk)).status, 'failed')
+
+    def test_expired_leases_are_requeued(self):
+        now = timezone.now()
+        stale = Task.objects.create(
+            name=record.task_name, status='running', attempts=1, locked_until=now - timedelta(seconds=1),
+        )
+        # Started long ago, but its worker is still renewing the lease
+        running = Task.objects.create(
+            name=record.task_name, status='running', attempts=1, started_at=now - timedelta(hours=1),
+            locked_until=now + timedelta(seconds=60),
+        )
+        exhausted = Task.objects.create(
+            name=record.task_name, status='running', attempts=3, max_attempts=3, locked_until=now - timedelta(seconds=1),
+        )
+        self.assertEqual(requeue_stale(), 1)
+        for row in (stale, running, exhausted):
+            row.refresh_from_db()
+        self.assertEqual((stale.status, running.status, exhausted.status), ('queued', 'running', 'failed'))
+        self.assertEqual(exhausted.attempts, 3)
+
+    def test_results_of_a_lost_lease_are_not_recorded(self):
+        Task.objects.create(name=record.task_name, kwargs={'value': 1})
+        claimed = claim_next()
+        # The lease ran out and another worker took the task over
+        Task.objects.filter(pk=claimed.pk).update(attempts=2)
+        run_task(claimed)
+        self.assertEqual(Task.objects.get(pk=claimed.pk).status, 'running')
+
+    def test_purge_finished(self):
+        old = timezone.now() - timedelta(days=31)
+        Task.objects.create(name=record.task_name, status='done', finished_at=old)
+        Task.objects.create(name=record.task_name, status='failed', finished_at=old)
+        recent = Task.objects.create(name=record.task_name, status='done', finished_at=timezone.now())
+        queued = Task.objects.create(name=record.task_name, created_at=old)
+        self.assertEqual(purge_finished(30, batch_size=1), 2)
+        self.assertEqual(set(Task.objects.values_list('pk', flat=True)), {recent.pk, queued.pk})
+
+
+class HeartbeatTests(TransactionTestCase):
+    # The heartbeat writes from its own thread and connection, which only sees committed rows
+    @mock.patch.object(queue, 'LEASE', 0.03)
+    def test_heartbeat_renews_the_lease(self):
+        Task.objects.create(name=record.task_name)
+        claimed = claim_next()
+        with heartbeat(claimed):
+            time.sleep(0.1)
+        renewed = Task.objects.get(pk=claimed.pk).locked_until
+        self.assertGreater(renewed, claimed.locked_until)
+
+
+class RunTasksCommandTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_once_runs_the_due_tasks(self):
+        Task.objects.create(name=record.task_name, kwargs={'value': 1})
+        Task.objects.create(name=record.task_name, kwargs={'value': 2})
+        Task.objects.create(name=record.task_name, kwargs={'value': 3}, run_at=timezone.now() + timedelta(hours=1))
+        Task.objects.create(
+            name=record.task_name, kwargs={'value': 4}, status='running', attempts=1,
+            locked_until=timezone.now() - timedelta(seconds=1),
+        )
+        out = StringIO()
+        call_command('run_tasks', once=True, stdout=out)
+        self.assertEqual(sorted(calls), [1, 2, 4])
+        self.assertIn('Requeued 1 tasks', out.getvalue())
+        self.assertEqual(out.getvalue().count('tasks.tests.record #'), 3)
+        self.assertEqual(Task.objects.filter(status='queued').count(), 1)
+
+    def test_failures_are_reported(self):
+        Task.objects.create(name=explode.task_name, max_attempts=1)
+        out = StringIO()
+        call_command('run_tasks', once=True, stdout=out)
+        self.assertIn('failed', out.getvalue())
+        self.assertIn('ValueError: boom', out.getvalue())
+
+    def test_purge_older_than(self):
+        Task.objects.create(name=record.task_name, status='done', finished_at=timezone.now() - timedelta(days=8))
+        out = StringIO()
+        call_command('run_tasks', purge_older_than=7, stdout=out)
+        self.assertIn('Purged 1 finished tasks', out.getvalue())
+        self.assertFalse(Task.objects.exists())
+
+    def test_stats(self):
+        Task.objects.create(name=record.task_name, status='done', attempts=2, duration_ms=4)
+        Task.objects.create(name=record.task_name, status='failed', attempts=3)
+        out = StringIO()
+        call_command('run_tasks', stats=True, stdout=out)
+        self.assertEqual(
+            out.getvalue().strip(),
+            'tasks.tests.record: 2 total, 0 queued, 1 failed, 2 retried, avg 4.0 ms, max 4.0 ms',
+        )